@@ -0,0 +1,119 @@
+"""
+Issue and verify throughput of the OTP stores.
+
+Run from the repository root with ``python -m Gryphon.benchmarks``. The
+multi-process run has every code verified by a different process from the
+one that issued it, as when send_otp and verify_otp land on different
+workers, so it also shows which stores work across workers.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from .otp import MemoryOTPStore, SQLiteOTPStore
+
+SECRET = 'benchmark'
+
+
+def make_store(kind, path):
+    if kind == 'memory':
+        return MemoryOTPStore(secret=SECRET)
+    return SQLiteOTPStore(path, secret=SECRET)
+
+
+def phones(worker, count):
+    return [f"+1{worker:03d}{number:07d}" for number in range(count)]
+
+
+def issue_codes(kind, path, worker, count, results):
+    store = make_store(kind, path)
+    started = time.perf_counter()
+    codes = {phone: store.issue(phone) for phone in phones(worker, count)}
+    results.put((worker, time.perf_counter() - started, codes))
+
+
+def verify_codes(kind, path, codes, results):
+    store = make_store(kind, path)
+    verified = 0
+    started = time.perf_counter()
+    for phone, code in codes.items():
+        # One wrong guess first, as a typo would be.
+        wrong = str((int(code) + 1) % 10 ** len(code)).zfill(len(code))
+        store.verify(phone, wrong)
+        verified += store.verify(phone, code)
+    results.put((time.perf_counter() - started, verified))
+
+
+def single_process(kind, path, count):
+    store = make_store(kind, path)
+    numbers = phones(0, count)
+    started = time.perf_counter()
+    codes = [store.issue(phone) for phone in numbers]
+    issued = time.perf_counter() - started
+    started = time.perf_counter()
+    verified = sum(store.verify(phone, code) for phone, code in zip(numbers, codes))
+    return count / issued, count / (time.perf_counter() - started), verified
+
+
+def multi_process(kind, path, workers, count):
+    """
+    Each worker issues count codes, then verifies the codes of the next
+    worker. Returns (issues/s, verifies/s, codes verified) over all workers.
+    """
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [
+        context.Process(target=issue_codes, args=(kind, path, worker, count, results))
+        for worker in range(workers)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    issued = dict((worker, codes) for worker, _, codes in (results.get() for _ in processes))
+    for process in processes:
+        process.join()
+    issue_rate = workers * count / (time.perf_counter() - started)
+
+    processes = [
+        context.Process(target=verify_codes, args=(kind, path, issued[(worker + 1) % workers], results))
+        for worker in range(workers)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    verified = sum(count for _, count in (results.get() for _ in processes))
+    for process in processes:
+        process.join()
+    # Each code costs two verify calls: the wrong guess and the right one.
+    return issue_rate, 2 * workers * count / (time.perf_counter() - started), verified
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--codes', type=int, default=20000, help="Codes issued per process.")
+    parser.add_argument('--workers', type=int, default=4, help="Processes in the multi-process run.")
+    options = parser.parse_args()
+
+    for kind in ('memory', 'sqlite'):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'otp.sqlite3')
+            issue_rate, verify_rate, verified = single_process(kind, path, options.codes)
+            print(
+                f"{kind:<7} 1 process:   issue {issue_rate:>9.0f}/s  verify {verify_rate:>9.0f}/s  "
+                f"verified {verified}/{options.codes}"
+            )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'otp.sqlite3')
+            make_store(kind, path)  # creates the table before the workers start
+            issue_rate, verify_rate, verified = multi_process(kind, path, options.workers, options.codes)
+            total = options.workers * options.codes
+            print(
+                f"{kind:<7} {options.workers} processes: issue {issue_rate:>9.0f}/s  verify {verify_rate:>9.0f}/s  "
+                f"verified {verified}/{total} on another process"
+            )
+
+
+if __name__ == '__main__':
+    main()
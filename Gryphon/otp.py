@@ -0,0 +1,192 @@
+"""
+One-time passwords for phone login.
+
+Every store keeps at most one code per phone number. A code expires ttl
+seconds after it was issued, is used up by a successful verify, and is
+dropped after max_attempts wrong guesses. Codes are stored as HMACs, never
+in the clear.
+
+- MemoryOTPStore: a bounded dict in the process. Only for a single worker,
+  since a code issued by one process is unknown to the others.
+- SQLiteOTPStore: a table in its own SQLite file, shared by every worker
+  process on the host.
+
+get_otp_store() builds the store named by settings.GRYPHON_OTP_STORE,
+by default an SQLiteOTPStore in BASE_DIR / 'otp.sqlite3' (ignored by git):
+
+    GRYPHON_OTP_STORE = {
+        'BACKEND': 'Gryphon.otp.SQLiteOTPStore',
+        'OPTIONS': {'path': BASE_DIR / 'otp.sqlite3', 'ttl': 300, 'max_attempts': 5},
+    }
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class OTPStore(ABC):
+    def __init__(self, ttl=300, max_attempts=5, max_entries=100000, digits=4, secret=None, clock=time.time):
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.max_entries = max_entries
+        self.digits = digits
+        self.secret = (secret or os.urandom(32).hex()).encode()
+        self.clock = clock
+
+    def generate(self):
+        return str(secrets.randbelow(10 ** self.digits)).zfill(self.digits)
+
+    def digest(self, phone, code):
+        # Keyed by phone too, so equal codes for two numbers do not match.
+        return hmac.new(self.secret, f"{phone}:{code}".encode(), hashlib.sha256).hexdigest()
+
+    @abstractmethod
+    def issue(self, phone):
+        """Returns a new code for phone, replacing any earlier one."""
+
+    @abstractmethod
+    def verify(self, phone, code):
+        """Whether code is phone's current code. A correct code is used up."""
+
+
+class MemoryOTPStore(OTPStore):
+    """
+    Codes in insertion order, which with a single ttl is also expiry order:
+    expired codes are dropped from the front, then the oldest beyond max_entries.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._codes = OrderedDict()  # phone -> [digest, expires_at, attempts]
+        self._lock = threading.Lock()
+
+    def issue(self, phone):
+        code = self.generate()
+        now = self.clock()
+        with self._lock:
+            self._codes[phone] = [self.digest(phone, code), now + self.ttl, 0]
+            self._codes.move_to_end(phone)
+            while self._codes:
+                oldest = next(iter(self._codes.values()))
+                if oldest[1] > now and len(self._codes) <= self.max_entries:
+                    break
+                self._codes.popitem(last=False)
+        return code
+
+    def verify(self, phone, code):
+        digest = self.digest(phone, code)
+        with self._lock:
+            entry = self._codes.get(phone)
+            if entry is None:
+                return False
+            if entry[1] <= self.clock():
+                del self._codes[phone]
+                return False
+            if hmac.compare_digest(entry[0], digest):
+                del self._codes[phone]
+                return True
+            entry[2] += 1
+            if entry[2] >= self.max_attempts:
+                del self._codes[phone]
+            return False
+
+
+class SQLiteOTPStore(OTPStore):
+    """
+    Codes in an SQLite file in WAL mode, one connection per thread. Every
+    operation is a single statement, so concurrent workers cannot both use
+    one code. Every prune_every issues, a worker deletes expired codes and
+    the soonest-expiring ones beyond max_entries.
+    """
+
+    def __init__(self, path, timeout=5.0, prune_every=100, **options):
+        super().__init__(**options)
+        self.path = str(path)
+        self.timeout = timeout
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._issued = 0
+        db = self._connection()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS otp ("
+            "phone TEXT PRIMARY KEY, digest TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS otp_expires_at ON otp (expires_at)")
+
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            self._local.db = db
+        return db
+
+    def issue(self, phone):
+        code = self.generate()
+        db = self._connection()
+        db.execute(
+            "INSERT INTO otp (phone, digest, expires_at, attempts) VALUES (?, ?, ?, 0) "
+            "ON CONFLICT (phone) DO UPDATE SET "
+            "digest = excluded.digest, expires_at = excluded.expires_at, attempts = 0",
+            (phone, self.digest(phone, code), self.clock() + self.ttl),
+        )
+        self._issued += 1
+        if self._issued % self.prune_every == 0:
+            self.prune()
+        return code
+
+    def prune(self):
+        db = self._connection()
+        db.execute("DELETE FROM otp WHERE expires_at <= ?", (self.clock(),))
+        db.execute(
+            "DELETE FROM otp WHERE phone IN "
+            "(SELECT phone FROM otp ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def verify(self, phone, code):
+        db = self._connection()
+        now = self.clock()
+        # Digests are compared in SQL: they are HMACs, so timing reveals nothing about the code.
+        if db.execute(
+            "DELETE FROM otp WHERE phone = ? AND digest = ? AND expires_at > ? AND attempts < ? RETURNING phone",
+            (phone, self.digest(phone, code), now, self.max_attempts),
+        ).fetchone():
+            return True
+        attempts = db.execute(
+            "UPDATE otp SET attempts = attempts + 1 WHERE phone = ? RETURNING attempts, expires_at",
+            (phone,),
+        ).fetchone()
+        if attempts and (attempts[0] >= self.max_attempts or attempts[1] <= now):
+            db.execute("DELETE FROM otp WHERE phone = ?", (phone,))
+        return False
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_otp_store():
+    """The store configured by settings.GRYPHON_OTP_STORE, built on first use."""
+    global _store
+    if _store is None:
+        from django.conf import settings
+        from django.utils.module_loading import import_string
+
+        config = getattr(settings, 'GRYPHON_OTP_STORE', None) or {
+            'BACKEND': 'Gryphon.otp.SQLiteOTPStore',
+            'OPTIONS': {'path': os.path.join(settings.BASE_DIR, 'otp.sqlite3')},
+        }
+        options = {'secret': settings.SECRET_KEY, **config.get('OPTIONS', {})}
+        with _store_lock:
+            if _store is None:
+                _store = import_string(config['BACKEND'])(**options)
+    return _store
@@ -1,3 +1,80 @@
-from django.test import TestCase
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .otp import MemoryOTPStore, OTPStore, SQLiteOTPStore
+
+
+class OTPStoreTests:
+    """
+    What every store guarantees: codes expire, are used up by a successful
+    verify or too many wrong guesses, and at most max_entries are kept.
+    """
+
+    def setUp(self):
+        self.now = 1000.0
+        self.store = self.make_store(ttl=60, max_attempts=3, max_entries=3)
+
+    def clock(self):
+        return self.now
+
+    def wrong(self, code):
+        return str((int(code) + 1) % 10 ** self.store.digits).zfill(self.store.digits)
+
+    def test_store_is_abstract(self):
+        with self.assertRaises(TypeError):
+            OTPStore()
+
+    def test_code_is_used_once(self):
+        code = self.store.issue('5550001')
+        self.assertFalse(self.store.verify('5550002', code))
+        self.assertTrue(self.store.verify('5550001', code))
+        self.assertFalse(self.store.verify('5550001', code))
+
+    def test_code_expires(self):
+        code = self.store.issue('5550001')
+        self.now += 59
+        self.assertTrue(self.store.verify('5550001', code))
+        code = self.store.issue('5550001')
+        self.now += 60
+        self.assertFalse(self.store.verify('5550001', code))
+
+    def test_wrong_guesses_use_up_the_code(self):
+        code = self.store.issue('5550001')
+        for _ in range(3):
+            self.assertFalse(self.store.verify('5550001', self.wrong(code)))
+        self.assertFalse(self.store.verify('5550001', code))
+
+    def test_size_is_bounded(self):
+        codes = {}
+        for phone in ('5550001', '5550002', '5550003', '5550004'):
+            codes[phone] = self.store.issue(phone)
+            self.now += 1
+        # The code expiring soonest makes room.
+        self.assertFalse(self.store.verify('5550001', codes.pop('5550001')))
+        for phone, code in codes.items():
+            self.assertTrue(self.store.verify(phone, code))
+
+
+class MemoryOTPStoreTests(OTPStoreTests, SimpleTestCase):
+
+    def make_store(self, **options):
+        return MemoryOTPStore(clock=self.clock, secret='test', **options)
+
+
+class SQLiteOTPStoreTests(OTPStoreTests, SimpleTestCase):
+
+    def make_store(self, **options):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'otp.sqlite3'
+        # Pruned on every issue, so the bound holds at once.
+        return SQLiteOTPStore(self.path, prune_every=1, clock=self.clock, secret='test', **options)
+
+    def test_shared_between_processes(self):
+        # Another worker's store on the same file.
+        other = SQLiteOTPStore(self.path, clock=self.clock, secret='test')
+        code = self.store.issue('5550001')
+        self.assertTrue(other.verify('5550001', code))
+        self.assertFalse(self.store.verify('5550001', code))
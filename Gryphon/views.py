@@ -3,9 +3,7 @@ from .models import Vehicle, UserProfile
 from django.contrib.auth.models import User
 from django.contrib.auth import login
 from django.contrib import messages
-from random import randint
-
-otp_store = {}
+from .otp import get_otp_store
 
 def index(request):
     cars = Vehicle.objects.filter(vehicle_type='car')
@@ -15,8 +13,8 @@ def index(request):
 def send_otp(request):
     if request.method == 'POST':
         phone = request.POST['phone']
-        otp = str(randint(1000, 9999))
-        otp_store[phone] = otp
+        # Shared by all worker processes, so verify_otp may run on any of them.
+        otp = get_otp_store().issue(phone)
         # Simulate sending SMS (replace with Twilio or similar)
         print(f"OTP for {phone}: {otp}")
         messages.info(request, f"OTP sent to {phone}")
@@ -27,7 +25,7 @@ def verify_otp(request):
     if request.method == 'POST':
         phone = request.POST['phone']
         otp_input = request.POST['otp']
-        if otp_store.get(phone) == otp_input:
+        if get_otp_store().verify(phone, otp_input):
             user, created = User.objects.get_or_create(username=phone)
             UserProfile.objects.get_or_create(user=user, phone=phone)
             login(request, user)
@@ -1,5 +1,11 @@
+from datetime import date, timedelta
+
 from django.contrib import admin, messages
+from django.db import IntegrityError
+from django.template.response import TemplateResponse
+from django.urls import path
 from .models import Vehicle, Reservation, UserProfile
+from .rollups import CONFIRMED_STATUSES, PERIODS, report
 
 # A simple admin registration for the Vehicle model for better management
 @admin.register(Vehicle)
@@ -20,10 +26,26 @@ class ReservationAdmin(admin.ModelAdmin):
         """
         # We only want to approve payments for reservations that are pending or have failed.
         updatable_queryset = queryset.filter(status__in=['pending_payment', 'payment_failed'])
-        
-        updated_count = updatable_queryset.update(status='active')
-        
+
+        # Save row by row rather than with .update() so the post_save
+        # receivers keep the occupancy bitmaps in sync.
+        updated_count = 0
+        conflicting = []
+        for reservation in updatable_queryset:
+            reservation.status = 'active'
+            try:
+                reservation.save(update_fields=['status'])
+            except IntegrityError as error:
+                if Reservation.OVERLAP_ERROR not in str(error):
+                    raise
+                # Rejected by the overlap trigger: the dates are already taken.
+                conflicting.append(str(reservation.id))
+                continue
+            updated_count += 1
+
         self.message_user(request, f"{updated_count} reservations were successfully marked as active.", messages.SUCCESS)
+        if conflicting:
+            self.message_user(request, f"Skipped reservations {', '.join(conflicting)}: they overlap an active booking.", messages.WARNING)
 
     # Set a user-friendly description for the action in the admin dropdown
     mark_as_payment_approved.short_description = "Approve payment for selected reservations"
@@ -38,5 +60,50 @@ class ReservationAdmin(admin.ModelAdmin):
     # Add the custom action to the list of available actions
     actions = [mark_as_payment_approved]
 
+    # Links the report below from the list.
+    change_list_template = 'admin/myapp/reservation/change_list.html'
+
+    # --- Bookings and revenue report ---
+    def get_urls(self):
+        return [
+            path('report/', self.admin_site.admin_view(self.report_view), name='myapp_reservation_report'),
+        ] + super().get_urls()
+
+    def report_view(self, request):
+        """
+        Bookings and revenue by day or month and vehicle type, read from the
+        daily rollups (see rollups.py) rather than the Reservation table.
+        """
+        default_end = date.today() + timedelta(days=1)
+        default_start = default_end - timedelta(days=30)
+        try:
+            start_date = date.fromisoformat(request.GET.get('from') or default_start.isoformat())
+            end_date = date.fromisoformat(request.GET.get('to') or default_end.isoformat())
+            error = None if start_date < end_date else "The end date must be after the start date."
+        except ValueError:
+            error = "Dates must be in YYYY-MM-DD format."
+        if error:
+            # Neither date of a rejected period is kept.
+            self.message_user(request, error, messages.ERROR)
+            start_date, end_date = default_start, default_end
+        period = request.GET.get('period') if request.GET.get('period') in PERIODS else 'day'
+        status = request.GET.get('status', 'confirmed')
+        statuses = [status] if status in dict(Reservation.STATUS_CHOICES) else CONFIRMED_STATUSES
+        rows = report(start_date, end_date, period, statuses)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Bookings and revenue',
+            'rows': rows,
+            'totals': {field: sum(row[field] for row in rows) for field in ('bookings', 'rental_days', 'revenue')},
+            'start_date': start_date,
+            'end_date': end_date,
+            'period': period,
+            'periods': list(PERIODS),
+            'status': status if status in dict(Reservation.STATUS_CHOICES) else 'confirmed',
+            'status_choices': Reservation.STATUS_CHOICES,
+        }
+        return TemplateResponse(request, 'admin/myapp/reservation/report.html', context)
+
 # Optional: Register UserProfile if you want to see it in the admin
 admin.site.register(UserProfile)
\ No newline at end of file
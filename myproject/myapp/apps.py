@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        # Register the receivers that keep derived tables in sync with reservations.
+        from . import signals  # noqa: F401
+        # Register the system checks of the app's settings.
+        from . import checks  # noqa: F401
@@ -0,0 +1,149 @@
+from datetime import date, timedelta
+
+from django.db.models import Case, F, Value, When, BigIntegerField
+
+from .models import Reservation, Vehicle, VehicleOccupancy
+
+# Longest window accepted by the availability search. Each month in the
+# window adds one branch to the bitmap lookup, so keep it bounded.
+MAX_SEARCH_DAYS = 366
+
+# Most vehicles one /api/booked-dates/ request may ask for. A catalog page
+# shows 6; the cap keeps the IN list and the response small.
+MAX_BATCH_VEHICLES = 50
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def month_masks(start_date, end_date):
+    """
+    Splits the half-open range [start_date, end_date) into per-month bitmasks.
+    Bit 0 of a mask is the first day of that month. Yields (month, mask) pairs.
+    """
+    month = month_start(start_date)
+    while month < end_date:
+        following = next_month(month)
+        first = max(start_date, month)
+        last = min(end_date, following)  # exclusive
+        if first < last:
+            span = (last - first).days
+            yield month, ((1 << span) - 1) << (first.day - 1)
+        month = following
+
+
+def booked_vehicle_ids(start_date, end_date):
+    """
+    Returns a queryset of vehicle ids that have an active reservation
+    overlapping [start_date, end_date), read from the occupancy bitmaps.
+    """
+    masks = dict(month_masks(start_date, end_date))
+    month_mask = Case(
+        *[When(month=month, then=Value(mask)) for month, mask in masks.items()],
+        default=Value(0),
+        output_field=BigIntegerField(),
+    )
+    return (
+        VehicleOccupancy.objects
+        .filter(month__in=list(masks))
+        .alias(overlap=F('days').bitand(month_mask))
+        .exclude(overlap=0)
+        .values('vehicle_id')
+    )
+
+
+def rebuild_occupancy(vehicle_id, start_date, end_date):
+    """
+    Recomputes the bitmaps of one vehicle for every month touched by
+    [start_date, end_date) from its active reservations.
+    """
+    first_month = month_start(start_date)
+    months = [month for month, _ in month_masks(first_month, end_date)]
+    horizon = next_month(months[-1]) if months else first_month
+
+    bits = dict.fromkeys(months, 0)
+    active = Reservation.objects.filter(
+        vehicle_id=vehicle_id,
+        status='active',
+        start_date__lt=horizon,
+        end_date__gt=first_month,
+    ).values_list('start_date', 'end_date')
+    for res_start, res_end in active:
+        for month, mask in month_masks(max(res_start, first_month), min(res_end, horizon)):
+            bits[month] |= mask
+
+    # Drop empty months so the search only ever sees real bookings.
+    VehicleOccupancy.objects.filter(
+        vehicle_id=vehicle_id,
+        month__in=[month for month, days in bits.items() if not days],
+    ).delete()
+    VehicleOccupancy.objects.bulk_create(
+        [VehicleOccupancy(vehicle_id=vehicle_id, month=month, days=days)
+         for month, days in bits.items() if days],
+        update_conflicts=True,
+        unique_fields=['vehicle', 'month'],
+        update_fields=['days'],
+    )
+
+
+def rebuild_all_occupancy(batch_size=1000):
+    """
+    Rebuilds the whole occupancy table from active reservations and bumps every
+    vehicle's availability version. Use after bulk loads that bypass signals.
+    Returns the number of bitmap rows written.
+    """
+    VehicleOccupancy.objects.all().delete()
+    bits = {}
+    active = Reservation.objects.filter(status='active').values_list('vehicle_id', 'start_date', 'end_date')
+    for vehicle_id, res_start, res_end in active.iterator(chunk_size=batch_size):
+        for month, mask in month_masks(res_start, res_end):
+            bits[vehicle_id, month] = bits.get((vehicle_id, month), 0) | mask
+
+    VehicleOccupancy.objects.bulk_create(
+        [VehicleOccupancy(vehicle_id=vehicle_id, month=month, days=days)
+         for (vehicle_id, month), days in bits.items()],
+        batch_size=batch_size,
+    )
+    Vehicle.objects.update(availability_version=F('availability_version') + 1)
+    return len(bits)
+
+
+def parse_window(start_str, end_str):
+    """
+    Parses the start/end query parameters of an availability search.
+    Raises ValueError with a user-facing message when the window is invalid.
+    """
+    try:
+        start_date = date.fromisoformat(start_str)
+        end_date = date.fromisoformat(end_str)
+    except ValueError:
+        raise ValueError('Dates must be in YYYY-MM-DD format.')
+    if end_date <= start_date:
+        raise ValueError('End date must be after start date.')
+    if end_date - start_date > timedelta(days=MAX_SEARCH_DAYS):
+        raise ValueError(f'Search window cannot exceed {MAX_SEARCH_DAYS} days.')
+    return start_date, end_date
+
+
+def parse_vehicle_ids(ids_str):
+    """
+    Parses the comma-separated ids parameter of /api/booked-dates/ into a
+    list of distinct ids, in the order given. Raises ValueError with a
+    user-facing message when it is empty, malformed or too long.
+    """
+    try:
+        ids = list(dict.fromkeys(int(part) for part in ids_str.split(',') if part.strip()))
+    except ValueError:
+        raise ValueError('ids must be a comma-separated list of vehicle ids.')
+    if not ids:
+        raise ValueError('ids is required.')
+    if len(ids) > MAX_BATCH_VEHICLES:
+        raise ValueError(f'At most {MAX_BATCH_VEHICLES} vehicles can be requested at once.')
+    return ids
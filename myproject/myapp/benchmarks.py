@@ -0,0 +1,950 @@
+"""
+Micro-benchmarks for the hot paths of the rental API.
+
+Run them with ``python manage.py benchmark <name>``. Every benchmark runs
+against a throwaway test database seeded on the fly, never the real one.
+"""
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, timedelta
+from http.client import HTTPConnection
+from pathlib import Path
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connections, transaction
+from django.core.cache import caches
+from django.test import Client, override_settings
+from django.urls import resolve, reverse
+from django.utils.crypto import get_random_string
+
+from .availability import rebuild_all_occupancy
+from .fleet import MODELS, generate_fleet
+from .loadtest import FILTERS, SEARCH_TERMS, Recorder, percentile
+from .models import Reservation, Vehicle
+from .search import rebuild_search_index
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Registers a benchmark function under name."""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat, setup=None):
+    """
+    Calls func repeat times and returns latency statistics in microseconds.
+    setup, if given, is called untimed before each call.
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        'calls': repeat,
+        'mean_us': statistics.fmean(samples),
+        'p50_us': samples[len(samples) // 2],
+        'p95_us': samples[int(len(samples) * 0.95) - 1],
+    }
+
+
+def format_row(label, stats):
+    return (
+        f"{label:<32} calls={stats['calls']:<7} mean={stats['mean_us']:>10.1f}us "
+        f"p50={stats['p50_us']:>10.1f}us p95={stats['p95_us']:>10.1f}us"
+    )
+
+
+def seed_fleet(vehicles, reservations_per_vehicle, seed=0):
+    """
+    Bulk-creates a fleet with non-overlapping active reservations spread over
+    the coming year, then rebuilds the derived availability and search data.
+    """
+    rng = random.Random(seed)
+    user, _ = User.objects.get_or_create(username='bench@example.com')
+    fleet = []
+    for i in range(vehicles):
+        name, vehicle_type, fuel_type, transmission = rng.choice(MODELS)
+        vehicle = Vehicle(
+            name=f"{name} {i:06d}", type=vehicle_type, fuel_type=fuel_type,
+            transmission=transmission, price_per_day=rng.randint(20, 200),
+        )
+        vehicle.render_features()
+        fleet.append(vehicle)
+    Vehicle.objects.bulk_create(fleet, batch_size=1000)
+    today = date.today()
+    reservations = []
+    for vehicle_id in Vehicle.objects.values_list('id', flat=True):
+        start = today
+        for _ in range(reservations_per_vehicle):
+            start += timedelta(days=rng.randint(1, 10))
+            end = start + timedelta(days=rng.randint(1, 7))
+            reservations.append(Reservation(
+                user=user, vehicle_id=vehicle_id, start_date=start, end_date=end, status='active',
+            ))
+            start = end
+    Reservation.objects.bulk_create(reservations, batch_size=1000)
+    rebuild_all_occupancy()
+    rebuild_search_index()
+    return list(Vehicle.objects.all())
+
+
+@benchmark('booking_index')
+def bench_booking_index(stdout, vehicles=200, reservations=50, repeat=2000):
+    """
+    Compares the in-process booking index with the start_date__lt/end_date__gt
+    query path for conflict checks and booked-range listings.
+    """
+    from .booking_index import BookingIndex
+
+    fleet = seed_fleet(vehicles, reservations)
+    index = BookingIndex()
+    rng = random.Random(1)
+    today = date.today()
+
+    def window():
+        start = today + timedelta(days=rng.randint(0, 365))
+        return start, start + timedelta(days=rng.randint(1, 7))
+
+    def db_conflict():
+        start, end = window()
+        Reservation.objects.filter(
+            vehicle=rng.choice(fleet), status='active', start_date__lt=end, end_date__gt=start,
+        ).exists()
+
+    def index_conflict():
+        start, end = window()
+        index.has_conflict(rng.choice(fleet), start, end)
+
+    def db_ranges():
+        list(Reservation.objects.filter(
+            vehicle_id=rng.choice(fleet).id, status='active',
+        ).values_list('start_date', 'end_date'))
+
+    def index_ranges():
+        vehicle = rng.choice(fleet)
+        index.booked_ranges(vehicle.id, vehicle.availability_version)
+
+    # Warm the index so the comparison measures steady-state lookups.
+    for vehicle in fleet:
+        index.get(vehicle.id, vehicle.availability_version)
+
+    stdout.write(f"{vehicles} vehicles x {reservations} active reservations")
+    stdout.write(format_row('conflict check (db query)', measure(db_conflict, repeat)))
+    stdout.write(format_row('conflict check (index)', measure(index_conflict, repeat)))
+    stdout.write(format_row('booked ranges (db query)', measure(db_ranges, repeat)))
+    stdout.write(format_row('booked ranges (index)', measure(index_ranges, repeat)))
+
+
+@benchmark('booked_dates')
+def bench_booked_dates(stdout, years=5, ahead=365, repeat=2000):
+    """
+    Payload size and serialization time of a vehicle's booked dates: the old
+    response (every active reservation, no horizon) against the coalesced
+    ranges from today and the rle and bitset encodings.
+    """
+    import gzip
+
+    from .booked_dates import encode
+    from .booking_index import VehicleBookings
+
+    # Busy rental history up to a year ahead: 1-7 day bookings, often back to back.
+    rng = random.Random(1)
+    today = date.today()
+    day = today - timedelta(days=365 * years)
+    spans = []
+    while day < today + timedelta(days=ahead):
+        day += timedelta(days=rng.choice((0, 0, 1, 2, 4)))
+        end = day + timedelta(days=rng.randint(1, 7))
+        spans.append((day, end))
+        day = end
+    bookings = VehicleBookings(0, spans)
+
+    def old():
+        return json.dumps([
+            {"from": start.strftime('%Y-%m-%d'), "to": end.strftime('%Y-%m-%d')}
+            for start, end in bookings.ranges()
+        ])
+
+    def encoded(fmt):
+        return lambda: json.dumps(encode(bookings.coalesced(today, None), fmt, today))
+
+    stdout.write(f"{len(spans)} reservations over {years} years past and {ahead} days ahead")
+    for label, func in (('old (all ranges)', old), ('ranges', encoded('ranges')),
+                        ('rle', encoded('rle')), ('bitset', encoded('bitset'))):
+        body = func().encode()
+        stdout.write(f"{label:<20} {len(body):>7} bytes {len(gzip.compress(body)):>6} gzipped")
+        stdout.write(format_row(f"  serialize {label}", measure(func, repeat)))
+
+
+@benchmark('vehicle_search')
+def bench_vehicle_search(stdout, vehicles=100000, repeat=200):
+    """
+    Compares FTS5 search with the old name__icontains scan for first-page lookups.
+    """
+    from .search import search_page
+
+    seed_fleet(vehicles, 0)
+    queryset = Vehicle.objects.all()
+    stdout.write(f"{vehicles} vehicles")
+    for text in ('tes', 'royal enf', 'camry 00012', 'nomatch'):
+        def icontains():
+            list(queryset.filter(name__icontains=text).order_by('name', 'id')[:7])
+
+        def fts():
+            search_page(queryset, text, None, 6)
+
+        stdout.write(format_row(f"'{text}' icontains", measure(icontains, repeat)))
+        stdout.write(format_row(f"'{text}' fts5", measure(fts, repeat)))
+
+
+@benchmark('catalog_json')
+def bench_catalog_json(stdout, vehicles=2000, sizes='6,60,600', repeat=200):
+    """
+    Builds and serializes a catalog page of each size, query included, from
+    Vehicle instances as vehicle_data_view used to and from CATALOG_VALUES
+    rows. Compares the CPU time per page and the memory allocated for its
+    rows and entries (peak, and still held once they are built).
+    """
+    import tracemalloc
+
+    from .catalog import CATALOG_VALUES, catalog_json
+    from .pagination import keyset_page
+
+    seed_fleet(vehicles, 0)
+    queryset = Vehicle.objects.all()
+
+    def model_entries(size):
+        entries = []
+        for v in keyset_page(queryset, None, size).object_list:
+            features = []
+            if v.type == 'car':
+                features.append(f"{v.get_transmission_display()}")
+                features.append(f"{v.seats} Seats")
+            features.append(f"Fuel: {v.get_fuel_type_display()}")
+            entry = {
+                'id': v.id, 'name': v.name, 'type': v.type, 'price': float(v.price_per_day),
+                'priceUnit': 'day', 'image': v.image_url or '/static/images/default.png', 'features': features,
+            }
+            if v.fuel_type == 'electric':
+                entry['tags'] = ['electric']
+            entries.append(entry)
+        return entries
+
+    def values_entries(size):
+        return catalog_json(keyset_page(queryset, None, size, CATALOG_VALUES).object_list)
+
+    stdout.write(f"{vehicles} vehicles")
+    for size in map(int, str(sizes).split(',')):
+        assert model_entries(size) == values_entries(size)
+        for label, build in (('models', model_entries), ('values_list', values_entries)):
+            started = time.process_time()
+            stats = measure(lambda: json.dumps(build(size)), repeat)
+            cpu_us = (time.process_time() - started) / repeat * 1e6
+            tracemalloc.start()
+            entries = build(size)
+            held, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del entries
+            stdout.write(format_row(f"{size:>4} per page, {label}", stats)
+                         + f" cpu={cpu_us:>8.1f}us peak={peak / 1024:>7.1f}KiB held={held / 1024:>7.1f}KiB")
+
+
+@benchmark('quotes')
+def bench_quotes(stdout, vehicles=100000, windows='1,7,30,90', repeat=20):
+    """
+    Quotes every vehicle of the fleet in one call for windows of each length
+    in days, starting on a Friday in summer, against the same rules applied
+    vehicle by vehicle and day by day in Python.
+    """
+    from .quotes import PricingRules, quote_engine
+
+    seed_fleet(vehicles, 0)
+    quote_engine.clear()
+    started = time.perf_counter()
+    fleet = quote_engine.fleet()
+    stdout.write(f"{vehicles} vehicles, prices loaded in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    rows = list(Vehicle.objects.order_by('id').values_list('id', 'type', 'price_per_day'))
+    start = date(date.today().year + 1, 7, 2)
+    start += timedelta(days=(4 - start.weekday()) % 7)
+
+    def per_vehicle(end):
+        rules = PricingRules()
+        days = [start + timedelta(days=i) for i in range((end - start).days)]
+        multipliers = [float(rules.day_multipliers(day, day + timedelta(days=1))[0]) for day in days]
+        discount = rules.discount(len(days))
+        totals = {}
+        for vehicle_id, vehicle_type, price in rows:
+            cents = int(price * 100)
+            surcharge = rules.surcharge_cents(vehicle_type)
+            totals[vehicle_id] = round(sum(cents * multiplier + surcharge for multiplier in multipliers) * (1 - discount))
+        return totals
+
+    for length in map(int, str(windows).split(',')):
+        end = start + timedelta(days=length)
+        ids, totals = quote_engine.quote(start, end)
+        expected = per_vehicle(end)
+        # Summing per day rounds differently in the last place, at most a cent.
+        assert all(abs(total - expected[vehicle_id]) <= 1 for vehicle_id, total in zip(ids.tolist(), totals.tolist()))
+        stdout.write(format_row(f"{length:>3} days, vectorized", measure(lambda: fleet.quote(start, end), repeat)))
+        stdout.write(format_row(f"{length:>3} days, per vehicle", measure(lambda: per_vehicle(end), max(1, repeat // 4))))
+
+    # The whole response, JSON included.
+    window = {'start': str(start), 'end': str(start + timedelta(days=7))}
+    with override_settings(REQUEST_TIMING_SAMPLE_RATE=0):
+        client = Client()
+        stdout.write(format_row('GET /api/quotes/, whole fleet', measure(lambda: client.get('/api/quotes/', window), repeat)))
+
+
+@benchmark('utilization')
+def bench_utilization(stdout, vehicles=20000, reservations=20, changes='10,1000', repeat=5):
+    """
+    Builds the utilization matrix of the fleet, updates it after changing
+    that many reservations, and reports on a year of it by each grouping.
+    """
+    from django.utils import timezone
+
+    from . import utilization
+
+    seed_fleet(vehicles, reservations)
+    # Seeded long enough ago not to be read again as changes.
+    Reservation.objects.update(updated_at=timezone.now() - timedelta(days=1))
+    reservation_ids = list(Reservation.objects.values_list('id', flat=True))
+    rng = random.Random(0)
+    # Without the overlap every run would also reread the previous runs' changes.
+    with tempfile.TemporaryDirectory() as directory, mock.patch.object(utilization, 'CHANGE_OVERLAP', timedelta(0)):
+        started = time.perf_counter()
+        matrix, _ = utilization.update(full=True, directory=directory)
+        size = sum(path.stat().st_size for path in Path(directory).glob('*.npy'))
+        stdout.write(
+            f"{len(reservation_ids)} reservations, full build in {time.perf_counter() - started:.2f}s, "
+            f"{size / 2**20:.1f} MiB on disk"
+        )
+        stdout.write(format_row('update, nothing changed', measure(lambda: utilization.update(directory=directory), repeat)))
+        for count in map(int, str(changes).split(',')):
+            def change():
+                # Flips between counted statuses: the same rows are rewritten, not emptied.
+                Reservation.objects.filter(id__in=rng.sample(reservation_ids, count)).update(
+                    status=rng.choice(['active', 'completed']), updated_at=timezone.now(),
+                )
+            stats = measure(lambda: utilization.update(directory=directory), repeat, setup=change)
+            stdout.write(format_row(f"update, {count} changed", stats))
+
+        matrix = utilization.UtilizationMatrix.open(directory)
+        start = date.today()
+        for by in utilization.GROUPINGS:
+            stats = measure(lambda: utilization.report(matrix, start, start + timedelta(days=365), by), repeat)
+            stdout.write(format_row(f"report by {by}, 365 days", stats))
+
+
+@benchmark('rollups')
+def bench_rollups(stdout, vehicles=10000, reservations=20, repeat=20):
+    """
+    A year's bookings and revenue by month and vehicle type, read from the
+    daily rollups and aggregated from the Reservation table. Run it with a
+    few fleet sizes: only the latter grows with the reservations.
+    """
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncMonth
+
+    from .rollups import CONFIRMED_STATUSES, rebuild_rollups, report
+
+    seed_fleet(vehicles, reservations)
+    started = time.perf_counter()
+    rows = rebuild_rollups()
+    stdout.write(
+        f"{Reservation.objects.count()} reservations, {rows} rollup rows "
+        f"backfilled in {(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+    start = date.today()
+    end = start + timedelta(days=365)
+
+    def from_reservations():
+        return list(Reservation.objects.filter(
+            start_date__gte=start, start_date__lt=end, status__in=CONFIRMED_STATUSES,
+        ).annotate(period=TruncMonth('start_date')).values('period', 'vehicle__type').annotate(
+            bookings=Count('id'), revenue=Sum('total_cost'),
+        ).order_by())
+
+    stdout.write(format_row('report from rollups', measure(lambda: report(start, end, 'month'), repeat)))
+    stdout.write(format_row('aggregate of reservations', measure(from_reservations, repeat)))
+
+
+def run_booking_race(contenders=200, seed=0):
+    """
+    Fires contenders concurrent users at one vehicle and the same dates. Each
+    thread books through /api/rent/ and, if that succeeds, pays through
+    /process-payment/. Returns the outcome counts and the elapsed time.
+    """
+    vehicle = Vehicle.objects.create(name=f"Race car {seed}", type='car')
+    users = User.objects.bulk_create(
+        [User(username=f"racer{seed}-{i}@example.com") for i in range(contenders)]
+    )
+    clients = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+
+    start = date.today() + timedelta(days=7)
+    payload = json.dumps({
+        'vehicle_id': vehicle.id,
+        'start_date': start.isoformat(),
+        'end_date': (start + timedelta(days=3)).isoformat(),
+        'pickup_location': 'downtown',
+    })
+    barrier = threading.Barrier(contenders)
+    outcomes = Counter()
+    outcomes_lock = threading.Lock()
+
+    def attempt(client):
+        try:
+            barrier.wait()
+            response = client.post(reverse('rent_vehicle'), payload, content_type='application/json')
+            outcome = f"rent {response.status_code}"
+            if response.status_code == 200:
+                reservation_id = resolve(response.json()['redirect_url']).kwargs['reservation_id']
+                client.post(reverse('process_payment'), {'reservation_id': reservation_id, 'cvv': '123'})
+            with outcomes_lock:
+                outcomes[outcome] += 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=attempt, args=(client,)) for client in clients]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'vehicle': vehicle,
+        'elapsed': elapsed,
+        'outcomes': dict(outcomes),
+        'active': Reservation.objects.filter(vehicle=vehicle, status='active').count(),
+    }
+
+
+@benchmark('booking_race')
+def bench_booking_race(stdout, contenders=200, rounds=3):
+    """
+    Measures booking throughput while many users race for the same vehicle and dates.
+    """
+    for round_number in range(rounds):
+        result = run_booking_race(contenders, seed=round_number)
+        attempts = sum(result['outcomes'].values())
+        # Nearly every attempt is an expected 409: the rate is of requests
+        # handled, and the reservations created (reserved) and paid for
+        # (active) are reported on their own.
+        stdout.write(
+            f"round {round_number}: {attempts} attempts in {result['elapsed']:.2f}s "
+            f"({attempts / result['elapsed']:.0f} attempts/sec), "
+            f"reserved={result['outcomes'].get('rent 200', 0)} "
+            f"active={result['active']} outcomes={result['outcomes']}"
+        )
+
+
+# Settings for the servers started by asgi_vs_wsgi: production-like, on the
+# benchmark's database.
+SERVER_SETTINGS = """\
+from myproject.settings import *
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1']
+REQUEST_TIMING_SAMPLE_RATE = 0.05
+DATABASES['default']['NAME'] = {name!r}
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def running_server(argv, env, port, timeout=30):
+    """Starts argv and waits for it to accept connections on port."""
+    process = subprocess.Popen(
+        argv, cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"{argv[2]} exited: {process.stderr.read().decode()[-2000:]}")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{argv[2]} did not start listening on port {port}.")
+                time.sleep(0.1)
+        yield process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def api_requests(rng, vehicle_ids, csrf_token, today):
+    """
+    Yields (endpoint, method, path, body) for the JSON API mix the front end
+    sends: mostly catalog pages, then booked dates, now and then a booking.
+    """
+    while True:
+        roll = rng.random()
+        if roll < 0.65:
+            params = {'filter': rng.choice(FILTERS)}
+            if rng.random() < 0.2:
+                params['search'] = rng.choice(SEARCH_TERMS)
+            if rng.random() < 0.3:
+                start = today + timedelta(days=rng.randint(1, 90))
+                params['start'] = start.isoformat()
+                params['end'] = (start + timedelta(days=rng.randint(1, 7))).isoformat()
+            yield 'GET /api/vehicles/', 'GET', f"/api/vehicles/?{urlencode(params)}", None
+        elif roll < 0.95:
+            yield 'GET booked-dates', 'GET', f"/api/vehicle/{rng.choice(vehicle_ids)}/booked-dates/", None
+        else:
+            start = today + timedelta(days=rng.randint(1, 365))
+            yield 'POST /api/rent/', 'POST', '/api/rent/', json.dumps({
+                'vehicle_id': rng.choice(vehicle_ids),
+                'start_date': start.isoformat(),
+                'end_date': (start + timedelta(days=rng.randint(1, 7))).isoformat(),
+                'pickup_location': 'downtown',
+            })
+
+
+def drive(port, sessions, vehicle_ids, concurrency, duration, seed=0):
+    """
+    Runs concurrency clients, each on its own keep-alive connection and
+    session, for duration seconds. Returns (Recorder, elapsed seconds).
+    """
+    recorder = Recorder()
+    today = date.today()
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = []
+
+    def client(number):
+        rng = random.Random(seed * 100003 + number)
+        csrf_token = get_random_string(32)
+        headers = {
+            'Cookie': f"sessionid={sessions[number % len(sessions)]}; csrftoken={csrf_token}",
+            'X-CSRFToken': csrf_token,
+            'Content-Type': 'application/json',
+        }
+        connection = HTTPConnection('127.0.0.1', port, timeout=60)
+        barrier.wait()
+        for endpoint, method, path, body in api_requests(rng, vehicle_ids, csrf_token, today):
+            if time.monotonic() >= deadline[0]:
+                break
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except OSError:
+                status = 'error'
+                connection.close()
+            recorder.record(endpoint, status, time.perf_counter() - started)
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    deadline.append(time.monotonic() + duration)
+    started = time.perf_counter()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+
+@benchmark('asgi_vs_wsgi')
+def bench_asgi_vs_wsgi(stdout, vehicles=2000, reservations=20, levels='1,8,32,64', duration=10, threads=8):
+    """
+    Compares JSON API throughput under uvicorn (async views) and gunicorn gthread (WSGI) as connections grow.
+    """
+    generate_fleet(vehicles, max(int(level) for level in levels.split(',')), reservations, seed=1)
+    sessions = []
+    for user in User.objects.filter(username__startswith='loadtest'):
+        client = Client()
+        client.force_login(user)
+        sessions.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+    vehicle_ids = list(Vehicle.objects.values_list('id', flat=True))
+    database = str(connections['default'].settings_dict['NAME'])
+    connections.close_all()
+
+    with tempfile.TemporaryDirectory() as directory:
+        Path(directory, 'bench_server_settings.py').write_text(SERVER_SETTINGS.format(name=database))
+        env = {
+            **os.environ,
+            'PYTHONPATH': os.pathsep.join([directory, str(settings.BASE_DIR)]),
+            'DJANGO_SETTINGS_MODULE': 'bench_server_settings',
+        }
+        port = free_port()
+        servers = {
+            f"wsgi (gunicorn gthread, 1x{threads} threads)": [
+                sys.executable, '-m', 'gunicorn', '--worker-class', 'gthread', '--workers', '1',
+                '--threads', str(threads), '--bind', f"127.0.0.1:{port}", 'myproject.wsgi:application',
+            ],
+            "asgi (uvicorn, 1 worker)": [
+                sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', str(port),
+                '--no-access-log', 'myproject.asgi:application',
+            ],
+        }
+        stdout.write(f"{vehicles} vehicles x {reservations} reservations, {duration}s per level")
+        for label, argv in servers.items():
+            stdout.write(label)
+            with running_server(argv, env, port):
+                # Warm the caches, and the server's imports, before measuring.
+                drive(port, sessions, vehicle_ids, 4, 2)
+                for level in levels.split(','):
+                    recorder, elapsed = drive(port, sessions, vehicle_ids, int(level), duration)
+                    rows = recorder.report(elapsed)
+                    samples = sorted(sample for latencies in recorder.latencies.values() for sample in latencies)
+                    statuses = Counter()
+                    for row in rows:
+                        statuses.update(row['statuses'])
+                    stdout.write(
+                        f"  {int(level):>4} connections: {len(samples) / elapsed:>8.1f} req/s  "
+                        f"p50={percentile(samples, 50) * 1000:>7.1f}ms p95={percentile(samples, 95) * 1000:>7.1f}ms "
+                        f"p99={percentile(samples, 99) * 1000:>7.1f}ms  "
+                        + ' '.join(f"{status}:{count}" for status, count in sorted(statuses.items(), key=str))
+                    )
+
+
+def sqlite_copy(source, target):
+    """Copies an SQLite database, including anything still in its WAL."""
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def mixed_workload(alias, vehicle_ids, user_id, concurrency, duration, write_share, persistent, seed=0):
+    """
+    Runs concurrency threads against database alias for duration seconds.
+    Reads are a catalog page and a vehicle's booked ranges; writes are a
+    booking-style check-then-insert in one transaction. Without persistent,
+    each operation gets a new connection, as each request does with
+    CONN_MAX_AGE = 0. Returns (Recorder, elapsed seconds).
+    """
+    recorder = Recorder()
+    barrier = threading.Barrier(concurrency + 1)
+    today = date.today()
+    deadline = []
+
+    def read(rng):
+        list(Vehicle.objects.using(alias).filter(type=rng.choice(['car', 'bike'])).order_by('name', 'id')[:7])
+        list(Reservation.objects.using(alias).filter(
+            vehicle_id=rng.choice(vehicle_ids), status='active',
+        ).values_list('start_date', 'end_date'))
+
+    def write(rng):
+        vehicle_id = rng.choice(vehicle_ids)
+        start = today + timedelta(days=rng.randint(400, 4000))
+        end = start + timedelta(days=rng.randint(1, 7))
+        with transaction.atomic(using=alias):
+            reservations = Reservation.objects.using(alias)
+            if not reservations.filter(
+                vehicle_id=vehicle_id, status='active', start_date__lt=end, end_date__gt=start,
+            ).exists():
+                # bulk_create: the signal handlers would write to the default database.
+                reservations.bulk_create([Reservation(
+                    user_id=user_id, vehicle_id=vehicle_id, start_date=start, end_date=end,
+                    status='pending_payment',
+                )])
+
+    def worker(number):
+        rng = random.Random(seed * 100003 + number)
+        barrier.wait()
+        try:
+            while time.monotonic() < deadline[0]:
+                kind, operation = ('write', write) if rng.random() < write_share else ('read', read)
+                started = time.perf_counter()
+                try:
+                    operation(rng)
+                    status = 'ok'
+                except DatabaseError as e:
+                    status = 'locked' if 'locked' in str(e) else 'error'
+                recorder.record(kind, status, time.perf_counter() - started)
+                if not persistent:
+                    connections[alias].close()
+        finally:
+            connections[alias].close()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    deadline.append(time.monotonic() + duration)
+    started = time.perf_counter()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+
+@benchmark('sqlite_concurrency')
+def bench_sqlite_concurrency(stdout, vehicles=2000, reservations=20, levels='1,8,32', duration=5,
+                             write_percent=20):
+    """
+    Compares mixed read/write throughput of the stock SQLite setup with the tuned backend.
+    """
+    fleet = seed_fleet(vehicles, reservations)
+    vehicle_ids = [vehicle.id for vehicle in fleet]
+    user_id = User.objects.get(username='bench@example.com').id
+    default = connections['default'].settings_dict
+    connections.close_all()
+
+    options = {key: value for key, value in default['OPTIONS'].items()
+               if key not in ('pragmas', 'busy_retries', 'busy_backoff')}
+    setups = {
+        # What DATABASES held before the tuned backend.
+        'stock': ('django.db.backends.sqlite3', {
+            **options, 'timeout': 20, 'init_command': 'PRAGMA journal_mode = DELETE',
+        }, False),
+        'tuned': (default['ENGINE'], default['OPTIONS'], True),
+    }
+    stdout.write(
+        f"{vehicles} vehicles x {reservations} reservations, {write_percent}% writes, {duration}s per level"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for label, (engine, setup_options, persistent) in setups.items():
+            alias = f"bench_{label}"
+            name = str(Path(directory, f"{label}.sqlite3"))
+            sqlite_copy(str(default['NAME']), name)
+            connections.settings[alias] = {
+                **default, 'ENGINE': engine, 'NAME': name, 'OPTIONS': setup_options,
+                'CONN_MAX_AGE': 600 if persistent else 0,
+            }
+            stdout.write(f"{label} ({engine}, {'persistent' if persistent else 'per-request'} connections)")
+            try:
+                for level in levels.split(','):
+                    recorder, elapsed = mixed_workload(
+                        alias, vehicle_ids, user_id, int(level), duration, write_percent / 100, persistent,
+                    )
+                    parts = []
+                    for kind in ('read', 'write'):
+                        samples = sorted(recorder.latencies[kind])
+                        statuses = ' '.join(
+                            f"{status}:{count}" for status, count in sorted(recorder.statuses[kind].items())
+                        )
+                        parts.append(
+                            f"{kind}s {len(samples) / elapsed:>7.1f}/s "
+                            f"p95={percentile(samples, 95) * 1000:>6.1f}ms [{statuses}]"
+                        )
+                    stdout.write(f"  {int(level):>3} threads: " + '  '.join(parts))
+            finally:
+                connections[alias].close()
+                del connections.settings[alias]
+
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'write_behind': 'myapp.sessions.write_behind',
+    'signed_cookies': 'myapp.sessions.signed_cookies',
+}
+
+
+@benchmark('session_engines')
+def bench_session_engines(stdout, users=64, levels='1,8,32', duration=5, login_percent=5):
+    """
+    Compares authenticated request throughput under each session engine.
+    """
+    from .sessions.write_behind import writes
+
+    generate_fleet(200, users, 5, seed=1)
+    accounts = list(User.objects.filter(username__startswith='loadtest'))
+    vehicle_ids = list(Vehicle.objects.values_list('id', flat=True))
+    connections.close_all()
+
+    stdout.write(f"GET booked-dates as {len(accounts)} users, {login_percent}% logins, {duration}s per level")
+    for label, engine in SESSION_ENGINES.items():
+        stdout.write(f"{label} ({engine})")
+        with override_settings(SESSION_ENGINE=engine, REQUEST_TIMING_SAMPLE_RATE=0):
+            for level in levels.split(','):
+                caches[settings.SESSION_CACHE_ALIAS].clear()
+                recorder = Recorder()
+                session_queries = Counter()
+                barrier = threading.Barrier(int(level) + 1)
+                deadline = []
+
+                def worker(number):
+                    rng = random.Random(number)
+                    client = Client()
+                    user = accounts[number % len(accounts)]
+                    client.force_login(user)
+
+                    def count(execute, sql, params, many, context):
+                        if 'django_session' in sql:
+                            session_queries[number] += 1
+                        return execute(sql, params, many, context)
+
+                    barrier.wait()
+                    try:
+                        with connections['default'].execute_wrapper(count):
+                            while time.monotonic() < deadline[0]:
+                                started = time.perf_counter()
+                                if rng.random() < login_percent / 100:
+                                    client.force_login(user)
+                                    endpoint, status = 'login', 200
+                                else:
+                                    endpoint = 'GET booked-dates'
+                                    status = client.get(
+                                        f"/api/vehicle/{rng.choice(vehicle_ids)}/booked-dates/"
+                                    ).status_code
+                                recorder.record(endpoint, status, time.perf_counter() - started)
+                    finally:
+                        connections.close_all()
+
+                threads = [threading.Thread(target=worker, args=(number,)) for number in range(int(level))]
+                for thread in threads:
+                    thread.start()
+                deadline.append(time.monotonic() + duration)
+                started = time.perf_counter()
+                barrier.wait()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+                writes.flush()
+
+                samples = sorted(recorder.latencies['GET booked-dates'])
+                total = sum(len(latencies) for latencies in recorder.latencies.values())
+                statuses = Counter()
+                for endpoint_statuses in recorder.statuses.values():
+                    statuses.update(endpoint_statuses)
+                stdout.write(
+                    f"  {int(level):>3} threads: {total / elapsed:>7.1f} req/s  "
+                    f"p50={percentile(samples, 50) * 1000:>6.1f}ms p95={percentile(samples, 95) * 1000:>6.1f}ms  "
+                    f"session queries/req={sum(session_queries.values()) / max(total, 1):.2f}  "
+                    + ' '.join(f"{status}:{count}" for status, count in sorted(statuses.items()))
+                )
+
+
+@benchmark('live_streams')
+def bench_live_streams(stdout, streams='100,1000,3000', events=5):
+    """
+    Holds open idle /api/availability/stream/ connections on one worker's
+    event loop, driving the ASGI application directly, and measures what
+    each costs the process and how long an availability change takes to
+    reach all of them.
+    """
+    import asyncio
+    import gc
+    import tracemalloc
+
+    from asgiref.sync import sync_to_async
+    from django.core.asgi import get_asgi_application
+
+    seed_fleet(10, 0)
+    vehicle = Vehicle.objects.first()
+    user = User.objects.get(username='bench@example.com')
+    client = Client()
+    client.force_login(user)
+    cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': '/api/availability/stream/', 'raw_path': b'/api/availability/stream/',
+        'query_string': b'', 'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    booked = iter(range(1, 10 ** 6))
+
+    def book():
+        start = date.today() + timedelta(days=2 * next(booked))
+        Reservation.objects.create(
+            user=user, vehicle=vehicle, start_date=start, end_date=start + timedelta(days=1), status='active',
+        )
+
+    async def connect(application, closed, opened, received):
+        started = asyncio.Event()
+
+        async def receive():
+            if not started.is_set():
+                started.set()
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await closed.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            body = message.get('body', b'')
+            if body.startswith(b'retry:'):
+                opened.append(1)
+            elif b'event: availability' in body:
+                received.append(time.perf_counter())
+
+        return asyncio.create_task(application(dict(scope), receive, send))
+
+    async def run(application, count):
+        closed = asyncio.Event()
+        opened, received = [], []
+        gc.collect()
+        tracemalloc.start()
+        memory, threads = tracemalloc.get_traced_memory()[0], threading.active_count()
+        tasks = []
+        # In waves, as browsers arrive, rather than all at the same instant.
+        for wave in range(0, count, 100):
+            tasks += [await connect(application, closed, opened, received) for _ in range(min(100, count - wave))]
+            while len(opened) < len(tasks):
+                if any(task.done() for task in tasks):
+                    raise RuntimeError("A stream ended before it opened; is the session valid?")
+                await asyncio.sleep(0.01)
+        await asyncio.sleep(1)  # until every stream is idle
+        gc.collect()
+        memory, threads = tracemalloc.get_traced_memory()[0] - memory, threading.active_count() - threads
+        tracemalloc.stop()
+
+        latencies = []
+        for _ in range(events):
+            received.clear()
+            saving = time.perf_counter()
+            await sync_to_async(book)()
+            while len(received) < count:
+                await asyncio.sleep(0.005)
+            latencies.append(max(received) - saving)
+        closed.set()
+        await asyncio.gather(*tasks)
+        return memory, threads, latencies
+
+    with override_settings(REQUEST_TIMING_SAMPLE_RATE=0, LIVE_POLL_INTERVAL=0.5, LIVE_AVAILABILITY=True):
+        # Built here so the middleware sees the overridden settings.
+        application = get_asgi_application()
+        asyncio.run(run(application, 10))  # warm-up: imports, URL resolver and template caches
+        stdout.write(f"idle streams on one event loop, poll interval 0.5s, {events} bookings each")
+        for count in map(int, str(streams).split(',')):
+            memory, threads, latencies = asyncio.run(run(application, count))
+            stdout.write(
+                f"{count:>6} streams: {memory / count / 1024:>5.1f} KiB Python heap each, "
+                f"{threads:+d} threads  delivery to all: "
+                f"mean={statistics.fmean(latencies) * 1000:>5.0f}ms max={max(latencies) * 1000:>5.0f}ms"
+            )
@@ -0,0 +1,89 @@
+"""
+Encodings of a vehicle's booked days for the availability calendar.
+
+Both booked-dates endpoints take format=ranges|rle|bitset, and a from/to
+horizon (from defaults to today) that the coalesced ranges are clipped to:
+
+- ranges: [{"from": "2025-01-03", "to": "2025-01-05"}, ...], which flatpickr's
+  disable option takes as is. "to" is the end date of the last reservation in
+  the range, the day its vehicle is returned.
+- rle: {"start": "2025-01-01", "runs": [2, 2, ...]}, the lengths of
+  alternating free and booked runs of days from start.
+- bitset: {"start": "2025-01-01", "days": 4, "bits": "DA=="}, base64 of a
+  little-endian bitmap where bit i is set if day start + i is booked.
+
+The compact formats stop at the last booked day, and kahani.js decodes them
+back into ranges.
+"""
+import base64
+from datetime import date
+
+FORMATS = ('ranges', 'rle', 'bitset')
+
+
+def parse_optional_date(value, name):
+    """Parses an optional YYYY-MM-DD query parameter; empty means None."""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be in YYYY-MM-DD format.')
+
+
+def parse_horizon(from_str, to_str):
+    """
+    Parses the from/to parameters into the [start, end) horizon; start
+    defaults to today and end to None, for no limit. Raises ValueError with a
+    user-facing message when either is invalid.
+    """
+    start = parse_optional_date(from_str, 'from') or date.today()
+    end = parse_optional_date(to_str, 'to')
+    if end is not None and end <= start:
+        raise ValueError('to must be after from.')
+    return start, end
+
+
+def parse_format(format_str):
+    fmt = format_str or 'ranges'
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}.")
+    return fmt
+
+
+def as_ranges(spans):
+    return [{"from": start.isoformat(), "to": end.isoformat()} for start, end in spans]
+
+
+def as_rle(spans, start):
+    runs = []
+    position = start
+    for span_start, span_end in spans:
+        runs.append((span_start - position).days)
+        runs.append((span_end - span_start).days)
+        position = span_end
+    return {"start": start.isoformat(), "runs": runs}
+
+
+def as_bitset(spans, start):
+    days = (spans[-1][1] - start).days if spans else 0
+    bits = 0
+    for span_start, span_end in spans:
+        bits |= ((1 << (span_end - span_start).days) - 1) << (span_start - start).days
+    return {
+        "start": start.isoformat(),
+        "days": days,
+        "bits": base64.b64encode(bits.to_bytes((days + 7) // 8, 'little')).decode('ascii'),
+    }
+
+
+def encode(spans, fmt, start):
+    """
+    Encodes spans, sorted disjoint (start, end) ranges on or after start, in
+    format fmt.
+    """
+    if fmt == 'rle':
+        return as_rle(spans, start)
+    if fmt == 'bitset':
+        return as_bitset(spans, start)
+    return as_ranges(spans)
@@ -0,0 +1,165 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+
+from .models import Reservation
+
+# How many vehicles each worker keeps in memory before evicting the least recently used.
+MAX_CACHED_VEHICLES = 10000
+
+
+class VehicleBookings:
+    """
+    Sorted active reservations of one vehicle, stamped with the
+    Vehicle.availability_version they were loaded at.
+    """
+    __slots__ = ('version', 'starts', 'ends', 'max_ends')
+
+    def __init__(self, version, ranges):
+        ranges = sorted(ranges)
+        self.version = version
+        self.starts = [start for start, _ in ranges]
+        self.ends = [end for _, end in ranges]
+        # max_ends[i] is the latest end among the first i + 1 ranges, which
+        # lets an overlap test look at a single element after one bisect.
+        self.max_ends = list(accumulate(self.ends, max))
+
+    def overlaps(self, start_date, end_date):
+        # Ranges starting before end_date are candidates; one of them overlaps
+        # if any of them ends after start_date.
+        candidates = bisect_left(self.starts, end_date)
+        return candidates > 0 and self.max_ends[candidates - 1] > start_date
+
+    def ranges(self):
+        return list(zip(self.starts, self.ends))
+
+    def coalesced(self, start=None, end=None):
+        """
+        The booked days as sorted, disjoint ranges: overlapping and
+        back-to-back reservations are merged, and with start or end given the
+        result is clipped to [start, end).
+        """
+        # Ranges before first all end by start; those from last on begin at or after end.
+        first = 0 if start is None else bisect_right(self.max_ends, start)
+        last = len(self.starts) if end is None else bisect_left(self.starts, end)
+        merged = []
+        for range_start, range_end in zip(self.starts[first:last], self.ends[first:last]):
+            if start is not None and range_end <= start:
+                continue
+            if merged and range_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+        if merged and start is not None:
+            merged[0][0] = max(merged[0][0], start)
+        if merged and end is not None:
+            merged[-1][1] = min(merged[-1][1], end)
+        return [tuple(span) for span in merged]
+
+
+class BookingIndex:
+    """
+    Per-process LRU of active reservation ranges keyed by vehicle id.
+
+    Callers pass the vehicle's current availability_version. An entry loaded
+    at a different version is stale and is reloaded from the database, so the
+    index never answers from data older than the version the caller has seen.
+    """
+
+    def __init__(self, max_vehicles=MAX_CACHED_VEHICLES):
+        self.max_vehicles = max_vehicles
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, vehicle_id, version):
+        with self._lock:
+            entry = self._entries.get(vehicle_id)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(vehicle_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def _store(self, vehicle_id, entry):
+        with self._lock:
+            self._entries[vehicle_id] = entry
+            self._entries.move_to_end(vehicle_id)
+            while len(self._entries) > self.max_vehicles:
+                self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _active_ranges(vehicle_id):
+        return Reservation.objects.filter(
+            vehicle_id=vehicle_id,
+            status='active',
+        ).values_list('start_date', 'end_date')
+
+    @staticmethod
+    def _active_ranges_of(vehicle_ids):
+        return Reservation.objects.filter(
+            vehicle_id__in=vehicle_ids,
+            status='active',
+        ).values_list('vehicle_id', 'start_date', 'end_date')
+
+    def _stale(self, versions):
+        entries = {vehicle_id: self._cached(vehicle_id, version) for vehicle_id, version in versions.items()}
+        return entries, {vehicle_id: versions[vehicle_id] for vehicle_id, entry in entries.items() if entry is None}
+
+    def _store_many(self, entries, stale, rows):
+        ranges = {vehicle_id: [] for vehicle_id in stale}
+        for vehicle_id, start, end in rows:
+            ranges[vehicle_id].append((start, end))
+        for vehicle_id, spans in ranges.items():
+            entries[vehicle_id] = self._store(vehicle_id, VehicleBookings(stale[vehicle_id], spans))
+        return entries
+
+    def get(self, vehicle_id, version):
+        entry = self._cached(vehicle_id, version)
+        if entry is None:
+            entry = self._store(vehicle_id, VehicleBookings(version, self._active_ranges(vehicle_id)))
+        return entry
+
+    async def aget(self, vehicle_id, version):
+        """get for async views; a miss loads the ranges through the async ORM."""
+        entry = self._cached(vehicle_id, version)
+        if entry is None:
+            ranges = [span async for span in self._active_ranges(vehicle_id)]
+            entry = self._store(vehicle_id, VehicleBookings(version, ranges))
+        return entry
+
+    def get_many(self, versions):
+        """
+        get for several vehicles at once, given as {vehicle_id: version}.
+        Every stale entry is reloaded by the same single query.
+        """
+        entries, stale = self._stale(versions)
+        if not stale:
+            return entries
+        return self._store_many(entries, stale, self._active_ranges_of(list(stale)))
+
+    async def aget_many(self, versions):
+        entries, stale = self._stale(versions)
+        if not stale:
+            return entries
+        return self._store_many(entries, stale, [row async for row in self._active_ranges_of(list(stale))])
+
+    def has_conflict(self, vehicle, start_date, end_date):
+        """
+        Returns True if an active reservation of vehicle overlaps [start_date, end_date).
+        """
+        return self.get(vehicle.id, vehicle.availability_version).overlaps(start_date, end_date)
+
+    def booked_ranges(self, vehicle_id, version):
+        return self.get(vehicle_id, version).ranges()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+booking_index = BookingIndex()
@@ -0,0 +1,37 @@
+"""
+Vehicles as listed by the catalog JSON of vehicle_data_view.
+
+Catalog pages are read as values_list tuples of CATALOG_VALUES rather than
+Vehicle instances: the database casts the price to a float, and the feature
+labels come ready-made from Vehicle.features, so each row costs one dict and
+no model, Decimal or choice-label lookups.
+"""
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+DEFAULT_IMAGE = '/static/images/default.png'
+
+# id and name first, as the pagination helpers require (see value_keys()).
+CATALOG_VALUES = (
+    'id', 'name', 'type', Cast('price_per_day', FloatField()), 'image_url', 'fuel_type', 'features',
+)
+
+
+def catalog_json(rows):
+    """The catalog entries of rows read with CATALOG_VALUES."""
+    vehicles = []
+    for vehicle_id, name, vehicle_type, price, image_url, fuel_type, features in rows:
+        vehicle = {
+            'id': vehicle_id,
+            'name': name,
+            'type': vehicle_type,
+            'price': price,
+            'priceUnit': 'day',
+            'image': image_url or DEFAULT_IMAGE,
+            'features': features,
+        }
+        # Tagged so that the electric filter works client-side too.
+        if fuel_type == 'electric':
+            vehicle['tags'] = ['electric']
+        vehicles.append(vehicle)
+    return vehicles
@@ -0,0 +1,120 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from . import metrics
+from .models import CatalogVersion
+
+# Primary key of the one CatalogVersion row.
+CATALOG_VERSION_PK = 1
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe least-recently-used map. Hits, misses and evictions
+    are counted per process by stats() and across workers at /metrics, under
+    the cache's name.
+    """
+
+    def __init__(self, max_entries, name):
+        self.max_entries = max_entries
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        metrics.cache_lookups.inc(cache=self.name, result='miss' if value is None else 'hit')
+        return value
+
+    def set(self, key, value):
+        evicted = 0
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            self.evictions += evicted
+        if evicted:
+            metrics.cache_evictions.inc(evicted, cache=self.name)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def _fresh_version():
+    # Versions follow the clock rather than count from 1, so a bump rolled back
+    # with its transaction can never come back with a value that pages were
+    # cached under in the meantime.
+    return int(time.time() * 1000)
+
+
+def get_catalog_version():
+    """
+    The current catalog version: a primary-key lookup, so every worker sees
+    a bump as soon as it commits.
+    """
+    try:
+        return CatalogVersion.objects.values_list('version', flat=True).get(pk=CATALOG_VERSION_PK)
+    except CatalogVersion.DoesNotExist:
+        return 0
+
+
+async def aget_catalog_version():
+    """get_catalog_version for async views."""
+    try:
+        return await CatalogVersion.objects.values_list('version', flat=True).aget(pk=CATALOG_VERSION_PK)
+    except CatalogVersion.DoesNotExist:
+        return 0
+
+
+def bump_catalog_version():
+    """
+    Invalidates every cached catalog page. Called whenever a Vehicle changes,
+    in the same transaction (Vehicle.save opens one, and Django runs deletes
+    in one), so no worker can cache the old vehicles under the new version
+    and a failed bump undoes the change.
+    """
+    updated = CatalogVersion.objects.filter(pk=CATALOG_VERSION_PK).update(
+        version=Greatest(F('version') + 1, Value(_fresh_version())),
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(pk=CATALOG_VERSION_PK, defaults={'version': _fresh_version()})
+
+
+def catalog_etag(version, key):
+    """
+    Strong ETag for the catalog page identified by key at version. The body is
+    fully determined by the two, so the tag can be checked before building it.
+    """
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+catalog_cache = LRUCache(getattr(settings, 'CATALOG_CACHE_MAX_ENTRIES', 512), 'catalog')
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Cache backends whose entries only exist in the process that wrote them.
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+WRITE_BEHIND_ENGINE = 'myapp.sessions.write_behind'
+
+
+@register(Tags.caches)
+def check_session_cache(app_configs, **kwargs):
+    """
+    The write-behind session engine keeps new sessions in the cache until its
+    next flush, so every worker must read the same cache.
+    """
+    if settings.SESSION_ENGINE != WRITE_BEHIND_ENGINE:
+        return []
+    alias = settings.SESSION_CACHE_ALIAS
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f"SESSION_ENGINE {WRITE_BEHIND_ENGINE!r} needs a cache shared by every worker, "
+        f"but the {alias!r} cache uses {backend.rsplit('.', 1)[-1]}.",
+        hint="Point CACHES at a shared backend (e.g. Redis or Memcached), "
+             "or use 'django.contrib.sessions.backends.db'.",
+        id='myapp.E001',
+    )]
@@ -0,0 +1,140 @@
+"""
+Synthetic data for reproducing production-sized behaviour locally.
+
+generate_fleet() writes vehicles, users with phone profiles and reservation
+histories with batched bulk_create calls, then rebuilds the derived tables
+that the bulk inserts bypass (occupancy, search index, rental stats).
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .availability import rebuild_all_occupancy
+from .catalog_cache import bump_catalog_version
+from .models import Reservation, UserProfile, Vehicle
+from .rental_stats import rebuild_all_stats
+from .search import rebuild_search_index
+
+# (name, type, fuel_type, transmission) templates for generated vehicles.
+MODELS = [
+    ('Toyota Camry', 'car', 'petrol', 'automatic'),
+    ('Honda CR-V', 'car', 'hybrid', 'automatic'),
+    ('Tesla Model 3', 'car', 'electric', 'automatic'),
+    ('Ford Mustang', 'car', 'petrol', 'manual'),
+    ('Nissan Leaf', 'car', 'electric', 'automatic'),
+    ('Toyota Land Cruiser', 'car', 'diesel', 'automatic'),
+    ('Yezdi Roadster', 'bike', 'manual', 'none'),
+    ('Royal Enfield Classic', 'bike', 'manual', 'none'),
+    ('Ather 450X', 'bike', 'electric', 'none'),
+]
+
+PICKUP_LOCATIONS = ['Downtown', 'Airport', 'Central station', 'Harbour', 'University']
+
+# How the generated reservations of each period are spread over statuses.
+PAST_STATUSES = (['completed'] * 17) + (['cancelled'] * 3)
+FUTURE_STATUSES = (['active'] * 14) + (['pending_payment'] * 3) + (['payment_failed'] * 1) + (['cancelled'] * 2)
+
+# Share of reservations that get an unpaid duplicate over the same dates, as
+# when several users try to book the same vehicle and only one pays.
+CONTENDED_SHARE = 0.1
+
+
+def generate_vehicles(count, rng, batch_size):
+    vehicles = []
+    for i in range(count):
+        name, vehicle_type, fuel_type, transmission = rng.choice(MODELS)
+        vehicle = Vehicle(
+            name=f"{name} {i:06d}", type=vehicle_type, fuel_type=fuel_type, transmission=transmission,
+            seats=5 if vehicle_type == 'car' else 2, price_per_day=rng.randint(20, 200),
+        )
+        vehicle.render_features()
+        vehicles.append(vehicle)
+    return Vehicle.objects.bulk_create(vehicles, batch_size=batch_size)
+
+
+def generate_users(count, prefix, password, batch_size):
+    """
+    Creates prefix0@example.com ... with one shared password and a phone
+    profile each. Users that already exist are reused. Returns their ids.
+    """
+    # Hashing is deliberately slow, so every user gets the same hash.
+    password_hash = make_password(password)
+    usernames = [f"{prefix}{i}@example.com" for i in range(count)]
+    User.objects.bulk_create(
+        [User(username=username, email=username, password=password_hash) for username in usernames],
+        batch_size=batch_size, ignore_conflicts=True,
+    )
+    user_ids = list(User.objects.filter(username__in=usernames).values_list('id', flat=True))
+    # Phone numbers derived from the id cannot collide with other users'.
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id, phone=f"+1{user_id:010d}") for user_id in user_ids],
+        batch_size=batch_size, ignore_conflicts=True,
+    )
+    return user_ids
+
+
+def reservation_history(vehicle, user_ids, count, rng, today, history_days):
+    """
+    Yields count reservations for vehicle, back to back with random gaps from
+    history_days ago onwards. Active ones never overlap each other (the
+    database refuses that), but some dates also get an unpaid duplicate.
+    """
+    start = today - timedelta(days=history_days)
+    for _ in range(count):
+        start += timedelta(days=rng.randint(0, 10))
+        end = start + timedelta(days=rng.randint(1, 7))
+        statuses = PAST_STATUSES if end < today else FUTURE_STATUSES
+        contenders = 2 if rng.random() < CONTENDED_SHARE else 1
+        for contender in range(contenders):
+            status = rng.choice(statuses)
+            if contender and status == 'active':
+                status = 'cancelled'
+            yield Reservation(
+                user_id=rng.choice(user_ids), vehicle=vehicle, start_date=start, end_date=end,
+                status=status, pickup_location=rng.choice(PICKUP_LOCATIONS),
+                total_cost=vehicle.price_per_day * (end - start).days,
+            )
+        start = end
+
+
+def generate_fleet(vehicles, users, reservations_per_vehicle, seed=0, history_days=180,
+                   user_prefix='loadtest', password='loadtest', batch_size=1000, log=None):
+    """
+    Adds a synthetic fleet to the database and returns the number of rows
+    created per model. log, if given, is called with a line per step.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    today = date.today()
+
+    user_ids = generate_users(users, user_prefix, password, batch_size)
+    log(f"{len(user_ids)} users with phone profiles")
+
+    fleet = generate_vehicles(vehicles, rng, batch_size)
+    log(f"{len(fleet)} vehicles")
+
+    created = 0
+    batch = []
+    for vehicle in fleet:
+        batch.extend(reservation_history(vehicle, user_ids, reservations_per_vehicle, rng, today, history_days))
+        if len(batch) >= batch_size:
+            Reservation.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+            batch = []
+    Reservation.objects.bulk_create(batch, batch_size=batch_size)
+    created += len(batch)
+    log(f"{created} reservations")
+
+    # bulk_create bypasses the signals that keep these in sync.
+    with transaction.atomic():
+        rebuild_all_occupancy()
+        rebuild_search_index()
+        bump_catalog_version()
+    log("Rebuilt occupancy and search index")
+    rebuild_all_stats()
+    log("Rebuilt rental stats")
+
+    return {'users': len(user_ids), 'vehicles': len(fleet), 'reservations': created}
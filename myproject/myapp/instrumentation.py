@@ -0,0 +1,237 @@
+"""
+Per-request cost accounting: query count and SQL time, template render time
+and view time, reported in a Server-Timing header and one structured log line
+per sampled request, with repeated query patterns (N+1) called out.
+
+Enable by listing RequestTimingMiddleware first in MIDDLEWARE and using
+TimedDjangoTemplates as the template backend. Settings:
+
+- REQUEST_TIMING_SAMPLE_RATE: share of requests measured (0.0-1.0). Requests
+  that are not sampled pay for one random() call and nothing else.
+- REQUEST_TIMING_REPEAT_THRESHOLD: how many times one SELECT statement may run
+  in a request before it is reported as a repeated pattern.
+
+Under ASGI the middleware runs natively async. Queries then run on the
+request's sync_to_async thread, so the query wrappers are installed there.
+"""
+import json
+import logging
+import random
+import sys
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('myapp.request_timing')
+
+# The RequestTiming of the request being handled, if it is sampled.
+current_timing = ContextVar('current_timing', default=None)
+
+
+class RequestTiming:
+    """Costs accumulated while handling one request. Durations are in seconds."""
+
+    def __init__(self, repeat_threshold):
+        self.repeat_threshold = repeat_threshold
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_time = None
+        self.query_count = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.rendering = None  # name of the outermost template being rendered
+        self.statements = {}  # SELECT sql (with placeholders) -> times run
+        self.executions = set()  # (sql, params) of every SELECT, to spot exact repeats
+        self.duplicates = 0
+        self.repeated = {}  # sql -> (project frame, template) where it crossed the threshold
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - started
+            self.query_count += 1
+            if sql.lstrip()[:6].upper() == 'SELECT':
+                self._track(sql, params)
+
+    def _track(self, sql, params):
+        try:
+            execution = (sql, tuple(params or ()))
+            if execution in self.executions:
+                self.duplicates += 1
+            else:
+                self.executions.add(execution)
+        except TypeError:
+            pass  # unhashable params (e.g. a dict); exact repeats go uncounted
+        count = self.statements[sql] = self.statements.get(sql, 0) + 1
+        if count == self.repeat_threshold:
+            self.repeated[sql] = (project_caller(), self.rendering)
+
+    def summary(self, request, response):
+        total = time.perf_counter() - self.started
+        match = getattr(request, 'resolver_match', None)
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'view_ms': round(self.view_time * 1000, 2) if self.view_time is not None else None,
+            'db_ms': round(self.query_time * 1000, 2),
+            'queries': self.query_count,
+            'duplicate_queries': self.duplicates,
+            'template_ms': round(self.template_time * 1000, 2),
+            'repeated_queries': [
+                {'sql': sql[:200], 'count': self.statements[sql], 'at': caller, 'template': template}
+                for sql, (caller, template) in self.repeated.items()
+            ],
+        }
+
+
+def project_caller():
+    """
+    Returns 'path:line in function' for the innermost frame that belongs to the
+    project rather than Django, a library or this module.
+    """
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and filename != __file__ and 'site-packages' not in filename:
+            return f"{filename[len(base_dir) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def server_timing(summary):
+    entries = [
+        f'db;dur={summary["db_ms"]};desc="{summary["queries"]} queries"',
+        f'tpl;dur={summary["template_ms"]}',
+    ]
+    if summary['view_ms'] is not None:
+        entries.append(f'view;dur={summary["view_ms"]}')
+    entries.append(f'total;dur={summary["total_ms"]}')
+    return ', '.join(entries)
+
+
+class RequestTimingMiddleware:
+    """
+    Measures a sample of requests. Durations overlap: total covers the whole
+    middleware stack, view the view function (including the templates it
+    renders), and db and tpl are summed over the request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+        self.repeat_threshold = getattr(settings, 'REQUEST_TIMING_REPEAT_THRESHOLD', 5)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # An async process_view spares every request a hop to a thread.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        timing = RequestTiming(self.repeat_threshold)
+        token = current_timing.set(timing)
+        try:
+            with ExitStack() as stack:
+                install_wrappers(stack, timing)
+                response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.report(timing, request, response)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        timing = RequestTiming(self.repeat_threshold)
+        token = current_timing.set(timing)
+        stack = ExitStack()
+        try:
+            await sync_to_async(install_wrappers)(stack, timing)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_timing.reset(token)
+        return self.report(timing, request, response)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def report(self, timing, request, response):
+        if timing.view_started is not None:
+            timing.view_time = time.perf_counter() - timing.view_started
+        summary = timing.summary(request, response)
+        response['Server-Timing'] = server_timing(summary)
+        level = logging.WARNING if summary['repeated_queries'] else logging.INFO
+        logger.log(level, json.dumps(summary), extra={'timing': summary})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mark_view_started()
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        mark_view_started()
+        return None
+
+
+def mark_view_started():
+    timing = current_timing.get()
+    if timing is not None:
+        timing.view_started = time.perf_counter()
+
+
+def install_wrappers(stack, timing):
+    """
+    Routes the queries of this thread's connections through timing until
+    stack is closed. Connections are per thread, so under ASGI this must run
+    on the thread sync_to_async gives the request.
+    """
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(timing.execute_wrapper))
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timing = current_timing.get()
+        if timing is None:
+            return super().render(context, request)
+        # Only the outermost render counts, should a template render another.
+        timing.template_depth += 1
+        if timing.template_depth == 1:
+            timing.rendering = self.origin.template_name
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.template_depth -= 1
+            if not timing.template_depth:
+                timing.template_time += time.perf_counter() - started
+                timing.rendering = None
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time added to the request's timing."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
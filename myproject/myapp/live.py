@@ -0,0 +1,197 @@
+"""
+Live availability changes, streamed to browsers as Server-Sent Events.
+
+Every change to a vehicle's active reservations adds an AvailabilityEvent
+row in the same transaction (see signals.py), and that table is the
+broadcast between worker processes. Within a process, one asyncio task polls
+it for rows past the last id seen, every LIVE_POLL_INTERVAL seconds while
+any stream is open, and hands them to every open stream. A process costs
+one primary-key range query per interval however many streams it holds,
+and an idle stream is a small Subscription and a parked coroutine that has
+given back its database connection (Django's ASGI handler still keeps an
+idle executor thread for each open request).
+
+SQLite runs one write transaction at a time, so event ids become visible in
+order and polling past the last id seen never skips a row.
+
+A browser that reconnects with Last-Event-ID is sent what it missed from
+the table. If that is no longer possible (the events were pruned, or there
+are more than MAX_BACKLOG of them) or a stream falls MAX_BACKLOG events
+behind, it gets a reset event instead and should refetch its booked dates.
+"""
+import asyncio
+import contextvars
+import json
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .models import AvailabilityEvent
+
+# Most events queued for one stream, or replayed on reconnect, before a reset.
+MAX_BACKLOG = 1000
+
+# How long EventSource waits before reconnecting, in milliseconds.
+RETRY_MS = 3000
+
+RESET = "event: reset\ndata: {}\n\n"
+
+
+def as_sse(event):
+    data = json.dumps({
+        'vehicle': event.vehicle_id,
+        'from': event.start_date.isoformat(),
+        'to': event.end_date.isoformat(),
+        'change': event.change,
+        'version': event.version,
+    }, separators=(',', ':'))
+    return f"id: {event.id}\nevent: availability\ndata: {data}\n\n"
+
+
+async def events_after(event_id, limit=MAX_BACKLOG):
+    return [event async for event in AvailabilityEvent.objects.filter(id__gt=event_id).order_by('id')[:limit]]
+
+
+class Subscription:
+    """The events one open stream has yet to send."""
+    __slots__ = ('pending', 'wakeup', 'overflowed')
+
+    def __init__(self):
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.overflowed = False
+
+    def push(self, events):
+        if len(self.pending) + len(events) > MAX_BACKLOG:
+            self.overflowed = True
+            self.pending.clear()
+        elif not self.overflowed:
+            self.pending.extend(events)
+        self.wakeup.set()
+
+
+class Broadcaster:
+    """
+    Polls the event table on behalf of every stream of this process. The
+    polling task runs only while there are subscribers.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_id = 0
+        self._task = None
+        self._ready = None
+
+    async def subscribe(self):
+        """
+        Registers a new stream. Events after last_id, as it stands when this
+        returns, are pushed to it.
+        """
+        subscription = Subscription()
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            if self._task is not None and self._task.get_loop() is not loop:
+                # Streams of a loop that has gone away (e.g. between tests).
+                self.subscribers.clear()
+            self._ready = loop.create_future()
+            # In a context of its own, so the poller keeps one database
+            # connection for the process rather than sharing a request's.
+            self._task = contextvars.Context().run(loop.create_task, self._poll(self._ready))
+        self.subscribers.add(subscription)
+        try:
+            await asyncio.shield(self._ready)
+        except BaseException:
+            self.subscribers.discard(subscription)
+            raise
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    async def _poll(self, ready):
+        interval = getattr(settings, 'LIVE_POLL_INTERVAL', 0.5)
+        try:
+            # Nothing has been polled since the last stream closed: start from now.
+            self.last_id = await AvailabilityEvent.objects.order_by('-id').values_list('id', flat=True).afirst() or 0
+        except BaseException as e:
+            ready.set_exception(e)
+            raise
+        ready.set_result(None)
+        while self.subscribers:
+            await asyncio.sleep(interval)
+            try:
+                events = await events_after(self.last_id)
+            except DatabaseError:
+                continue
+            if events:
+                self.last_id = events[-1].id
+                for subscription in list(self.subscribers):
+                    subscription.push(events)
+
+
+broadcaster = Broadcaster()
+
+
+def _close_connections():
+    for connection in connections.all(initialized_only=True):
+        # A connection inside a transaction is the caller's (e.g. a test
+        # case's, shared with the async client), so leave it be.
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+async def go_idle():
+    """
+    Closes the request's database connections, which an idle stream does
+    not need; a later query opens a new one.
+    """
+    await sync_to_async(_close_connections)()
+
+
+async def stream(last_event_id=None):
+    """
+    Yields the text of one event stream: what was missed since
+    last_event_id, if given, then every new event, with a comment line every
+    LIVE_HEARTBEAT seconds so proxies keep the idle connection open.
+    """
+    heartbeat = getattr(settings, 'LIVE_HEARTBEAT', 15)
+    subscription = await broadcaster.subscribe()
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        sent = broadcaster.last_id
+        if last_event_id is not None:
+            # Pruning removes the oldest events first, so while the last one
+            # the client saw is still there, so is everything after it.
+            missed = None
+            if await AvailabilityEvent.objects.filter(id=last_event_id).aexists():
+                missed = await events_after(last_event_id, MAX_BACKLOG + 1)
+            if missed is None or len(missed) > MAX_BACKLOG:
+                yield RESET
+                return
+            if missed:
+                yield ''.join(map(as_sse, missed))
+            sent = max([last_event_id] + [event.id for event in missed])
+        await go_idle()
+
+        while True:
+            try:
+                await asyncio.wait_for(subscription.wakeup.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            subscription.wakeup.clear()
+            if subscription.overflowed:
+                yield RESET
+                return
+            chunk = []
+            while subscription.pending:
+                event = subscription.pending.popleft()
+                if event.id > sent:
+                    chunk.append(as_sse(event))
+                    sent = event.id
+            if chunk:
+                yield ''.join(chunk)
+    finally:
+        broadcaster.unsubscribe(subscription)
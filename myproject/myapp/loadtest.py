@@ -0,0 +1,203 @@
+"""
+End-to-end load test against a running server.
+
+Simulated users log in with the accounts made by generate_fleet and then
+loop over the real URL set the way the front end drives it: browse
+/api/vehicles/, open a vehicle's booked dates, sometimes book and pay, and
+look at the dashboard. Only HTTP is used, so the server can be any local
+deployment (runserver, gunicorn...).
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+SEARCH_TERMS = ['tesla', 'camry', 'royal', 'leaf', 'ath', 'mustang']
+FILTERS = ['all', 'all', 'car', 'bike', 'electric']
+
+
+class NoRedirect(HTTPRedirectHandler):
+    # Every request is timed on its own, so redirects are not followed.
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(samples))) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+class Recorder:
+    """Thread-safe latency and status collector, per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, endpoint, status, seconds):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def report(self, elapsed):
+        """Returns one dict per endpoint, sorted by endpoint."""
+        rows = []
+        with self._lock:
+            for endpoint in sorted(self.latencies):
+                samples = sorted(self.latencies[endpoint])
+                statuses = self.statuses[endpoint]
+                errors = sum(count for status, count in statuses.items() if status == 'error' or status >= 500)
+                rows.append({
+                    'endpoint': endpoint,
+                    'requests': len(samples),
+                    'errors': errors,
+                    'rps': len(samples) / elapsed if elapsed else 0.0,
+                    'p50_ms': percentile(samples, 50) * 1000,
+                    'p95_ms': percentile(samples, 95) * 1000,
+                    'p99_ms': percentile(samples, 99) * 1000,
+                    'statuses': dict(statuses),
+                })
+        return rows
+
+
+class VirtualUser:
+    """One browser session: its own cookie jar, CSRF token and random choices."""
+
+    def __init__(self, base_url, username, password, recorder, rng, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.recorder = recorder
+        self.rng = rng
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirect)
+        self.vehicle_ids = []
+
+    def csrf_token(self):
+        # Read on every use: login rotates the token.
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, endpoint, path, data=None, json_body=None):
+        """
+        Sends one request, records it under endpoint and returns
+        (status, body). status is 'error' if no response came back.
+        """
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+            headers['X-CSRFToken'] = self.csrf_token()
+        elif data is not None:
+            body = urlencode({**data, 'csrfmiddlewaretoken': self.csrf_token()}).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        request = Request(self.base_url + path, data=body, headers=headers)
+
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+        except HTTPError as e:
+            status, content = e.code, e.read()
+        except (URLError, OSError):
+            status, content = 'error', b''
+        self.recorder.record(endpoint, status, time.perf_counter() - started)
+        return status, content
+
+    def login(self):
+        self.request('GET /', '/')
+        self.request('POST /login/', '/login/', {
+            'loginEmail': self.username, 'loginPassword': self.password,
+        })
+        # Both outcomes redirect; only a successful login starts a session.
+        return any(cookie.name == 'sessionid' for cookie in self.cookies)
+
+    def browse(self):
+        params = {'filter': self.rng.choice(FILTERS)}
+        if self.rng.random() < 0.3:
+            params['search'] = self.rng.choice(SEARCH_TERMS)
+        if self.rng.random() < 0.3:
+            start = date.today() + timedelta(days=self.rng.randint(1, 90))
+            params['start'] = start.isoformat()
+            params['end'] = (start + timedelta(days=self.rng.randint(1, 7))).isoformat()
+        for _ in range(self.rng.randint(1, 3)):
+            status, content = self.request('GET /api/vehicles/', f"/api/vehicles/?{urlencode(params)}")
+            if status != 200:
+                return
+            page = json.loads(content)
+            self.vehicle_ids = [vehicle['id'] for vehicle in page['vehicles']] or self.vehicle_ids
+            if not page.get('next_cursor'):
+                return
+            params['cursor'] = page['next_cursor']
+
+    def book(self, vehicle_id):
+        start = date.today() + timedelta(days=self.rng.randint(1, 120))
+        status, content = self.request('POST /api/rent/', '/api/rent/', json_body={
+            'vehicle_id': vehicle_id,
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=self.rng.randint(1, 7))).isoformat(),
+            'pickup_location': 'downtown',
+        })
+        if status != 200:
+            return
+        reservation_id = json.loads(content)['redirect_url'].rstrip('/').rsplit('/', 1)[-1]
+        # Most payments go through; the rest exercise the retry path.
+        cvv = '123' if self.rng.random() < 0.8 else '000'
+        self.request('POST /process-payment/', '/process-payment/', {'reservation_id': reservation_id, 'cvv': cvv})
+
+    def iteration(self):
+        self.browse()
+        if self.vehicle_ids:
+            vehicle_id = self.rng.choice(self.vehicle_ids)
+            self.request('GET booked-dates', f"/api/vehicle/{vehicle_id}/booked-dates/")
+            if self.rng.random() < 0.5:
+                self.book(vehicle_id)
+        self.request('GET /home/', '/home/')
+
+
+def run_load_test(base_url, concurrency, duration, users=200, user_prefix='loadtest',
+                  password='loadtest', think_time=0.0, seed=0):
+    """
+    Runs concurrency simulated users for duration seconds against base_url.
+    Thread i logs in as <user_prefix><i % users>@example.com. Returns
+    (report rows, elapsed seconds, number of failed logins).
+    """
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    failed_logins = []
+
+    def simulate(number):
+        user = VirtualUser(
+            base_url, f"{user_prefix}{number % users}@example.com", password,
+            recorder, random.Random(seed * 100003 + number),
+        )
+        if not user.login():
+            failed_logins.append(user.username)
+            return
+        while time.monotonic() < deadline:
+            user.iteration()
+            if think_time:
+                time.sleep(think_time)
+
+    threads = [threading.Thread(target=simulate, args=(number,)) for number in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return recorder.report(elapsed), elapsed, len(failed_logins)
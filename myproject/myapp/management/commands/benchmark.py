@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from myapp.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = "Runs a named benchmark against a throwaway test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', help=f"One of: {', '.join(sorted(BENCHMARKS))}")
+        parser.add_argument(
+            '--set', action='append', default=[], metavar='KEY=VALUE',
+            help="Override a benchmark parameter, e.g. --set vehicles=1000",
+        )
+        parser.add_argument('--list', action='store_true', help="List available benchmarks.")
+
+    def handle(self, *args, **options):
+        if options['list'] or not options['name']:
+            for name, func in sorted(BENCHMARKS.items()):
+                summary = (func.__doc__ or '').strip().splitlines()
+                self.stdout.write(f"{name:<20} {summary[0] if summary else ''}")
+            return
+
+        func = BENCHMARKS.get(options['name'])
+        if func is None:
+            raise CommandError(f"Unknown benchmark '{options['name']}'.")
+
+        params = {}
+        for item in options['set']:
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"Expected KEY=VALUE, got '{item}'.")
+            params[key] = int(value) if value.lstrip('-').isdigit() else value
+
+        # Never benchmark against real data: build a fresh test database.
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            func(self.stdout, **params)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
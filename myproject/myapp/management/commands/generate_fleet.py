@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.fleet import generate_fleet
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds a synthetic fleet to the configured database: vehicles, users with phone "
+        "profiles and overlapping reservation histories. Meant for local load testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicles', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--reservations-per-vehicle', type=int, default=30)
+        parser.add_argument('--history-days', type=int, default=180,
+                            help="How far back the reservation histories start.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--user-prefix', default='loadtest',
+                            help="Users are named <prefix><n>@example.com.")
+        parser.add_argument('--password', default='loadtest', help="Password of every generated user.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per INSERT.")
+
+    def handle(self, *args, **options):
+        if options['vehicles'] < 0 or options['users'] < 1:
+            raise CommandError("Need at least one user and a non-negative number of vehicles.")
+        created = generate_fleet(
+            vehicles=options['vehicles'],
+            users=options['users'],
+            reservations_per_vehicle=options['reservations_per_vehicle'],
+            seed=options['seed'],
+            history_days=options['history_days'],
+            user_prefix=options['user_prefix'],
+            password=options['password'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        summary = ', '.join(f"{count} {model}" for model, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Generated {summary}."))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.loadtest import run_load_test
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives a running server with concurrent simulated users and reports throughput "
+        "and p50/p95/p99 latency per endpoint. Log-ins use the accounts made by generate_fleet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=20, help="Simulated users running at once.")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to run for.")
+        parser.add_argument('--users', type=int, default=200,
+                            help="Number of generated accounts to spread the simulated users over.")
+        parser.add_argument('--user-prefix', default='loadtest')
+        parser.add_argument('--password', default='loadtest')
+        parser.add_argument('--think-ms', type=float, default=0, help="Pause between iterations of a user.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['users'] < 1:
+            raise CommandError("--concurrency and --users must be at least 1.")
+        rows, elapsed, failed_logins = run_load_test(
+            base_url=options['base_url'],
+            concurrency=options['concurrency'],
+            duration=options['duration'],
+            users=options['users'],
+            user_prefix=options['user_prefix'],
+            password=options['password'],
+            think_time=options['think_ms'] / 1000,
+            seed=options['seed'],
+        )
+        if failed_logins == options['concurrency']:
+            raise CommandError(
+                f"No simulated user could log in at {options['base_url']}. "
+                "Is the server running, and were the users made with generate_fleet?"
+            )
+
+        total = sum(row['requests'] for row in rows)
+        self.stdout.write(
+            f"{options['concurrency']} users for {elapsed:.1f}s: {total} requests "
+            f"({total / elapsed:.1f} req/s), {failed_logins} failed logins"
+        )
+        self.stdout.write(
+            f"{'endpoint':<26} {'requests':>8} {'errors':>6} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses"
+        )
+        for row in rows:
+            statuses = ' '.join(f"{status}:{count}" for status, count in sorted(row['statuses'].items(), key=str))
+            self.stdout.write(
+                f"{row['endpoint']:<26} {row['requests']:>8} {row['errors']:>6} {row['rps']:>8.1f} "
+                f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}  {statuses}"
+            )
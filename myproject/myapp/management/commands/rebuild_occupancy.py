@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from myapp.availability import rebuild_all_occupancy
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the vehicle occupancy bitmaps from active reservations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rows = rebuild_all_occupancy(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} occupancy rows."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp.rental_stats import rebuild_all_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-user rental stats table from the Reservation table."
+
+    def handle(self, *args, **options):
+        rows = rebuild_all_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rental stats for {rows} users."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Backfills the daily booking and revenue rollups from the Reservation table."
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} rows per rollup table."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from myapp.catalog_cache import bump_catalog_version
+from myapp.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the FTS5 vehicle search index from the Vehicle table."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = rebuild_search_index()
+        # Bulk loads bypass the Vehicle signals, so drop cached catalog pages too.
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} vehicles."))
@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from myapp.sweeper import sweep
+
+
+class Command(BaseCommand):
+    help = (
+        "Completes expired active rentals, cancels abandoned unpaid reservations and "
+        "prunes old availability events in bounded batches. Run it from cron, or with --loop as a long-running worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Reservations updated per transaction.")
+        parser.add_argument('--pending-ttl-hours', type=float, default=24,
+                            help="Cancel unpaid reservations older than this.")
+        parser.add_argument('--event-retention-seconds', type=float, default=None,
+                            help="Prune availability events older than this (default: LIVE_EVENT_RETENTION).")
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help="Stop each task after this many batches per run.")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep sweeping, sleeping --interval seconds between runs.")
+        parser.add_argument('--interval', type=float, default=60)
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def run_once(self, options):
+        totals = {}
+        for result in sweep(
+            batch_size=options['batch_size'],
+            pending_ttl=timedelta(hours=options['pending_ttl_hours']),
+            max_batches=options['max_batches'],
+            event_retention=(
+                None if options['event_retention_seconds'] is None
+                else timedelta(seconds=options['event_retention_seconds'])
+            ),
+        ):
+            if result.rows or options['verbosity'] > 1:
+                self.stdout.write(str(result))
+            totals[result.task] = totals.get(result.task, 0) + result.rows
+        summary = ', '.join(f"{task}={rows}" for task, rows in totals.items())
+        self.stdout.write(self.style.SUCCESS(f"Sweep finished: {summary}"))
@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.utilization import GROUPINGS, report, update
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates the fleet utilization matrix from the reservations changed since "
+        "the last run, and optionally prints a utilization report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild the matrix from every reservation.")
+        parser.add_argument('--by', choices=GROUPINGS, help="Print a report grouped by vehicle, type or location.")
+        parser.add_argument('--from', dest='start', type=date.fromisoformat, help="First day of the report (default: 30 days ago).")
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, help="Day after the last of the report (default: today).")
+
+    def handle(self, *args, **options):
+        matrix, rewritten = update(full=options['full'])
+        if rewritten is None:
+            self.stdout.write(self.style.SUCCESS(
+                f"Built the matrix: {len(matrix.vehicle_ids)} vehicles from {matrix.origin}."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rewrote {rewritten} vehicle rows."))
+
+        if options['by']:
+            end = options['end'] or date.today()
+            start = options['start'] or end - timedelta(days=30)
+            if end <= start:
+                raise CommandError("--to must be after --from.")
+            self.stdout.write(f"{options['by']:<30} {'util.':>7} {'booked':>8} {'RevPAD':>9} {'idle':>6}")
+            for row in report(matrix, start, end, options['by']):
+                idle = row.get('longest_idle', '')
+                self.stdout.write(
+                    f"{str(row['key'])[:30]:<30} {row['utilization']:>7.1%} {row['booked_days']:>8} "
+                    f"{row['revenue_per_available_day']:>9.2f} {idle:>6}"
+                )
@@ -0,0 +1,291 @@
+"""
+Prometheus metrics that add up across worker processes.
+
+Each process buffers increments in memory, and a background thread adds the
+buffer to the series table every METRICS_FLUSH_INTERVAL seconds while it is
+not empty, and once more when the process exits. The table is in an SQLite
+file of its own, METRICS_DB, so requests never wait on these writes and they
+never take the main database's write lock. /metrics renders the table, so
+every worker's counts are included whichever worker serves the scrape.
+Series are plain sums (histogram buckets are stored cumulatively), so adding
+them is all a flush has to do.
+"""
+import atexit
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# Methods are a label, so anything outside this set is counted as 'other'.
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+# Request latency buckets, in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = {}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(int(value)) if value == int(value) else repr(value)
+
+
+def _db_path():
+    return str(getattr(settings, 'METRICS_DB', Path(settings.BASE_DIR) / 'metrics.sqlite3'))
+
+
+class SeriesStore:
+    """
+    The series table in the METRICS_DB file, in WAL mode, one connection per
+    thread.
+    """
+
+    def __init__(self, timeout=5.0):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        path = _db_path()
+        db = getattr(self._local, 'db', None)
+        if db is not None and self._local.path != path:
+            db.close()
+            db = None
+        if db is None:
+            db = sqlite3.connect(path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS series ("
+                "name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, "
+                "PRIMARY KEY (name, labels))"
+            )
+            self._local.db, self._local.path = db, path
+        return db
+
+    def add(self, increments):
+        """Adds {(series, labels): amount} to the table, in one transaction."""
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO series (name, labels, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                [(series, labels, amount) for (series, labels), amount in increments.items()],
+            )
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def rows(self):
+        return self._connection().execute("SELECT name, labels, value FROM series").fetchall()
+
+    def close(self):
+        """Closes the calling thread's connection."""
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+store = SeriesStore()
+
+
+class MetricBuffer:
+    """Increments not yet written to the series table."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(float)
+        self._flusher = None
+
+    def add(self, series, labels, amount):
+        with self._lock:
+            self._pending[series, labels] += amount
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def _run(self):
+        """
+        Flushes the buffer every METRICS_FLUSH_INTERVAL seconds until it is
+        empty, then exits; the next increment starts it again.
+        """
+        try:
+            while True:
+                time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0))
+                self.flush()
+                with self._lock:
+                    if not self._pending:
+                        self._flusher = None
+                        return
+        except BaseException:
+            with self._lock:
+                self._flusher = None
+            raise
+        finally:
+            store.close()
+
+    def flush(self):
+        """Adds the buffered increments to the table."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, defaultdict(float)
+        try:
+            store.add(pending)
+        except sqlite3.Error:
+            # Keep the counts for the next flush rather than lose them.
+            with self._lock:
+                for key, amount in pending.items():
+                    self._pending[key] += amount
+
+
+buffer = MetricBuffer()
+atexit.register(buffer.flush)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY[name] = self
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def series_names(self):
+        return (self.name,)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        buffer.add(self.name, format_labels(self._labels(labels)), amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        for bound in self.buckets:
+            if value <= bound:
+                buffer.add(f'{self.name}_bucket', format_labels(labels + (('le', _format_value(bound)),)), 1)
+        plain = format_labels(labels)
+        buffer.add(f'{self.name}_sum', plain, value)
+        buffer.add(f'{self.name}_count', plain, 1)
+
+    def series_names(self):
+        return (f'{self.name}_bucket', f'{self.name}_sum', f'{self.name}_count')
+
+
+request_duration = Histogram(
+    'gryphon_http_request_duration_seconds', "Time to build a response, by URL name.", ('view', 'method'),
+)
+responses = Counter(
+    'gryphon_http_responses_total', "Responses sent, by URL name and status code.", ('view', 'method', 'status'),
+)
+bookings_attempted = Counter('gryphon_bookings_attempted_total', "Valid booking requests received by /api/rent/.")
+bookings_created = Counter('gryphon_bookings_created_total', "Reservations created, awaiting payment.")
+booking_conflicts = Counter('gryphon_booking_conflicts_total', "Booking requests refused with 409 Conflict.")
+payments = Counter(
+    'gryphon_payments_total',
+    "Payment attempts by outcome: succeeded, failed, or conflict (dates taken before payment).",
+    ('outcome',),
+)
+
+cache_lookups = Counter(
+    'gryphon_cache_lookups_total', "In-process cache lookups, by cache and result (hit or miss).", ('cache', 'result'),
+)
+cache_evictions = Counter(
+    'gryphon_cache_evictions_total', "Entries dropped from in-process caches to stay within their size.", ('cache',),
+)
+
+
+_LE = re.compile(r'(?:^|,)le="([^"]*)"')
+
+
+def _sort_key(row):
+    # Buckets in numeric order of le within each label set.
+    name, labels, _ = row
+    match = _LE.search(labels)
+    if not match:
+        return name, labels, 0.0
+    return name, _LE.sub('', labels), float(match[1])
+
+
+def render():
+    """Returns every registered metric in the Prometheus text format."""
+    buffer.flush()
+    rows = defaultdict(list)
+    for name, labels, value in store.rows():
+        rows[name].append((name, labels, value))
+
+    lines = []
+    for metric in REGISTRY.values():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for series in metric.series_names():
+            for name, labels, value in sorted(rows[series], key=_sort_key):
+                lines.append(f"{name}{{{labels}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Records latency and status of every request routed to a view."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unmatched'
+        method = request.method if request.method in METHODS else 'other'
+        request_duration.observe(elapsed, view=view, method=method)
+        responses.inc(view=view, method=method, status=response.status_code)
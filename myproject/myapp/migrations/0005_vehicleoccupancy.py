@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# myapp.availability.month_masks when this migration was written, copied so
+# that later changes to the app cannot alter the backfill.
+def month_masks(start_date, end_date):
+    """
+    Splits the half-open range [start_date, end_date) into per-month bitmasks.
+    Bit 0 of a mask is the first day of that month. Yields (month, mask) pairs.
+    """
+    month = start_date.replace(day=1)
+    while month < end_date:
+        if month.month == 12:
+            following = month.replace(year=month.year + 1, month=1)
+        else:
+            following = month.replace(month=month.month + 1)
+        first = max(start_date, month)
+        last = min(end_date, following)  # exclusive
+        if first < last:
+            span = (last - first).days
+            yield month, ((1 << span) - 1) << (first.day - 1)
+        month = following
+
+
+def backfill_occupancy(apps, schema_editor):
+    Reservation = apps.get_model('myapp', 'Reservation')
+    VehicleOccupancy = apps.get_model('myapp', 'VehicleOccupancy')
+    bits = {}
+    active = Reservation.objects.filter(status='active').values_list('vehicle_id', 'start_date', 'end_date')
+    for vehicle_id, start_date, end_date in active.iterator():
+        for month, mask in month_masks(start_date, end_date):
+            bits[vehicle_id, month] = bits.get((vehicle_id, month), 0) | mask
+    VehicleOccupancy.objects.bulk_create(
+        [VehicleOccupancy(vehicle_id=vehicle_id, month=month, days=days)
+         for (vehicle_id, month), days in bits.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_alter_reservation_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('days', models.BigIntegerField(default=0)),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='myapp.vehicle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'vehicle', 'days'], name='occupancy_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('vehicle', 'month'), name='unique_vehicle_month')],
+            },
+        ),
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:31
+
+from django.db import migrations
+
+# The same overlap rule rent_vehicle_view checks, enforced by SQLite itself so
+# that no code path (payments, admin actions, concurrent workers) can leave two
+# active reservations covering the same day of the same vehicle.
+OVERLAP_CONDITION = """
+    NEW.status = 'active' AND EXISTS (
+        SELECT 1 FROM myapp_reservation
+        WHERE vehicle_id = NEW.vehicle_id
+          AND status = 'active'
+          AND id IS NOT NEW.id
+          AND start_date < NEW.end_date
+          AND end_date > NEW.start_date
+    )
+"""
+
+CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER reservation_overlap_insert
+    BEFORE INSERT ON myapp_reservation
+    WHEN {OVERLAP_CONDITION}
+    BEGIN
+        SELECT RAISE(ABORT, 'reservation overlaps an active booking');
+    END
+    """,
+    f"""
+    CREATE TRIGGER reservation_overlap_update
+    BEFORE UPDATE OF status, vehicle_id, start_date, end_date ON myapp_reservation
+    WHEN {OVERLAP_CONDITION}
+    BEGIN
+        SELECT RAISE(ABORT, 'reservation overlaps an active booking');
+    END
+    """,
+]
+
+DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS reservation_overlap_insert",
+    "DROP TRIGGER IF EXISTS reservation_overlap_update",
+]
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in CREATE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in DROP_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_vehicle_availability_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+from django.db import migrations
+
+CREATE_FTS = """
+    CREATE VIRTUAL TABLE myapp_vehicle_fts USING fts5(
+        name, type, fuel_type, transmission,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+POPULATE_FTS = """
+    INSERT INTO myapp_vehicle_fts (rowid, name, type, fuel_type, transmission)
+    SELECT id, name, type, fuel_type, transmission FROM myapp_vehicle
+"""
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(CREATE_FTS)
+        schema_editor.execute(POPULATE_FTS)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS myapp_vehicle_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_vehicle_name_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('myapp', '0009_vehicle_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRentalStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rental_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_rentals', models.PositiveIntegerField(default=0)),
+                ('active_rentals', models.PositiveIntegerField(default=0)),
+                ('pending_rentals', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('type_counts', models.JSONField(default=dict)),
+            ],
+            options={
+                'verbose_name_plural': 'user rental stats',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:24
+
+from importlib import import_module
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+# Adding a column with a default makes SQLite rebuild myapp_reservation, which
+# silently drops the overlap triggers of 0007; put them back afterwards.
+overlap_guard = import_module('myapp.migrations.0007_reservation_overlap_guard')
+
+
+def recreate_triggers(apps, schema_editor):
+    overlap_guard.drop_triggers(apps, schema_editor)
+    overlap_guard.create_triggers(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_userrentalstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Runs last when unapplying, after RemoveField has rebuilt the table.
+        migrations.RunPython(migrations.RunPython.noop, recreate_triggers),
+        migrations.AddField(
+            model_name='reservation',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(recreate_triggers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['status', 'end_date'], name='reservation_status_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['status', 'created_at'], name='reservation_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+# Case-insensitive username lookups (login, registration) compare
+# Lower('username'). User is not ours to add Meta indexes to, so this one is
+# created directly on its table.
+USERNAME_LOWER_INDEX = models.Index(Lower('username'), name='auth_user_username_lower_idx')
+
+
+def add_username_index(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    schema_editor.add_index(User, USERNAME_LOWER_INDEX)
+
+
+def remove_username_index(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    schema_editor.remove_index(User, USERNAME_LOWER_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_reservation_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['vehicle', 'status', 'start_date', 'end_date'], name='reservation_vehicle_span_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['user', 'status', 'start_date'], name='reservation_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['phone'], name='userprofile_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['type', 'name'], name='vehicle_type_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['fuel_type', 'name'], name='vehicle_fuel_name_idx'),
+        ),
+        migrations.RunPython(add_username_index, remove_username_index),
+    ]
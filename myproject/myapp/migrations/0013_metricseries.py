@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('labels', models.CharField(blank=True, max_length=255)),
+                ('value', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'metric series',
+                'constraints': [models.UniqueConstraint(fields=('name', 'labels'), name='unique_metric_series')],
+            },
+        ),
+    ]
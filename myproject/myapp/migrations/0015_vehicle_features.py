@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+def render_features(apps, schema_editor):
+    # Historical models lack Vehicle.feature_labels(), so the labels are
+    # rendered here from the field choices, the same way.
+    Vehicle = apps.get_model('myapp', 'Vehicle')
+    fuel_labels = dict(Vehicle._meta.get_field('fuel_type').choices)
+    transmission_labels = dict(Vehicle._meta.get_field('transmission').choices)
+    vehicles = list(Vehicle.objects.only('type', 'seats', 'fuel_type', 'transmission'))
+    for vehicle in vehicles:
+        features = []
+        if vehicle.type == 'car':
+            features.append(transmission_labels.get(vehicle.transmission, vehicle.transmission))
+            features.append(f"{vehicle.seats} Seats")
+        features.append(f"Fuel: {fuel_labels.get(vehicle.fuel_type, vehicle.fuel_type)}")
+        vehicle.features = features
+    Vehicle.objects.bulk_update(vehicles, ['features'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_availabilityevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='features',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.RunPython(render_features, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def backfill(apps, schema_editor):
+    # rollups.rebuild_rollups(), on the historical models.
+    Reservation = apps.get_model('myapp', 'Reservation')
+    DailyBookings = apps.get_model('myapp', 'DailyBookings')
+    DailyRevenue = apps.get_model('myapp', 'DailyRevenue')
+    rows = list(Reservation.objects.values('start_date', 'vehicle__type', 'status').annotate(
+        count=Count('id'), days=Sum(F('end_date') - F('start_date')), cost=Sum('total_cost'),
+    ).order_by())
+    DailyBookings.objects.bulk_create([
+        DailyBookings(
+            date=row['start_date'], vehicle_type=row['vehicle__type'], status=row['status'],
+            bookings=row['count'], rental_days=row['days'].days,
+        )
+        for row in rows
+    ], batch_size=1000)
+    DailyRevenue.objects.bulk_create([
+        DailyRevenue(
+            date=row['start_date'], vehicle_type=row['vehicle__type'], status=row['status'], revenue=row['cost'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0016_reservation_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBookings',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('vehicle_type', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('pending_payment', 'Pending Payment'), ('payment_failed', 'Payment Failed'), ('active', 'Active'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('bookings', models.IntegerField(default=0)),
+                ('rental_days', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'daily bookings',
+                'constraints': [models.UniqueConstraint(fields=('date', 'vehicle_type', 'status'), name='unique_daily_bookings')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('vehicle_type', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('pending_payment', 'Pending Payment'), ('payment_failed', 'Payment Failed'), ('active', 'Active'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'daily revenue',
+                'constraints': [models.UniqueConstraint(fields=('date', 'vehicle_type', 'status'), name='unique_daily_revenue')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
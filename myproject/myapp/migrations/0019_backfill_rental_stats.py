@@ -0,0 +1,50 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+# Reservation.PENDING_STATUSES when this migration was written.
+PENDING_STATUSES = ('pending_payment', 'payment_failed')
+
+
+def backfill_rental_stats(apps, schema_editor):
+    """
+    Creates the stats rows of users whose reservations predate the stats
+    table, so the dashboard never has to build them on a GET. Rows the
+    signals already maintain are left alone.
+    """
+    Reservation = apps.get_model('myapp', 'Reservation')
+    UserRentalStats = apps.get_model('myapp', 'UserRentalStats')
+
+    existing = set(UserRentalStats.objects.values_list('user_id', flat=True))
+    type_counts = defaultdict(dict)
+    for user_id, vehicle_type, count in (
+        Reservation.objects.values_list('user_id', 'vehicle__type').annotate(count=Count('id')).order_by()
+    ):
+        type_counts[user_id][vehicle_type] = count
+    totals = Reservation.objects.values('user_id').annotate(
+        total_rentals=Count('id'),
+        active_rentals=Count('id', filter=Q(status='active')),
+        pending_rentals=Count('id', filter=Q(status__in=PENDING_STATUSES)),
+        total_spent=Coalesce(
+            Sum('total_cost', filter=Q(status='completed')),
+            Value(0, output_field=DecimalField()),
+        ),
+    ).order_by()
+    UserRentalStats.objects.bulk_create([
+        UserRentalStats(**row, type_counts=type_counts[row['user_id']])
+        for row in totals
+        if row['user_id'] not in existing
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0018_catalogversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rental_stats, migrations.RunPython.noop),
+    ]
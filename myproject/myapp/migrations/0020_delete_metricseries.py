@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0019_backfill_rental_stats'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='MetricSeries',
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 # A simple Vehicle model. You can expand this later.
@@ -26,9 +26,69 @@ class Vehicle(models.Model):
     fuel_type = models.CharField(max_length=10, choices=FUEL_CHOICES, default='petrol')
     transmission = models.CharField(max_length=10, choices=TRANSMISSION_CHOICES, default='automatic')
 
+    # Bumped whenever the vehicle's active reservations change, so per-process
+    # caches of booked ranges can tell when they are stale (see booking_index.py).
+    availability_version = models.PositiveIntegerField(default=0, editable=False)
+
+    # The catalog's feature labels, e.g. ["Automatic", "5 Seats", "Fuel: Petrol"],
+    # rendered from the fields below on every save so that catalog pages can
+    # be served from values_list rows (see catalog.py).
+    features = models.JSONField(default=list, editable=False)
+
+    # Choice labels by value, looked up once here rather than per row.
+    FUEL_LABELS = dict(FUEL_CHOICES)
+    TRANSMISSION_LABELS = dict(TRANSMISSION_CHOICES)
+
+    # Fields the feature labels are rendered from.
+    FEATURE_FIELDS = ('type', 'seats', 'fuel_type', 'transmission')
+
+    class Meta:
+        indexes = [
+            # Keyset pagination walks vehicles in (name, id) order.
+            models.Index(fields=['name', 'id'], name='vehicle_name_id_idx'),
+            # The same walk for the car/bike and electric filters.
+            models.Index(fields=['type', 'name'], name='vehicle_type_name_idx'),
+            models.Index(fields=['fuel_type', 'name'], name='vehicle_fuel_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def feature_labels(cls, vehicle_type, seats, fuel_type, transmission):
+        features = []
+        if vehicle_type == 'car':
+            features.append(cls.TRANSMISSION_LABELS.get(transmission, transmission))
+            features.append(f"{seats} Seats")
+        features.append(f"Fuel: {cls.FUEL_LABELS.get(fuel_type, fuel_type)}")
+        return features
+
+    def render_features(self):
+        """Sets features from the current field values. bulk_create callers must call it."""
+        self.features = self.feature_labels(self.type, self.seats, self.fuel_type, self.transmission)
+
+    def save(self, *args, **kwargs):
+        self.render_features()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+            ]
+        if update_fields is not None:
+            # availability_version only moves through F() updates (see signals.py):
+            # writing back a stale in-memory value would move it backwards.
+            update_fields = set(update_fields) - {'availability_version'}
+            if not update_fields.isdisjoint(self.FEATURE_FIELDS):
+                update_fields.add('features')
+            kwargs['update_fields'] = update_fields
+        # In one transaction with the post_save handlers, so the search index
+        # and the catalog version (see signals.py) commit with the row or not
+        # at all. Deletes already send post_delete inside theirs.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone = models.CharField(max_length=15, blank=True, null=True)
@@ -36,6 +96,10 @@ class UserProfile(models.Model):
 
     class Meta:
         app_label = 'myapp'
+        indexes = [
+            # Phone login and the duplicate-number checks.
+            models.Index(fields=['phone'], name='userprofile_phone_idx'),
+        ]
 
 class Reservation(models.Model):
     STATUS_CHOICES = (
@@ -46,6 +110,12 @@ class Reservation(models.Model):
         ('cancelled', 'Cancelled'),
     )
     
+    # Reservations still waiting to be paid for.
+    PENDING_STATUSES = ('pending_payment', 'payment_failed')
+
+    # The message the overlap triggers (migration 0007) abort with.
+    OVERLAP_ERROR = 'reservation overlaps an active booking'
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE)
     start_date = models.DateField()
@@ -54,6 +124,191 @@ class Reservation(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending_payment')
     total_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     pickup_location = models.CharField(max_length=100, default='Downtown')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Lets the utilization matrix pick up only what changed since its last run.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Used by the lifecycle sweeper (see sweeper.py).
+            models.Index(fields=['status', 'end_date'], name='reservation_status_end_idx'),
+            models.Index(fields=['status', 'created_at'], name='reservation_status_created_idx'),
+            # Overlap checks (booking index, occupancy rebuilds, the 0007 triggers).
+            models.Index(fields=['vehicle', 'status', 'start_date', 'end_date'], name='reservation_vehicle_span_idx'),
+            # A user's reservations, as listed on the dashboard.
+            models.Index(fields=['user', 'status', 'start_date'], name='reservation_user_status_idx'),
+            # Changes since the last utilization update (see utilization.py).
+            models.Index(fields=['updated_at'], name='reservation_updated_idx'),
+        ]
+
+    # Fields whose previous values are remembered so that signal handlers
+    # can tell what a save actually changed (see signals.py).
+    TRACKED_FIELDS = ('status', 'vehicle_id', 'user_id', 'start_date', 'end_date', 'total_cost')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
 
     def __str__(self):
         return f"{self.vehicle.name} reservation for {self.user.username}"
+
+    def _snapshot(self):
+        # Read from __dict__ so deferred fields are not loaded as a side effect.
+        self._previous = {
+            field: self.__dict__[field]
+            for field in self.TRACKED_FIELDS
+            if field in self.__dict__
+        }
+
+    @property
+    def previous(self):
+        """Tracked field values as last loaded from or saved to the database ({} if new)."""
+        return getattr(self, '_previous', {})
+
+    def save(self, *args, **kwargs):
+        # auto_now only applies to the fields being saved.
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {'updated_at', *kwargs['update_fields']}
+        # Derived tables are updated from post_save, so run it in the same transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._snapshot()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+class VehicleOccupancy(models.Model):
+    """
+    Bitmap of the days of one month on which a vehicle has an active reservation.
+    Bit 0 is the first day of the month. Rows are kept in sync with Reservation
+    writes so that availability searches never have to scan reservations.
+    """
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='occupancy')
+    month = models.DateField()  # Always the first day of the month
+    days = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vehicle', 'month'], name='unique_vehicle_month'),
+        ]
+        indexes = [
+            # Covers the availability search: month range, then the bitmap test.
+            models.Index(fields=['month', 'vehicle', 'days'], name='occupancy_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} {self.month:%Y-%m}"
+
+
+class UserRentalStats(models.Model):
+    """
+    Per-user dashboard totals, maintained incrementally by the Reservation
+    signals (see rental_stats.py) so home_view reads them in one row lookup.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='rental_stats')
+    total_rentals = models.PositiveIntegerField(default=0)
+    active_rentals = models.PositiveIntegerField(default=0)
+    pending_rentals = models.PositiveIntegerField(default=0)  # pending_payment or payment_failed
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # completed rentals only
+    type_counts = models.JSONField(default=dict)  # vehicle type -> number of reservations
+
+    class Meta:
+        verbose_name_plural = 'user rental stats'
+
+    def __str__(self):
+        return f"Rental stats for {self.user_id}"
+
+    @property
+    def favorite_type(self):
+        counts = {vehicle_type: count for vehicle_type, count in self.type_counts.items() if count > 0 and vehicle_type}
+        if not counts:
+            return 'N/A'
+        return max(counts, key=counts.get).capitalize()
+
+
+class AvailabilityEvent(models.Model):
+    """
+    A change to a vehicle's active reservations: the range that became booked
+    or free, and the vehicle's availability_version after it. Written with
+    the change, read in id order by every process's live stream (see live.py),
+    and pruned by the sweeper.
+    """
+    CHANGES = (
+        ('booked', 'Booked'),
+        ('freed', 'Freed'),
+    )
+
+    # No constraint: the log may outlive the vehicle, and deleting one writes its events.
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    change = models.CharField(max_length=10, choices=CHANGES)
+    version = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Pruning by age.
+            models.Index(fields=['created_at'], name='availabilityevent_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} {self.change} {self.start_date}..{self.end_date}"
+
+class DailyBookings(models.Model):
+    """
+    Reservations by start date, vehicle type and status: how many, and how
+    many rental days they add up to. Maintained by the Reservation signals
+    (see rollups.py) so reports never aggregate the Reservation table.
+    """
+    date = models.DateField()  # the reservations' start_date
+    vehicle_type = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=Reservation.STATUS_CHOICES)
+    bookings = models.IntegerField(default=0)
+    rental_days = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index of the reports' date range scans.
+            models.UniqueConstraint(fields=['date', 'vehicle_type', 'status'], name='unique_daily_bookings'),
+        ]
+        verbose_name_plural = 'daily bookings'
+
+    def __str__(self):
+        return f"{self.date} {self.vehicle_type} {self.status}: {self.bookings}"
+
+
+class DailyRevenue(models.Model):
+    """
+    Total cost of the reservations by start date, vehicle type and status,
+    maintained alongside DailyBookings.
+    """
+    date = models.DateField()  # the reservations' start_date
+    vehicle_type = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=Reservation.STATUS_CHOICES)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'vehicle_type', 'status'], name='unique_daily_revenue'),
+        ]
+        verbose_name_plural = 'daily revenue'
+
+    def __str__(self):
+        return f"{self.date} {self.vehicle_type} {self.status}: {self.revenue}"
+
+
+class CatalogVersion(models.Model):
+    """
+    The version the cached catalog pages and quote prices are keyed on (see
+    catalog_cache.py). A single row, changed in the same transaction as the
+    vehicles it describes and shared by every worker process.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.version)
@@ -0,0 +1,148 @@
+import base64
+import hashlib
+import json
+from operator import itemgetter
+
+from django.core.cache import cache
+from django.db.models import Q
+
+# How long an approximate result count is reused before it is recounted.
+APPROX_TOTAL_TTL = 300
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, value, pk):
+    raw = json.dumps([direction, value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Returns (direction, value, pk) for a token made by encode_cursor, where
+    value is the sort key of the row the cursor points at.
+    Raises InvalidCursor for anything else.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, value, pk = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor.')
+    if (direction not in ('next', 'prev') or not isinstance(value, (str, int, float))
+            or isinstance(pk, bool) or not isinstance(pk, int)):
+        raise InvalidCursor('Invalid cursor.')
+    return direction, value, pk
+
+
+class KeysetPage:
+    """
+    One page of rows in (sort key, pk) order. sort_key and pk return the key
+    and the primary key of a row, which is what the next and previous
+    cursors are positioned on.
+    """
+
+    def __init__(self, object_list, has_next, has_previous, sort_key=lambda obj: obj.name, pk=lambda obj: obj.pk):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.sort_key = sort_key
+        self.pk = pk
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.object_list:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor('next', self.sort_key(last), self.pk(last))
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.object_list:
+            return None
+        first = self.object_list[0]
+        return encode_cursor('prev', self.sort_key(first), self.pk(first))
+
+
+def value_keys(values):
+    """
+    KeysetPage's sort_key and pk for rows read as values_list(*values)
+    tuples, where values starts with 'id' and 'name'.
+    """
+    if values is None:
+        return {}
+    if tuple(values[:2]) != ('id', 'name'):
+        raise ValueError("values must start with 'id' and 'name'.")
+    return {'sort_key': itemgetter(1), 'pk': itemgetter(0)}
+
+
+def _keyset_query(queryset, cursor, page_size, values=None):
+    """
+    Returns (rows, direction) for keyset_page: the unevaluated slice of queryset
+    to fetch (one row more than a page, to tell if another page follows) and
+    the cursor's direction, or None for the first page.
+    """
+    if values is not None:
+        queryset = queryset.values_list(*values)
+    if not cursor:
+        return queryset.order_by('name', 'id')[:page_size + 1], None
+
+    direction, name, pk = decode_cursor(cursor)
+    if not isinstance(name, str):
+        raise InvalidCursor('Invalid cursor.')
+    # The name__gte/lte bound gives SQLite the start of the index range; the
+    # OR only breaks ties between vehicles that share a name.
+    if direction == 'next':
+        rows = queryset.filter(Q(name__gte=name), Q(name__gt=name) | Q(id__gt=pk)).order_by('name', 'id')
+    else:
+        rows = queryset.filter(Q(name__lte=name), Q(name__lt=name) | Q(id__lt=pk)).order_by('-name', '-id')
+    return rows[:page_size + 1], direction
+
+
+def _keyset_result(rows, direction, page_size, values=None):
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == 'prev':
+        return KeysetPage(rows[::-1], True, has_more, **value_keys(values))
+    return KeysetPage(rows, has_more, direction == 'next', **value_keys(values))
+
+
+def keyset_page(queryset, cursor, page_size, values=None):
+    """
+    Returns the page of queryset, ordered by (name, id), that follows or precedes
+    cursor. Each page is an index range scan from the cursor position, so a
+    deep page costs the same as the first one. With values, a sequence of
+    values_list() fields or expressions starting with 'id' and 'name', the
+    page holds tuples of those rather than model instances.
+    """
+    rows, direction = _keyset_query(queryset, cursor, page_size, values)
+    return _keyset_result(list(rows), direction, page_size, values)
+
+
+async def akeyset_page(queryset, cursor, page_size, values=None):
+    """keyset_page for async views."""
+    rows, direction = _keyset_query(queryset, cursor, page_size, values)
+    return _keyset_result([row async for row in rows], direction, page_size, values)
+
+
+def _approx_total_key(key_parts):
+    return f"approx_total:{hashlib.sha1(repr(key_parts).encode()).hexdigest()}"
+
+
+def approximate_total(queryset, *key_parts):
+    """
+    Returns the number of rows in queryset, counting at most once every
+    APPROX_TOTAL_TTL seconds for the same key_parts.
+    """
+    return cache.get_or_set(_approx_total_key(key_parts), queryset.count, APPROX_TOTAL_TTL)
+
+
+async def aapproximate_total(queryset, *key_parts):
+    """approximate_total for async views."""
+    key = _approx_total_key(key_parts)
+    total = await cache.aget(key)
+    if total is None:
+        total = await queryset.acount()
+        await cache.aset(key, total, APPROX_TOTAL_TTL)
+    return total
@@ -0,0 +1,254 @@
+"""
+Profiling of individual requests in place.
+
+Staff can profile any request by adding ?_profile=1 (cProfile, saved as a
+.prof pstats file) or ?_profile=sample (a stack sampler, saved as collapsed
+stacks for flamegraph.pl or speedscope); the X-Profile header works the same
+way. With PROFILING_SAMPLE_RATE above zero, that share of requests to the
+views in PROFILING_SAMPLE_VIEWS is also stack-sampled, whoever makes them.
+
+Profiles are written to PROFILES_DIR, keeping the newest PROFILES_KEEP, and
+listed at /staff/profiles/. The response of a profiled request carries the
+profile's name in an X-Profile-Id header.
+
+Under ASGI both profilers watch the event loop thread only: they see the
+request's async code, along with whatever other requests the loop runs
+meanwhile, but not the queries sync_to_async sends to worker threads.
+"""
+import cProfile
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+EXTENSIONS = {'cprofile': '.prof', 'stacks': '.collapsed'}
+PROFILE_NAME = re.compile(r'^[\w-]+\.(prof|collapsed)$')
+
+# cProfile instances cannot overlap (Python 3.12 refuses outright), so only
+# one request is profiled with it at a time; others run unprofiled.
+_cprofile_lock = threading.Lock()
+
+
+def profiles_dir():
+    return Path(getattr(settings, 'PROFILES_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+class StackSampler:
+    """
+    Records the call stack of one thread every interval seconds from a
+    background thread, counting identical stacks.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def save_profile(mode, write, meta):
+    """
+    Stores one profile: write(path) creates the data file, meta is saved
+    beside it. Prunes the oldest profiles beyond PROFILES_KEEP. Returns the
+    profile's file name.
+    """
+    directory = profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    view = re.sub(r'[^\w-]', '-', meta.get('view') or 'unmatched')
+    name = f"{stamp}-{view}-{uuid.uuid4().hex[:8]}{EXTENSIONS[mode]}"
+    write(directory / name)
+    (directory / f"{name}.json").write_text(json.dumps({**meta, 'name': name, 'mode': mode}))
+
+    keep = getattr(settings, 'PROFILES_KEEP', 50)
+    for old in sorted(directory.glob('*.json'), key=lambda path: path.stat().st_mtime)[:-keep]:
+        old.with_suffix('').unlink(missing_ok=True)
+        old.unlink(missing_ok=True)
+    return name
+
+
+def list_profiles():
+    """Metadata of the stored profiles, newest first."""
+    profiles = []
+    for path in profiles_dir().glob('*.json'):
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda meta: meta.get('created', ''), reverse=True)
+
+
+def profile_path(name):
+    """Path of the profile called name, or None for anything that is not one."""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = profiles_dir() / name
+    return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    """
+    Runs staff-requested and randomly sampled requests under a profiler.
+    Must come after AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.sample_views = set(getattr(settings, 'PROFILING_SAMPLE_VIEWS', ()))
+        self.interval = getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.001)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def trigger(request):
+        return request.GET.get('_profile') or request.headers.get('X-Profile')
+
+    def requested_mode(self, request, user):
+        trigger = self.trigger(request)
+        if not trigger or not user.is_staff:
+            return None
+        return 'stacks' if trigger == 'sample' else 'cprofile'
+
+    def sampled(self, request):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return False
+        try:
+            return resolve(request.path_info).view_name in self.sample_views
+        except Resolver404:
+            return False
+
+    def start(self, mode):
+        """
+        Starts profiling the current thread. Returns a function that stops it
+        and returns (write, extra meta), or None if cProfile is busy.
+        """
+        if mode == 'cprofile':
+            if not _cprofile_lock.acquire(blocking=False):
+                return None
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except BaseException:
+                _cprofile_lock.release()
+                raise
+
+            def stop():
+                try:
+                    profiler.disable()
+                finally:
+                    _cprofile_lock.release()
+                return profiler.dump_stats, {}
+
+            return stop
+
+        sampler = StackSampler(threading.get_ident(), self.interval).__enter__()
+
+        def stop():
+            sampler.__exit__(None, None, None)
+            collapsed = sampler.collapsed()
+
+            def write(path):
+                path.write_text(collapsed)
+
+            return write, {'samples': sum(sampler.stacks.values())}
+
+        return stop
+
+    def save(self, request, response, user, mode, trigger, started, write, extra):
+        match = getattr(request, 'resolver_match', None)
+        return save_profile(mode, write, {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'trigger': trigger,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'user': user.get_username() if user.is_authenticated else None,
+            **extra,
+        })
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode = self.requested_mode(request, request.user)
+        trigger = 'staff'
+        if mode is None and self.sampled(request):
+            mode, trigger = 'stacks', 'sampled'
+        if mode is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        stop = self.start(mode)
+        if stop is None:
+            response = self.get_response(request)
+            response['X-Profile-Id'] = 'busy'
+            return response
+        try:
+            response = self.get_response(request)
+        finally:
+            write, extra = stop()
+        response['X-Profile-Id'] = self.save(request, response, request.user, mode, trigger, started, write, extra)
+        return response
+
+    async def __acall__(self, request):
+        # The user is only loaded (a query) when a profile is asked for.
+        mode = self.requested_mode(request, await request.auser()) if self.trigger(request) else None
+        trigger = 'staff'
+        if mode is None and self.sampled(request):
+            mode, trigger = 'stacks', 'sampled'
+        if mode is None:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        stop = self.start(mode)
+        if stop is None:
+            response = await self.get_response(request)
+            response['X-Profile-Id'] = 'busy'
+            return response
+        try:
+            response = await self.get_response(request)
+        finally:
+            write, extra = stop()
+        user = await request.auser()
+        response['X-Profile-Id'] = await sync_to_async(self.save, thread_sensitive=False)(
+            request, response, user, mode, trigger, started, write, extra,
+        )
+        return response
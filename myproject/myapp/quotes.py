@@ -0,0 +1,163 @@
+"""
+Rental quotes: what renting a vehicle from one date to another costs.
+
+Each day of the rental, [start, end), costs the vehicle's price_per_day
+times the day's multiplier, plus a surcharge for the vehicle's type:
+
+- the day multiplier is QUOTE_WEEKEND_MULTIPLIER on QUOTE_WEEKEND_DAYS,
+  times the highest multiplier of the QUOTE_SEASONS covering the day;
+- QUOTE_TYPE_SURCHARGES maps a vehicle type to its per-day surcharge.
+
+The sum is then reduced by the largest QUOTE_LENGTH_DISCOUNTS share the
+rental is long enough for, and rounded to the cent.
+
+Day multipliers and the discount depend only on the window, so quoting the
+whole fleet is one multiply-add over arrays of prices and surcharges, in
+cents. quote_engine keeps those arrays per process and reloads them when the
+catalog version changes (see catalog_cache.py). book_vehicle() prices the
+reservation itself with quote_vehicle(), from the vehicle row it reads in
+its own transaction.
+"""
+from decimal import Decimal
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .catalog_cache import aget_catalog_version, get_catalog_version
+from .models import Vehicle
+
+
+def month_day(text):
+    """'MM-DD' as the number MMDD, e.g. '06-15' -> 615."""
+    month, day = text.split('-')
+    return int(month) * 100 + int(day)
+
+
+class PricingRules:
+    """The QUOTE_* settings, as read at construction."""
+
+    def __init__(self):
+        self.weekend_days = tuple(getattr(settings, 'QUOTE_WEEKEND_DAYS', (5, 6)))
+        self.weekend_multiplier = getattr(settings, 'QUOTE_WEEKEND_MULTIPLIER', 1.0)
+        self.seasons = [
+            (month_day(first), month_day(last), multiplier)
+            for first, last, multiplier in getattr(settings, 'QUOTE_SEASONS', ())
+        ]
+        self.length_discounts = sorted(getattr(settings, 'QUOTE_LENGTH_DISCOUNTS', ()))
+        self.type_surcharges = dict(getattr(settings, 'QUOTE_TYPE_SURCHARGES', {}))
+
+    def day_multipliers(self, start_date, end_date):
+        """The multiplier of each day of [start_date, end_date), as an array."""
+        days = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D'))
+        # Day 0 of datetime64 is 1970-01-01, a Thursday: weekday 3 with Monday as 0.
+        weekdays = (days.astype(np.int64) + 3) % 7
+        multipliers = np.where(np.isin(weekdays, self.weekend_days), self.weekend_multiplier, 1.0)
+        if self.seasons:
+            months = days.astype('datetime64[M]')
+            month_days = (months.astype(np.int64) % 12 + 1) * 100 + (days - months).astype(np.int64) + 1
+            season = np.full(len(days), np.nan)
+            for first, last, multiplier in self.seasons:
+                if first <= last:
+                    inside = (month_days >= first) & (month_days <= last)
+                else:  # wraps around the new year
+                    inside = (month_days >= first) | (month_days <= last)
+                season[inside] = np.fmax(season[inside], multiplier)
+            multipliers *= np.nan_to_num(season, nan=1.0)
+        return multipliers
+
+    def discount(self, days):
+        """Share taken off a rental of days days."""
+        return max((share for min_days, share in self.length_discounts if days >= min_days), default=0.0)
+
+    def surcharge_cents(self, vehicle_type):
+        return round(self.type_surcharges.get(vehicle_type, 0) * 100)
+
+
+def quote_cents(prices, surcharges, start_date, end_date, rules=None):
+    """
+    Totals in cents of renting vehicles from start_date to end_date, given
+    arrays of their daily prices and type surcharges in cents.
+    """
+    rules = rules or PricingRules()
+    multipliers = rules.day_multipliers(start_date, end_date)
+    days = len(multipliers)
+    totals = (prices * multipliers.sum() + surcharges * days) * (1 - rules.discount(days))
+    return np.rint(totals).astype(np.int64)
+
+
+def quote_vehicle(vehicle, start_date, end_date):
+    """The authoritative total of a reservation of vehicle, as a Decimal."""
+    rules = PricingRules()
+    cents = quote_cents(
+        np.array([int(vehicle.price_per_day * 100)]), np.array([rules.surcharge_cents(vehicle.type)]),
+        start_date, end_date, rules,
+    )[0]
+    return Decimal(int(cents)) / 100
+
+
+class Fleet:
+    """Every vehicle's id, daily price in cents and type, in id order."""
+    __slots__ = ('version', 'ids', 'prices', 'types', 'type_codes')
+
+    def __init__(self, version, rows):
+        self.version = version
+        ids, types, prices = zip(*rows) if rows else ((), (), ())
+        self.ids = np.array(ids, dtype=np.int64)
+        self.prices = np.rint(np.array(prices, dtype=np.float64) * 100).astype(np.int64)
+        # Types as small integers indexing self.types, so a table of
+        # per-type amounts spreads over the fleet with one take.
+        self.types, self.type_codes = np.unique(np.array(types, dtype=object), return_inverse=True)
+
+    def quote(self, start_date, end_date, vehicle_ids=None):
+        """(ids, totals in cents) of the fleet, or of vehicle_ids among it."""
+        rules = PricingRules()
+        ids, prices, type_codes = self.ids, self.prices, self.type_codes
+        if vehicle_ids is not None:
+            wanted = np.isin(ids, np.array(vehicle_ids, dtype=np.int64))
+            ids, prices, type_codes = ids[wanted], prices[wanted], type_codes[wanted]
+        surcharges = np.array([rules.surcharge_cents(vehicle_type) for vehicle_type in self.types], dtype=np.int64)
+        return ids, quote_cents(prices, surcharges[type_codes], start_date, end_date, rules)
+
+
+class QuoteEngine:
+    """
+    The fleet's price arrays for this process. They are replaced whole when
+    the catalog version moves on, so concurrent quotes never see a mix.
+    """
+
+    def __init__(self):
+        self._fleet = None
+
+    @staticmethod
+    def _rows():
+        # Cast in SQL: a float per row instead of a Decimal.
+        return list(Vehicle.objects.order_by('id').values_list('id', 'type', Cast('price_per_day', FloatField())))
+
+    def fleet(self):
+        version = get_catalog_version()
+        if self._fleet is None or self._fleet.version != version:
+            self._fleet = Fleet(version, self._rows())
+        return self._fleet
+
+    async def afleet(self):
+        """fleet for async views."""
+        version = await aget_catalog_version()
+        if self._fleet is None or self._fleet.version != version:
+            self._fleet = Fleet(version, await sync_to_async(self._rows)())
+        return self._fleet
+
+    def quote(self, start_date, end_date, vehicle_ids=None):
+        return self.fleet().quote(start_date, end_date, vehicle_ids)
+
+    async def aquote(self, start_date, end_date, vehicle_ids=None):
+        """quote for async views."""
+        return (await self.afleet()).quote(start_date, end_date, vehicle_ids)
+
+    def clear(self):
+        self._fleet = None
+
+
+quote_engine = QuoteEngine()
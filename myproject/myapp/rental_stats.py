@@ -0,0 +1,115 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Reservation, UserRentalStats, Vehicle
+
+# Reservation fields the stats depend on; changes to anything else are ignored.
+STATS_FIELDS = ('status', 'user_id', 'vehicle_id', 'total_cost')
+
+
+def rebuild_user_stats(user_id):
+    """
+    Recomputes one user's stats row from their reservations and returns it.
+    """
+    reservations = Reservation.objects.filter(user_id=user_id)
+    # Read and write under the same write lock so no reservation change can
+    # land between the aggregate and the update.
+    with transaction.atomic():
+        totals = reservations.aggregate(
+            total_rentals=Count('id'),
+            active_rentals=Count('id', filter=Q(status='active')),
+            pending_rentals=Count('id', filter=Q(status__in=Reservation.PENDING_STATUSES)),
+            total_spent=Coalesce(
+                Sum('total_cost', filter=Q(status='completed')),
+                Value(0, output_field=DecimalField()),
+            ),
+        )
+        type_counts = dict(
+            reservations.values_list('vehicle__type').annotate(count=Count('id')).order_by()
+        )
+        stats, _ = UserRentalStats.objects.update_or_create(
+            user_id=user_id, defaults={**totals, 'type_counts': type_counts},
+        )
+    return stats
+
+
+def stats_for(user):
+    """
+    Returns the stats row of user, or an unsaved row of zeros if they have
+    none: users without reservations. Never writes, so it is safe on a GET;
+    migration 0019 and the rebuild_rental_stats command fill in the rows of
+    reservations that bypassed the signals.
+    """
+    try:
+        return user.rental_stats
+    except UserRentalStats.DoesNotExist:
+        return UserRentalStats(user=user)
+
+
+def rebuild_all_stats():
+    """
+    Rebuilds the stats table from scratch. Returns the number of rows written.
+    """
+    with transaction.atomic():
+        UserRentalStats.objects.all().delete()
+        user_ids = User.objects.filter(reservation__isnull=False).distinct().values_list('id', flat=True)
+        for user_id in user_ids.iterator():
+            rebuild_user_stats(user_id)
+    return UserRentalStats.objects.count()
+
+
+def _apply(stats, state, sign, vehicle_types):
+    stats.total_rentals += sign
+    if state['status'] == 'active':
+        stats.active_rentals += sign
+    elif state['status'] in Reservation.PENDING_STATUSES:
+        stats.pending_rentals += sign
+    elif state['status'] == 'completed':
+        stats.total_spent += sign * Decimal(str(state['total_cost']))
+    vehicle_type = vehicle_types.get(state['vehicle_id'])
+    if vehicle_type is not None:
+        stats.type_counts[vehicle_type] = stats.type_counts.get(vehicle_type, 0) + sign
+
+
+def record_change(previous, current):
+    """
+    Moves the stats of the affected users from a reservation's previous state
+    to its current one. Either may be None for an insert or a delete. States
+    are dicts of Reservation.TRACKED_FIELDS.
+
+    Runs inside the reservation's own transaction, which holds SQLite's write
+    lock, so the read-modify-write of each stats row cannot interleave.
+    """
+    changes = defaultdict(list)
+    if previous:
+        changes[previous['user_id']].append((previous, -1))
+    if current:
+        changes[current['user_id']].append((current, 1))
+
+    # Vehicle types are only needed when a reservation is added, removed or
+    # moved to another vehicle; a status change alone leaves them as they are.
+    vehicle_deltas = Counter()
+    for user_id, user_changes in changes.items():
+        for state, sign in user_changes:
+            vehicle_deltas[user_id, state['vehicle_id']] += sign
+    vehicle_ids = {vehicle_id for (_, vehicle_id), delta in vehicle_deltas.items() if delta}
+    vehicle_types = dict(Vehicle.objects.filter(id__in=vehicle_ids).values_list('id', 'type')) if vehicle_ids else {}
+
+    for user_id, user_changes in changes.items():
+        stats = UserRentalStats.objects.filter(user_id=user_id).first()
+        if stats is None:
+            # No row yet: build it from the table, which already includes this
+            # change. Never create one on delete, the user may be going away.
+            if current and current['user_id'] == user_id:
+                rebuild_user_stats(user_id)
+            continue
+        for state, sign in user_changes:
+            # Types cancel out for a status change on the same vehicle.
+            types = vehicle_types if vehicle_deltas[user_id, state['vehicle_id']] else {}
+            _apply(stats, state, sign, types)
+        stats.save()
@@ -0,0 +1,140 @@
+"""
+Daily rollups of the Reservation table: DailyBookings and DailyRevenue, one
+row per start date, vehicle type and status.
+
+The Reservation signals apply every change to them as a delta, in the
+reservation's own transaction (record_change), so report() reads a few rows
+per day of its period whatever the number of reservations.
+rebuild_rollups() backfills them from the Reservation table, for the tables'
+first deployment or after bulk .update()s that bypassed the signals.
+
+Reservations are counted under their vehicle's type as of their last
+change. Retyping a vehicle leaves its earlier reservations where they are
+until the next rebuild.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import DailyBookings, DailyRevenue, Reservation, Vehicle
+
+# Reservation fields the rollups depend on; changes to anything else are ignored.
+ROLLUP_FIELDS = ('status', 'vehicle_id', 'start_date', 'end_date', 'total_cost')
+
+
+def _add(model, fields, rows):
+    """
+    Adds rows of (date, vehicle type, status, *deltas of fields) to the rows
+    of model with their key, creating those that do not exist yet.
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(map(quote, ('date', 'vehicle_type', 'status', *fields)))
+    updates = ', '.join(f"{quote(field)} = {table}.{quote(field)} + excluded.{quote(field)}" for field in fields)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} ({columns}) VALUES ({', '.join(['%s'] * (3 + len(fields)))}) "
+            f"ON CONFLICT (date, vehicle_type, status) DO UPDATE SET {updates}",
+            [(connection.ops.adapt_datefield_value(row[0]), *row[1:]) for row in rows],
+        )
+
+
+def record_change(previous, current, vehicle_types=None):
+    """
+    Moves a reservation from the rollup rows of its previous state to those
+    of its current one. Either may be None for an insert or a delete. States
+    are dicts of Reservation.TRACKED_FIELDS; vehicle_types maps the vehicle
+    ids already at hand to their types, the others are looked up.
+
+    Like rental_stats.record_change, runs inside the reservation's own
+    transaction, so the change and the rollups commit together.
+    """
+    states = [(state, sign) for state, sign in ((previous, -1), (current, 1)) if state]
+    vehicle_types = dict(vehicle_types or {})
+    missing = {state['vehicle_id'] for state, _ in states} - vehicle_types.keys()
+    if missing:
+        vehicle_types.update(Vehicle.objects.filter(id__in=missing).values_list('id', 'type'))
+
+    deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+    for state, sign in states:
+        delta = deltas[state['start_date'], vehicle_types.get(state['vehicle_id'], ''), state['status']]
+        delta[0] += sign
+        delta[1] += sign * (state['end_date'] - state['start_date']).days
+        delta[2] += sign * Decimal(str(state['total_cost']))
+    # A change that only moved the end date, or only the cost, touches one table.
+    bookings = [(*key, count, days) for key, (count, days, _) in deltas.items() if count or days]
+    revenue = [(*key, amount) for key, (_, _, amount) in deltas.items() if amount]
+    if bookings:
+        _add(DailyBookings, ('bookings', 'rental_days'), bookings)
+    if revenue:
+        _add(DailyRevenue, ('revenue',), revenue)
+
+
+def rebuild_rollups(dates=None):
+    """
+    Recomputes the rollup rows of the given start dates, or of every date,
+    from the Reservation table. Returns the number of DailyBookings rows
+    written.
+    """
+    reservations = Reservation.objects.all()
+    bookings = DailyBookings.objects.all()
+    revenue = DailyRevenue.objects.all()
+    if dates is not None:
+        reservations = reservations.filter(start_date__in=dates)
+        bookings = bookings.filter(date__in=dates)
+        revenue = revenue.filter(date__in=dates)
+    totals = reservations.values('start_date', 'vehicle__type', 'status').annotate(
+        count=Count('id'),
+        days=Sum(F('end_date') - F('start_date')),
+        cost=Sum('total_cost'),
+    ).order_by()
+    with transaction.atomic():
+        bookings.delete()
+        revenue.delete()
+        rows = list(totals)
+        DailyBookings.objects.bulk_create([
+            DailyBookings(
+                date=row['start_date'], vehicle_type=row['vehicle__type'], status=row['status'],
+                bookings=row['count'], rental_days=row['days'].days,
+            )
+            for row in rows
+        ], batch_size=1000)
+        DailyRevenue.objects.bulk_create([
+            DailyRevenue(
+                date=row['start_date'], vehicle_type=row['vehicle__type'], status=row['status'],
+                revenue=row['cost'],
+            )
+            for row in rows
+        ], batch_size=1000)
+    return len(rows)
+
+
+# The statuses of reservations that were paid for.
+CONFIRMED_STATUSES = ('active', 'completed')
+
+PERIODS = {'day': F('date'), 'month': TruncMonth('date')}
+
+
+def report(start_date, end_date, period='day', statuses=CONFIRMED_STATUSES):
+    """
+    Bookings, rental days and revenue of the reservations of statuses that
+    start in [start_date, end_date), by day or month and vehicle type. Reads
+    at most one row per day, type and status of each rollup table.
+    """
+    totals = defaultdict(lambda: {'bookings': 0, 'rental_days': 0, 'revenue': Decimal(0)})
+    for model, fields in ((DailyBookings, ('bookings', 'rental_days')), (DailyRevenue, ('revenue',))):
+        rows = model.objects.filter(
+            date__gte=start_date, date__lt=end_date, status__in=statuses,
+        ).annotate(period=PERIODS[period]).values('period', 'vehicle_type').annotate(
+            **{field: Sum(field) for field in fields},
+        ).order_by()
+        for row in rows:
+            for field in fields:
+                totals[row['period'], row['vehicle_type']][field] += row[field]
+    return [
+        {'period': period_start, 'vehicle_type': vehicle_type, **values}
+        for (period_start, vehicle_type), values in sorted(totals.items())
+    ]
@@ -0,0 +1,172 @@
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Vehicle
+from .pagination import KeysetPage, akeyset_page, decode_cursor, keyset_page, value_keys
+
+# FTS5 table created by migration 0009; rowid is the vehicle id.
+FTS_TABLE = 'myapp_vehicle_fts'
+FTS_COLUMNS = ('name', 'type', 'fuel_type', 'transmission')
+
+# Scoring a match with bm25 costs a few microseconds, so searches matching more
+# vehicles than this (typically the first keystrokes of a word) are listed in
+# name order instead of by rank. Ranking that many near-identical hits buys
+# nothing, and the name index keeps the first page cheap.
+RANKED_MATCH_LIMIT = 1000
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(text):
+    """
+    Turns free text into an FTS5 query that prefix-matches every word, e.g.
+    'tesla mod' -> '"tesla"* "mod"*'. Returns None if there is nothing to match.
+    """
+    terms = re.findall(r'\w+', text.lower())
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def index_vehicle(vehicle):
+    """Writes one vehicle's searchable fields into the FTS index."""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [vehicle.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) VALUES (%s, %s, %s, %s, %s)",
+            [vehicle.pk] + [getattr(vehicle, column) for column in FTS_COLUMNS],
+        )
+
+
+def unindex_vehicle(vehicle_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [vehicle_id])
+
+
+def rebuild_search_index():
+    """
+    Re-indexes every vehicle. Use after bulk loads that bypass signals.
+    Returns the number of vehicles indexed.
+    """
+    columns = ', '.join(FTS_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM {Vehicle._meta.db_table}"
+        )
+        indexed = cursor.rowcount
+        # Merge the index segments written by the bulk insert.
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return indexed
+
+
+def filter_matching(queryset, text):
+    """
+    Restricts queryset to vehicles matching text, without ranking.
+    """
+    expression = match_expression(text)
+    if expression is None:
+        return queryset
+    if not fts_available():
+        return queryset.filter(name__icontains=text)
+    return queryset.filter(id__in=RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression]
+    ))
+
+
+def count_matches(expression):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression])
+        return cursor.fetchone()[0]
+
+
+def search_page(queryset, text, cursor, page_size, values=None):
+    """
+    Returns a KeysetPage of the vehicles in queryset matching text, best match
+    first. Pages are keyed on (bm25 rank, id), so like keyset_page they never
+    count or skip rows. Broad searches (see RANKED_MATCH_LIMIT) are paged by
+    (name, id) instead; the type of the cursor's key keeps every later page
+    in the mode of the first. Falls back to a name__icontains scan without FTS5.
+    values is as for keyset_page.
+    """
+    expression = match_expression(text)
+    if expression is None:
+        return keyset_page(queryset, cursor, page_size, values)
+    if not fts_available():
+        return keyset_page(queryset.filter(name__icontains=text), cursor, page_size, values)
+
+    if cursor:
+        ranked = not isinstance(decode_cursor(cursor)[1], str)
+    else:
+        ranked = count_matches(expression) <= RANKED_MATCH_LIMIT
+    if not ranked:
+        return keyset_page(filter_matching(queryset, text), cursor, page_size, values)
+
+    # Rank every match once inside FTS5 (MATERIALIZED stops SQLite from pushing
+    # the filters below into the virtual table, which would re-run the MATCH
+    # per row), then keep the matches that pass the queryset's other filters
+    # (type, availability window...) with one primary-key probe each.
+    sql = (
+        f"WITH matches AS MATERIALIZED ("
+        f"SELECT rowid, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        f") SELECT rowid, rank FROM matches WHERE 1"
+    )
+    params = [expression]
+    if queryset.query.where:
+        candidate = queryset.order_by().filter(pk=RawSQL('matches.rowid', ())).values('id')
+        candidate_sql, candidate_params = candidate.query.sql_with_params()
+        sql += f" AND EXISTS ({candidate_sql})"
+        params += candidate_params
+
+    direction = None
+    if cursor:
+        direction, rank, pk = decode_cursor(cursor)
+        comparison = '>' if direction == 'next' else '<'
+        sql += f" AND (rank {comparison} %s OR (rank = %s AND rowid {comparison} %s))"
+        params += [rank, rank, pk]
+    order = 'DESC' if direction == 'prev' else 'ASC'
+    sql += f" ORDER BY rank {order}, rowid {order} LIMIT %s"
+    params.append(page_size + 1)
+
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == 'prev':
+        rows.reverse()
+
+    ids = [vehicle_id for vehicle_id, _ in rows]
+    pk = value_keys(values).get('pk', lambda vehicle: vehicle.pk)
+    if values is None:
+        vehicles = Vehicle.objects.in_bulk(ids)
+    else:
+        vehicles = {pk(row): row for row in Vehicle.objects.filter(id__in=ids).values_list(*values)}
+    ranks = dict(rows)
+    object_list = [vehicles[vehicle_id] for vehicle_id in ids if vehicle_id in vehicles]
+
+    def sort_key(vehicle):
+        return ranks[pk(vehicle)]
+
+    if direction == 'prev':
+        return KeysetPage(object_list, True, has_more, sort_key, pk)
+    return KeysetPage(object_list, has_more, direction == 'next', sort_key, pk)
+
+
+async def asearch_page(queryset, text, cursor, page_size, values=None):
+    """
+    search_page for async views. Plain listings page through the async ORM;
+    FTS5 searches use raw SQL, which has no async API, and run in a worker thread.
+    """
+    if match_expression(text) is None:
+        return await akeyset_page(queryset, cursor, page_size, values)
+    return await sync_to_async(search_page)(queryset, text, cursor, page_size, values)
@@ -0,0 +1,19 @@
+"""
+Session engines that keep the django_session table off the request path.
+
+Pick one with SESSION_ENGINE:
+
+- myapp.sessions.write_behind: sessions are read from the cache and written
+  to it at once; the table gets the writes in batches, every
+  SESSION_WRITE_BEHIND_INTERVAL seconds, and is only read on a cache miss.
+  The cache must be shared by every worker (system check myapp.E001).
+- myapp.sessions.signed_cookies: the session lives in a signed cookie and
+  the server stores nothing.
+
+Both accept the session cookies issued by Django's db engine, so switching
+to either logs nobody out: write_behind reads the same table, and
+signed_cookies converts a table-backed session into a cookie the first time
+it sees it. Switching back to the db engine from write_behind is safe once
+the workers have stopped (each flushes its pending writes on exit); from
+signed_cookies it logs everyone out.
+"""
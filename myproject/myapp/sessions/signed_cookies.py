@@ -0,0 +1,39 @@
+"""
+Sessions stored in a signed cookie, with the table as a read-only fallback.
+
+Cookies issued by the db engine hold a session key rather than signed data.
+Such a session is loaded from the django_session table once and marked
+modified, so the response replaces the cookie with a signed one. The table
+row is left for clearsessions to expire.
+
+As with Django's own signed_cookies engine, logging out only deletes the
+browser's copy of the cookie: a copy kept elsewhere stays valid until it
+expires or the user's password changes.
+"""
+from django.contrib.sessions.backends import db, signed_cookies
+
+
+class SessionStore(signed_cookies.SessionStore):
+    def _is_table_key(self):
+        # Signed session data always contains a ':'; session keys never do.
+        return self.session_key and ':' not in self.session_key
+
+    def _converted(self, data):
+        # Reissued as a signed cookie when the response is sent.
+        self._session_key = None
+        self.modified = True
+        return data
+
+    def load(self):
+        if self._is_table_key():
+            data = db.SessionStore(self.session_key).load()
+            if data:
+                return self._converted(data)
+        return super().load()
+
+    async def aload(self):
+        if self._is_table_key():
+            data = await db.SessionStore(self.session_key).aload()
+            if data:
+                return self._converted(data)
+        return await super().aload()
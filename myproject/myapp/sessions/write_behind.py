@@ -0,0 +1,197 @@
+"""
+Cached sessions whose table writes are batched behind the request.
+
+Reads come from SESSION_CACHE_ALIAS, falling back to the django_session
+table. Saves and deletes update the cache immediately and are queued; a
+background thread in each worker adds the queue to the table every
+SESSION_WRITE_BEHIND_INTERVAL seconds while it is not empty, and the worker
+flushes what is left when it exits.
+
+The cache must be shared by all workers, since it is the only place a new
+session exists until the next flush; the myapp.E001 system check refuses a
+per-process cache. On a cache miss the worker's own queue is checked before
+the table. Deleted sessions leave a marker in the cache so that the table copy,
+which outlives them until the flush, is never read back.
+"""
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.base import CreateError, UpdateError
+from django.db import DatabaseError, connections, transaction
+
+KEY_PREFIX = 'myapp.sessions.write_behind'
+
+# Cached in place of a deleted session.
+DELETED = 'deleted'
+
+
+def _interval():
+    return getattr(settings, 'SESSION_WRITE_BEHIND_INTERVAL', 1.0)
+
+
+class SessionWriteBuffer:
+    """Session writes not yet made to the table: key -> Session, or DELETED."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flusher = None
+
+    def save(self, session):
+        with self._lock:
+            self._pending[session.session_key] = session
+        self._start_flusher()
+
+    def delete(self, session_key):
+        with self._lock:
+            self._pending[session_key] = DELETED
+        self._start_flusher()
+
+    def pending(self, session_key):
+        """The queued Session or DELETED for session_key, or None if nothing is queued."""
+        with self._lock:
+            return self._pending.get(session_key)
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run, name='session-write-behind', daemon=True)
+        self._flusher.start()
+
+    def _run(self):
+        """
+        Flushes the queue every SESSION_WRITE_BEHIND_INTERVAL seconds until it
+        is empty, then exits; the next save or delete starts it again. Failed
+        writes stay queued for the next round.
+        """
+        try:
+            while True:
+                time.sleep(_interval())
+                self.flush()
+                with self._lock:
+                    if not self._pending:
+                        self._flusher = None
+                        return
+        except BaseException:
+            with self._lock:
+                self._flusher = None
+            raise
+        finally:
+            # The connection belongs to this thread, which is about to end.
+            connections.close_all()
+
+    def flush(self):
+        """Writes the queued sessions to the table."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+        model = SessionStore.get_model_class()
+        try:
+            with transaction.atomic():
+                model.objects.filter(session_key__in=[key for key, row in pending.items() if row is DELETED]).delete()
+                model.objects.bulk_create(
+                    [row for row in pending.values() if row is not DELETED],
+                    update_conflicts=True, unique_fields=['session_key'],
+                    update_fields=['session_data', 'expire_date'],
+                )
+        except DatabaseError:
+            # Requeue, unless the session has been written again since.
+            with self._lock:
+                for key, row in pending.items():
+                    self._pending.setdefault(key, row)
+
+
+writes = SessionWriteBuffer()
+atexit.register(writes.flush)
+
+
+class SessionStore(cached_db.SessionStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def _queued(self):
+        # Evicted from the cache before this worker flushed it.
+        row = writes.pending(self.session_key)
+        if row is None or row is DELETED:
+            return row
+        return self.decode(row.session_data)
+
+    def _found(self, data):
+        # A deleted session must not be read back from its table row.
+        if data == DELETED:
+            self._session_key = None
+            return {}
+        return data
+
+    def load(self):
+        try:
+            data = self._cache.get(self.cache_key)
+        except Exception:
+            data = None
+        if data is None:
+            data = self._queued()
+        if data is None:
+            return super().load()
+        return self._found(data)
+
+    async def aload(self):
+        try:
+            data = await self._cache.aget(await self.acache_key())
+        except Exception:
+            data = None
+        if data is None:
+            data = self._queued()
+        if data is None:
+            return await super().aload()
+        return self._found(data)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        if must_create:
+            # Keys are random, so the cache alone rules out a clash with a
+            # session created since the last flush.
+            if not self._cache.add(self.cache_key, data, self.get_expiry_age()):
+                raise CreateError
+        elif self._cache.get(self.cache_key) == DELETED:
+            # Deleted by a concurrent request, e.g. a logout.
+            raise UpdateError
+        else:
+            self._cache.set(self.cache_key, data, self.get_expiry_age())
+        writes.save(self.create_model_instance(data))
+
+    async def asave(self, must_create=False):
+        if self.session_key is None:
+            return await self.acreate()
+        data = await self._aget_session(no_load=must_create)
+        cache_key = await self.acache_key()
+        if must_create:
+            if not await self._cache.aadd(cache_key, data, await self.aget_expiry_age()):
+                raise CreateError
+        elif await self._cache.aget(cache_key) == DELETED:
+            raise UpdateError
+        else:
+            await self._cache.aset(cache_key, data, await self.aget_expiry_age())
+        writes.save(await self.acreate_model_instance(data))
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        # Outlives the table row, which goes at the next flush.
+        self._cache.set(self.cache_key_prefix + session_key, DELETED, max(60, 10 * _interval()))
+        writes.delete(session_key)
+
+    async def adelete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        await self._cache.aset(self.cache_key_prefix + session_key, DELETED, max(60, 10 * _interval()))
+        writes.delete(session_key)
@@ -0,0 +1,138 @@
+from django.db.models import F, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import rollups
+from .availability import rebuild_occupancy
+from .catalog_cache import bump_catalog_version
+from .models import AvailabilityEvent, Reservation, Vehicle
+from .rental_stats import STATS_FIELDS, rebuild_user_stats, record_change
+from .search import index_vehicle, unindex_vehicle
+
+
+def _active_spans(reservation):
+    """
+    Returns the (vehicle_id, start_date, end_date) spans whose active bookings
+    may have changed, comparing the saved row with its previous state, each
+    mapped to 'freed' or 'booked'.
+    """
+    previous = reservation.previous
+    spans = {}
+    if previous.get('status') == 'active':
+        spans[previous['vehicle_id'], previous['start_date'], previous['end_date']] = 'freed'
+    if reservation.status == 'active':
+        spans[reservation.vehicle_id, reservation.start_date, reservation.end_date] = 'booked'
+    return spans
+
+
+def _active_bookings_changed(spans):
+    """
+    Refreshes everything derived from a vehicle's active reservations:
+    the occupancy bitmaps, the availability version read by booking_index,
+    and the AvailabilityEvent rows behind the live stream.
+    """
+    for vehicle_id, start_date, end_date in spans:
+        rebuild_occupancy(vehicle_id, start_date, end_date)
+    Vehicle.objects.filter(id__in={span[0] for span in spans}).update(
+        availability_version=F('availability_version') + 1
+    )
+    # The new version is read by the INSERT itself, saving a query.
+    AvailabilityEvent.objects.bulk_create([
+        AvailabilityEvent(
+            vehicle_id=vehicle_id, start_date=start_date, end_date=end_date, change=change,
+            version=Coalesce(Subquery(Vehicle.objects.filter(id=vehicle_id).values('availability_version')), 0),
+        )
+        for (vehicle_id, start_date, end_date), change in spans.items()
+    ])
+
+
+@receiver(post_save, sender=Reservation)
+def sync_availability_on_save(sender, instance, **kwargs):
+    """
+    Keeps availability data in step with reservations entering or leaving 'active'.
+    """
+    previous = instance.previous
+    unchanged = all(
+        previous.get(field) == getattr(instance, field)
+        for field in ('status', 'vehicle_id', 'start_date', 'end_date')
+    )
+    spans = _active_spans(instance)
+    if unchanged or not spans:
+        return
+    _active_bookings_changed(spans)
+
+
+@receiver(post_delete, sender=Reservation)
+def sync_availability_on_delete(sender, instance, **kwargs):
+    if instance.status == 'active':
+        _active_bookings_changed({(instance.vehicle_id, instance.start_date, instance.end_date): 'freed'})
+
+
+def _state(reservation):
+    return {field: getattr(reservation, field) for field in Reservation.TRACKED_FIELDS}
+
+
+@receiver(post_save, sender=Reservation)
+def update_rental_stats_on_save(sender, instance, **kwargs):
+    """
+    Applies the reservation's change to its user's UserRentalStats row.
+    """
+    previous = instance.previous
+    current = _state(instance)
+    if previous and any(field not in previous for field in STATS_FIELDS):
+        # Loaded with only()/defer(), so the old values are unknown.
+        for user_id in {previous.get('user_id'), instance.user_id} - {None}:
+            rebuild_user_stats(user_id)
+        return
+    if all(previous.get(field) == current[field] for field in STATS_FIELDS):
+        return
+    record_change(previous or None, current)
+
+
+@receiver(post_delete, sender=Reservation)
+def update_rental_stats_on_delete(sender, instance, **kwargs):
+    record_change(_state(instance), None)
+
+
+def _cached_vehicle_types(reservation):
+    # Views usually read the vehicle before booking it; spare the lookup then.
+    if Reservation.vehicle.is_cached(reservation):
+        return {reservation.vehicle_id: reservation.vehicle.type}
+    return {}
+
+
+@receiver(post_save, sender=Reservation)
+def update_rollups_on_save(sender, instance, **kwargs):
+    """
+    Applies the reservation's change to the daily rollups.
+    """
+    previous = instance.previous
+    current = _state(instance)
+    if previous and any(field not in previous for field in rollups.ROLLUP_FIELDS):
+        # Loaded with only()/defer(): recount the days it can have been on.
+        rollups.rebuild_rollups({previous.get('start_date'), instance.start_date} - {None})
+        return
+    if all(previous.get(field) == current[field] for field in rollups.ROLLUP_FIELDS):
+        return
+    rollups.record_change(previous or None, current, _cached_vehicle_types(instance))
+
+
+@receiver(post_delete, sender=Reservation)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    rollups.record_change(_state(instance), None, _cached_vehicle_types(instance))
+
+
+@receiver(post_save, sender=Vehicle)
+def vehicle_saved(sender, instance, **kwargs):
+    """
+    Keeps the FTS5 search index and the cached catalog pages in step with vehicle edits.
+    """
+    index_vehicle(instance)
+    bump_catalog_version()
+
+
+@receiver(post_delete, sender=Vehicle)
+def vehicle_deleted(sender, instance, **kwargs):
+    unindex_vehicle(instance.pk)
+    bump_catalog_version()
@@ -0,0 +1,92 @@
+"""
+SQLite backend tuned for a web server sharing one database file between
+many threads and processes.
+
+- Every new connection sets the pragmas in DEFAULT_PRAGMAS, overridable with
+  OPTIONS['pragmas']. WAL lets readers carry on while a write commits, and
+  synchronous=NORMAL is durable under WAL except across a power cut.
+- busy_timeout is set from OPTIONS['timeout'], as for the stock backend.
+- When SQLite still reports the database busy after that, statements that
+  run outside a transaction are retried with jittered exponential backoff:
+  OPTIONS['busy_retries'] times, waiting up to OPTIONS['busy_backoff'] *
+  2**attempt seconds. With transaction_mode IMMEDIATE every write transaction
+  takes its lock in the BEGIN, so this retries whole write transactions
+  before anything in them has run. Statements inside a transaction are never
+  retried.
+
+Pair it with CONN_MAX_AGE so the pragmas run once per connection rather
+than once per request.
+"""
+import random
+import time
+from sqlite3 import dbapi2 as Database
+
+from django.db.backends.sqlite3 import base
+
+from .creation import DatabaseCreation
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative: in KiB, so 64 MiB
+}
+
+# Longest single wait between retries, in seconds.
+MAX_BACKOFF = 1.0
+
+
+def is_busy(error):
+    """Whether error is SQLite giving up on a lock another connection holds."""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is None:
+        return 'locked' in str(error)
+    return code & 0xff in (Database.SQLITE_BUSY, Database.SQLITE_LOCKED)
+
+
+class BusyRetryCursorWrapper(base.SQLiteCursorWrapper):
+    retries = 5
+    backoff = 0.01
+
+    def _retry(self, method, *args):
+        attempt = 0
+        while True:
+            retryable = not self.connection.in_transaction
+            try:
+                return method(*args)
+            except Database.OperationalError as e:
+                if not (retryable and attempt < self.retries and is_busy(e)):
+                    raise
+            time.sleep(random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt)))
+            attempt += 1
+
+    def execute(self, query, params=None):
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        # A generator could not be replayed after a failed attempt.
+        return self._retry(super().executemany, query, list(param_list))
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {**DEFAULT_PRAGMAS, **kwargs.pop('pragmas', {})}
+        self.pragmas.setdefault('busy_timeout', int(kwargs.get('timeout', 5) * 1000))
+        self.busy_retries = kwargs.pop('busy_retries', BusyRetryCursorWrapper.retries)
+        self.busy_backoff = kwargs.pop('busy_backoff', BusyRetryCursorWrapper.backoff)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=BusyRetryCursorWrapper)
+        cursor.retries = self.busy_retries
+        cursor.backoff = self.busy_backoff
+        return cursor
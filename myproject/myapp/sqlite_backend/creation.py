@@ -0,0 +1,36 @@
+import os
+
+from django.db.backends.sqlite3 import creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """
+    Test databases run in WAL mode, so their -wal and -shm files go with
+    them: a stale WAL left beside a new database file would be replayed into it.
+    """
+
+    def _remove_wal_files(self, name):
+        for suffix in ('-wal', '-shm'):
+            try:
+                os.remove(f"{name}{suffix}")
+            except FileNotFoundError:
+                pass
+
+    def _create_test_db(self, verbosity, autoclobber, keepdb=False):
+        test_database_name = self._get_test_db_name()
+        if not keepdb and not self.is_in_memory_db(test_database_name):
+            self._remove_wal_files(test_database_name)
+        return super()._create_test_db(verbosity, autoclobber, keepdb)
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        # Clones are plain file copies, which miss anything still in the WAL.
+        if not self.is_in_memory_db(self.connection.settings_dict['NAME']):
+            with self.connection.cursor() as cursor:
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._remove_wal_files(self.get_test_db_clone_settings(suffix)['NAME'])
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        super()._destroy_test_db(test_database_name, verbosity)
+        if test_database_name and not self.is_in_memory_db(test_database_name):
+            self._remove_wal_files(test_database_name)
@@ -0,0 +1,90 @@
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AvailabilityEvent, Reservation
+
+
+class SweepResult:
+    def __init__(self, task, rows, seconds):
+        self.task = task
+        self.rows = rows
+        self.seconds = seconds
+
+    def __str__(self):
+        return f"{self.task}: {self.rows} rows in {self.seconds * 1000:.1f}ms"
+
+
+def _sweep_batch(task, queryset, new_status, batch_size):
+    """
+    Moves up to batch_size reservations of queryset to new_status in one
+    transaction. Rows are saved one by one so the reservation signals keep
+    availability and stats in sync.
+    """
+    started = time.perf_counter()
+    with transaction.atomic():
+        batch = list(queryset.order_by('id')[:batch_size])
+        for reservation in batch:
+            reservation.status = new_status
+            reservation.save(update_fields=['status'])
+    return SweepResult(task, len(batch), time.perf_counter() - started)
+
+
+def complete_expired(batch_size, today=None):
+    """Completes active rentals whose end date has passed."""
+    queryset = Reservation.objects.filter(status='active', end_date__lt=today or date.today())
+    return _sweep_batch('complete_expired', queryset, 'completed', batch_size)
+
+
+def expire_abandoned(batch_size, pending_ttl, today=None):
+    """
+    Cancels reservations left unpaid for longer than pending_ttl, or whose
+    start date has already passed.
+    """
+    cutoff = timezone.now() - pending_ttl
+    queryset = Reservation.objects.filter(
+        Q(created_at__lt=cutoff) | Q(start_date__lt=today or date.today()),
+        status__in=Reservation.PENDING_STATUSES,
+    )
+    return _sweep_batch('expire_abandoned', queryset, 'cancelled', batch_size)
+
+
+def prune_events(batch_size, retention):
+    """Deletes availability events older than retention (see live.py)."""
+    started = time.perf_counter()
+    with transaction.atomic():
+        ids = list(
+            AvailabilityEvent.objects
+            .filter(created_at__lt=timezone.now() - retention)
+            .order_by('created_at')  # Walks the index; ordering by id would scan the table
+            .values_list('id', flat=True)[:batch_size]
+        )
+        AvailabilityEvent.objects.filter(id__in=ids).delete()
+    return SweepResult('prune_events', len(ids), time.perf_counter() - started)
+
+
+def sweep(batch_size=500, pending_ttl=timedelta(hours=24), max_batches=None, event_retention=None):
+    """
+    Runs every task in bounded batches until nothing is left to do (or
+    max_batches per task is reached), yielding a SweepResult per batch.
+    Keeping batches small bounds how long each one holds the write lock.
+    event_retention defaults to settings.LIVE_EVENT_RETENTION seconds.
+    """
+    if event_retention is None:
+        event_retention = timedelta(seconds=getattr(settings, 'LIVE_EVENT_RETENTION', 3600))
+    for task in (
+        lambda: complete_expired(batch_size),
+        lambda: expire_abandoned(batch_size, pending_ttl),
+        lambda: prune_events(batch_size, event_retention),
+    ):
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            result = task()
+            batches += 1
+            yield result
+            if result.rows < batch_size:
+                break
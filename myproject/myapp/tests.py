@@ -1,3 +1,1715 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import pstats
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import ExitStack
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, OperationalError, connection, connections, transaction
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+
+from .availability import MAX_BATCH_VEHICLES, booked_vehicle_ids, month_masks
+from .benchmarks import run_booking_race
+from .booked_dates import encode
+from .booking_index import VehicleBookings, booking_index
+from .checks import WRITE_BEHIND_ENGINE, check_session_cache
+from .catalog_cache import LRUCache, catalog_cache, get_catalog_version
+from .fleet import generate_fleet
+from .instrumentation import RequestTiming, install_wrappers
+from .loadtest import percentile, run_load_test
+from .models import AvailabilityEvent, DailyBookings, DailyRevenue, Reservation, UserProfile, UserRentalStats, Vehicle
+from .pagination import encode_cursor
+from .profiling import _cprofile_lock, list_profiles
+from .quotes import quote_engine, quote_vehicle
+from .rollups import rebuild_rollups
+from .search import match_expression
+from .sqlite_backend.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from .sweeper import sweep
+from .views import batch_booked_dates_view, get_booked_dates_view, rent_vehicle_view, vehicle_data_view
+from . import metrics, utilization
+
+
+def setUpModule():
+    # Request metrics go to a throwaway file rather than the development one.
+    directory = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(directory.cleanup)
+    metrics_db = override_settings(METRICS_DB=Path(directory.name) / 'metrics.sqlite3')
+    metrics_db.enable()
+    unittest.addModuleCleanup(metrics_db.disable)
+
+
+class ReservationOverlapGuardTests(TestCase):
+    """
+    The database itself refuses a second active reservation for the same days.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('guard@example.com', password='pass')
+        self.vehicle = Vehicle.objects.create(name='Camry', type='car')
+        self.start = date.today() + timedelta(days=3)
+
+    def reserve(self, offset, days, status='pending_payment'):
+        start = self.start + timedelta(days=offset)
+        return Reservation.objects.create(
+            user=self.user, vehicle=self.vehicle, status=status,
+            start_date=start, end_date=start + timedelta(days=days),
+        )
+
+    def test_activating_an_overlapping_reservation_fails(self):
+        self.reserve(0, 3, status='active')
+        pending = self.reserve(2, 3)
+        pending.status = 'active'
+        with self.assertRaisesMessage(IntegrityError, Reservation.OVERLAP_ERROR):
+            pending.save()
+
+    def test_payment_for_taken_dates_is_cancelled(self):
+        self.reserve(0, 3, status='active')
+        pending = self.reserve(2, 3)
+        self.client.login(username='guard@example.com', password='pass')
+        response = self.client.post('/process-payment/', {'reservation_id': pending.pk, 'cvv': '123'})
+        self.assertRedirects(response, '/home/', fetch_redirect_response=False)
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'cancelled')
+
+    def test_payment_reraises_other_integrity_errors(self):
+        pending = self.reserve(0, 3)
+        self.client.login(username='guard@example.com', password='pass')
+        with mock.patch.object(Reservation, 'save', side_effect=IntegrityError('NOT NULL constraint failed')):
+            with self.assertRaises(IntegrityError):
+                self.client.post('/process-payment/', {'reservation_id': pending.pk, 'cvv': '123'})
+
+    def test_back_to_back_reservations_can_both_be_active(self):
+        self.reserve(0, 3, status='active')
+        self.reserve(3, 3, status='active')
+        self.assertEqual(Reservation.objects.filter(status='active').count(), 2)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    Hundreds of users racing for the same vehicle and dates end with exactly one booking.
+    """
+
+    def test_exactly_one_booking_wins(self):
+        with self.assertLogs('django.request', level='WARNING'):
+            result = run_booking_race(contenders=200)
+
+        self.assertEqual(result['active'], 1)
+        self.assertEqual(sum(result['outcomes'].values()), 200)
+        self.assertEqual(set(result['outcomes']) - {'rent 200', 'rent 409'}, set())
+
+
+class AvailabilitySearchTests(TestCase):
+    """
+    The occupancy bitmaps find the vehicles booked in a window exactly like
+    an overlap query over active reservations would, across month and year
+    boundaries.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('search@example.com')
+        self.camry = Vehicle.objects.create(name='Camry', type='car')
+        self.civic = Vehicle.objects.create(name='Civic', type='car')
+
+    def reserve(self, vehicle, start_date, end_date, status='active'):
+        return Reservation.objects.create(
+            user=self.user, vehicle=vehicle, start_date=start_date, end_date=end_date, status=status,
+        )
+
+    def booked(self, start_date, end_date):
+        return set(booked_vehicle_ids(start_date, end_date).values_list('vehicle_id', flat=True))
+
+    def test_month_masks(self):
+        self.assertEqual(list(month_masks(date(2027, 12, 30), date(2028, 1, 2))), [
+            (date(2027, 12, 1), 0b11 << 29),
+            (date(2028, 1, 1), 0b1),
+        ])
+        self.assertEqual(list(month_masks(date(2028, 2, 28), date(2028, 3, 1))), [(date(2028, 2, 1), 0b11 << 27)])
+
+    def test_boundary_days(self):
+        # Booked the nights of 30 and 31 January and 1 February; out on the 2nd.
+        self.reserve(self.camry, date(2028, 1, 30), date(2028, 2, 2))
+        self.assertEqual(self.booked(date(2028, 1, 29), date(2028, 1, 30)), set())
+        self.assertEqual(self.booked(date(2028, 2, 2), date(2028, 2, 5)), set())
+        self.assertEqual(self.booked(date(2028, 1, 31), date(2028, 2, 1)), {self.camry.pk})
+        self.assertEqual(self.booked(date(2028, 2, 1), date(2028, 2, 2)), {self.camry.pk})
+        self.assertEqual(self.booked(date(2027, 12, 1), date(2028, 3, 1)), {self.camry.pk})
+
+    def test_only_active_reservations_count(self):
+        pending = self.reserve(self.civic, date(2028, 1, 10), date(2028, 1, 12), status='pending_payment')
+        self.assertEqual(self.booked(date(2028, 1, 1), date(2028, 2, 1)), set())
+        pending.status = 'active'
+        pending.save()
+        self.assertEqual(self.booked(date(2028, 1, 1), date(2028, 2, 1)), {self.civic.pk})
+        pending.status = 'cancelled'
+        pending.save()
+        self.assertEqual(self.booked(date(2028, 1, 1), date(2028, 2, 1)), set())
+
+    def test_overlapping_windows_match_reservations(self):
+        self.reserve(self.camry, date(2027, 12, 28), date(2028, 1, 3))
+        self.reserve(self.camry, date(2028, 1, 3), date(2028, 1, 5))
+        self.reserve(self.civic, date(2028, 1, 31), date(2028, 3, 2))
+        first = date(2027, 12, 20)
+        for offset in range(0, 80, 3):
+            for days in (1, 2, 7, 31):
+                start_date = first + timedelta(days=offset)
+                end_date = start_date + timedelta(days=days)
+                expected = set(Reservation.objects.filter(
+                    status='active', start_date__lt=end_date, end_date__gt=start_date,
+                ).values_list('vehicle_id', flat=True))
+                self.assertEqual(self.booked(start_date, end_date), expected, (start_date, end_date))
+
+    def test_window_search(self):
+        self.reserve(self.camry, date(2028, 1, 30), date(2028, 2, 2))
+        names = lambda window: [vehicle['name'] for vehicle in self.client.get('/api/vehicles/', window).json()['vehicles']]
+        self.assertEqual(names({'start': '2028-02-01', 'end': '2028-02-03'}), ['Civic'])
+        self.assertEqual(names({'start': '2028-02-02', 'end': '2028-02-03'}), ['Camry', 'Civic'])
+        response = self.client.get('/api/vehicles/', {'start': '2028-02-03', 'end': '2028-02-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BookingIndexTests(TestCase):
+    """
+    The in-process booking index answers conflict checks from memory, and
+    reloads a vehicle's ranges once its availability_version has moved on.
+    """
+
+    def setUp(self):
+        booking_index.clear()
+        self.user = User.objects.create_user('index@example.com')
+        self.vehicle = Vehicle.objects.create(name='Camry', type='car')
+        self.start = date(2028, 3, 10)
+
+    def reserve(self, offset, days, status='active'):
+        start = self.start + timedelta(days=offset)
+        return Reservation.objects.create(
+            user=self.user, vehicle=self.vehicle, status=status,
+            start_date=start, end_date=start + timedelta(days=days),
+        )
+
+    def conflicts(self, offset, days):
+        self.vehicle.refresh_from_db()
+        start = self.start + timedelta(days=offset)
+        return booking_index.has_conflict(self.vehicle, start, start + timedelta(days=days))
+
+    def test_conflicts(self):
+        self.reserve(0, 3)
+        self.reserve(10, 2)
+        self.reserve(5, 1, status='pending_payment')
+        self.assertTrue(self.conflicts(2, 1))
+        self.assertTrue(self.conflicts(-1, 20))
+        self.assertTrue(self.conflicts(11, 5))
+        self.assertFalse(self.conflicts(-2, 2))
+        self.assertFalse(self.conflicts(3, 7))  # ends where the second begins
+        self.assertFalse(self.conflicts(12, 1))
+
+    def test_cache_follows_version(self):
+        self.assertFalse(self.conflicts(0, 1))
+        with self.assertNumQueries(0):
+            self.assertFalse(booking_index.has_conflict(self.vehicle, self.start, self.start + timedelta(days=1)))
+
+        stale = Vehicle.objects.get(pk=self.vehicle.pk)
+        reservation = self.reserve(0, 2, status='pending_payment')
+        reservation.status = 'active'
+        reservation.save()
+        self.assertTrue(self.conflicts(0, 1))
+
+        # Saving a copy loaded before the booking must not move the version back.
+        stale.name = 'Camry Hybrid'
+        stale.save()
+        self.assertTrue(self.conflicts(0, 1))
+        reservation.status = 'cancelled'
+        reservation.save()
+        self.assertFalse(self.conflicts(0, 1))
+
+    def test_ordinary_saves_keep_the_version(self):
+        stale = Vehicle.objects.get(pk=self.vehicle.pk)
+        self.reserve(0, 1)
+        version = Vehicle.objects.get(pk=self.vehicle.pk).availability_version
+        self.assertGreater(version, stale.availability_version)
+        stale.price_per_day = Decimal('30.00')
+        stale.save()
+        stale.save(update_fields=['availability_version', 'price_per_day'])
+        self.assertEqual(Vehicle.objects.get(pk=self.vehicle.pk).availability_version, version)
+        self.assertEqual(Vehicle.objects.get(pk=self.vehicle.pk).price_per_day, Decimal('30.00'))
+
+
+class RentalStatsTests(TestCase):
+    """
+    Dashboard totals follow reservation changes, are backfilled for older
+    reservations, and are only ever read by the dashboard itself.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('stats@example.com', password='pass')
+        self.car = Vehicle.objects.create(name='Camry', type='car')
+        self.bike = Vehicle.objects.create(name='Ather 450X', type='bike')
+        self.start = date(2028, 5, 1)
+
+    def reserve(self, vehicle, status, cost='50.00'):
+        return Reservation.objects.create(
+            user=self.user, vehicle=vehicle, status=status, total_cost=Decimal(cost),
+            start_date=self.start, end_date=self.start + timedelta(days=2),
+        )
+
+    def stats(self):
+        return UserRentalStats.objects.get(user=self.user)
+
+    def test_stats_follow_changes(self):
+        reservation = self.reserve(self.car, 'pending_payment')
+        self.reserve(self.bike, 'completed', cost='20.00')
+        self.reserve(self.bike, 'cancelled')
+        reservation.status = 'active'
+        reservation.save()
+        stats = self.stats()
+        self.assertEqual((stats.total_rentals, stats.active_rentals, stats.pending_rentals), (3, 1, 0))
+        self.assertEqual(stats.total_spent, Decimal('20.00'))
+        self.assertEqual(stats.favorite_type, 'Bike')
+
+        reservation.status = 'completed'
+        reservation.save()
+        reservation.vehicle = self.bike
+        reservation.save()
+        stats = self.stats()
+        self.assertEqual((stats.active_rentals, stats.total_spent, stats.type_counts), (0, Decimal('70.00'), {'car': 0, 'bike': 3}))
+
+    def test_backfill(self):
+        self.reserve(self.car, 'completed')
+        other = User.objects.create_user('other@example.com')
+        Reservation.objects.create(user=other, vehicle=self.bike, start_date=self.start, end_date=self.start)
+        Reservation.objects.create(user=other, vehicle=self.car, start_date=self.start, end_date=self.start,
+                                   status='payment_failed')
+        UserRentalStats.objects.filter(user=other).delete()
+        UserRentalStats.objects.filter(user=self.user).update(total_rentals=5)
+
+        migration = importlib.import_module('myapp.migrations.0019_backfill_rental_stats')
+        migration.backfill_rental_stats(django_apps, None)
+        stats = UserRentalStats.objects.get(user=other)
+        self.assertEqual((stats.total_rentals, stats.pending_rentals), (2, 2))
+        self.assertEqual(stats.type_counts, {'bike': 1, 'car': 1})
+        # Rows the signals maintain are left alone.
+        self.assertEqual(self.stats().total_rentals, 5)
+
+    def test_dashboard_is_read_only(self):
+        self.client.login(username='stats@example.com', password='pass')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/home/')
+        self.assertEqual(response.context['total_rentals'], 0)
+        self.assertEqual(response.context['favorite_type'], 'N/A')
+        writes = [
+            query['sql'] for query in queries
+            if 'myapp_userrentalstats' in query['sql'] and not query['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(writes, [])
+        self.assertFalse(UserRentalStats.objects.filter(user=self.user).exists())
+
+        self.reserve(self.car, 'active')
+        self.assertEqual(self.client.get('/home/').context['active_rentals'], 1)
+
+
+class SweeperTests(TestCase):
+    """
+    The sweeper completes expired rentals, cancels abandoned unpaid ones and
+    prunes old availability events, in bounded batches.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('sweep@example.com')
+        self.vehicle = Vehicle.objects.create(name='Camry', type='car')
+        self.today = date.today()
+
+    def reserve(self, start_offset, days, status):
+        start = self.today + timedelta(days=start_offset)
+        return Reservation.objects.create(
+            user=self.user, vehicle=self.vehicle, status=status,
+            start_date=start, end_date=start + timedelta(days=days),
+        )
+
+    def statuses(self, *reservations):
+        return [Reservation.objects.get(pk=reservation.pk).status for reservation in reservations]
+
+    def run_sweep(self, **kwargs):
+        return [(result.task, result.rows) for result in sweep(**kwargs)]
+
+    def test_transitions(self):
+        expired = self.reserve(-5, 3, 'active')
+        ending_today = self.reserve(-2, 2, 'active')
+        running = self.reserve(0, 3, 'active')
+        stale = self.reserve(5, 1, 'pending_payment')
+        Reservation.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(hours=25))
+        started = self.reserve(-1, 1, 'payment_failed')
+        fresh = self.reserve(10, 1, 'pending_payment')
+        self.assertEqual(self.run_sweep(), [('complete_expired', 1), ('expire_abandoned', 2), ('prune_events', 0)])
+        self.assertEqual(
+            self.statuses(expired, ending_today, running, stale, started, fresh),
+            ['completed', 'active', 'active', 'cancelled', 'cancelled', 'pending_payment'],
+        )
+        # Saved one by one, so availability and stats follow.
+        self.assertEqual(set(booked_vehicle_ids(expired.start_date, expired.end_date - timedelta(days=2))), set())
+        self.assertEqual(UserRentalStats.objects.get(user=self.user).active_rentals, 2)
+        self.assertEqual(self.run_sweep(), [('complete_expired', 0), ('expire_abandoned', 0), ('prune_events', 0)])
+
+    def test_batches(self):
+        for offset in range(5):
+            self.reserve(-20 + offset * 3, 2, 'active')
+        self.assertEqual(self.run_sweep(batch_size=2)[:3], [('complete_expired', 2)] * 2 + [('complete_expired', 1)])
+        for offset in range(3):
+            self.reserve(-40 + offset * 3, 2, 'active')
+        self.assertEqual(self.run_sweep(batch_size=2, max_batches=1)[0], ('complete_expired', 2))
+        self.assertEqual(Reservation.objects.filter(status='active').count(), 1)
+
+    def test_prune_events(self):
+        for offset in range(4):
+            self.reserve(offset * 3, 2, 'active')
+        self.assertEqual(AvailabilityEvent.objects.count(), 4)
+        old = AvailabilityEvent.objects.order_by('id')[:3].values_list('id', flat=True)
+        AvailabilityEvent.objects.filter(id__in=list(old)).update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(
+            self.run_sweep(batch_size=2, event_retention=timedelta(hours=1))[-2:],
+            [('prune_events', 2), ('prune_events', 1)],
+        )
+        self.assertEqual(AvailabilityEvent.objects.count(), 1)
+
+
+class FleetTests(TestCase):
+    """
+    generate_fleet writes consistent synthetic data: no overlapping active
+    bookings, and derived tables rebuilt as if the signals had run.
+    """
+
+    def test_generate_fleet(self):
+        counts = generate_fleet(
+            vehicles=30, users=5, reservations_per_vehicle=8, seed=3, history_days=30, user_prefix='fleet',
+        )
+        self.assertEqual(counts['vehicles'], 30)
+        self.assertEqual(counts['users'], 5)
+        self.assertEqual(Reservation.objects.count(), counts['reservations'])
+        self.assertGreaterEqual(counts['reservations'], 30 * 8)
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith='fleet').count(), 5)
+
+        active = list(Reservation.objects.filter(status='active').values_list('vehicle_id', 'start_date', 'end_date'))
+        self.assertTrue(active)
+        for vehicle_id, start_date, end_date in active:
+            self.assertEqual(self.booked(start_date, end_date) & {vehicle_id}, {vehicle_id})
+            self.assertEqual(Reservation.objects.filter(
+                vehicle_id=vehicle_id, status='active', start_date__lt=end_date, end_date__gt=start_date,
+            ).count(), 1)
+        self.assertEqual(UserRentalStats.objects.count(), 5)
+        self.assertEqual(
+            sum(UserRentalStats.objects.values_list('total_rentals', flat=True)), counts['reservations'],
+        )
+        self.assertEqual(len(self.client.get('/api/vehicles/', {'search': 'tesla'}).json()['vehicles']) > 0,
+                         Vehicle.objects.filter(name__startswith='Tesla').exists())
+
+        # Users are reused, the rest is added.
+        again = generate_fleet(vehicles=2, users=5, reservations_per_vehicle=1, seed=3, user_prefix='fleet')
+        self.assertEqual(User.objects.filter(username__startswith='fleet').count(), 5)
+        self.assertEqual(Vehicle.objects.count(), 32)
+        self.assertEqual(Reservation.objects.count(), counts['reservations'] + again['reservations'])
+
+    def booked(self, start_date, end_date):
+        return set(booked_vehicle_ids(start_date, end_date).values_list('vehicle_id', flat=True))
+
+
+# Logins would otherwise spend most of the run hashing passwords.
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadTestTests(LiveServerTestCase):
+    """
+    The load-test harness logs in as generated users and drives the real
+    URL set of a running server.
+    """
+
+    def test_percentile(self):
+        samples = [0.1 * i for i in range(1, 11)]
+        self.assertEqual(percentile(samples, 50), samples[4])
+        self.assertEqual(percentile(samples, 99), samples[9])
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_run_load_test(self):
+        generate_fleet(vehicles=12, users=2, reservations_per_vehicle=3, seed=5)
+        rows, elapsed, failed_logins = run_load_test(self.live_server_url, concurrency=2, duration=2, users=2)
+        self.assertEqual(failed_logins, 0)
+        report = {row['endpoint']: row for row in rows}
+        for endpoint in ('GET /', 'POST /login/', 'GET /api/vehicles/', 'GET /home/'):
+            self.assertGreater(report[endpoint]['requests'], 0, endpoint)
+        self.assertEqual(sum(row['errors'] for row in rows), 0, rows)
+        self.assertEqual(report['GET /home/']['statuses'], {200: report['GET /home/']['requests']})
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0, REQUEST_TIMING_REPEAT_THRESHOLD=3)
+class RequestTimingTests(TestCase):
+    """
+    Sampled requests report their query, template and view time, and call
+    out SELECTs repeated within one request.
+    """
+
+    def setUp(self):
+        self.vehicles = [Vehicle.objects.create(name=f'Camry {i}', type='car') for i in range(4)]
+
+    def test_server_timing_and_log(self):
+        with self.assertLogs('myapp.request_timing', level='INFO') as logs:
+            response = self.client.get('/vehicles/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, view;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        summary = logs.records[-1].timing
+        self.assertEqual((summary['view'], summary['status'], summary['repeated_queries']), ('vehicles', 200, []))
+        self.assertGreater(summary['queries'], 0)
+        self.assertGreater(summary['template_ms'], 0)
+        self.assertEqual(logs.records[-1].levelname, 'INFO')
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0.0)
+    def test_unsampled(self):
+        with self.assertNoLogs('myapp.request_timing'):
+            response = self.client.get('/vehicles/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_repeated_queries(self):
+        timing = RequestTiming(repeat_threshold=3)
+        with ExitStack() as stack:
+            install_wrappers(stack, timing)
+            for vehicle in self.vehicles:
+                Vehicle.objects.get(pk=vehicle.pk)
+            Vehicle.objects.get(pk=self.vehicles[0].pk)
+        self.assertEqual(timing.query_count, 5)
+        self.assertEqual(timing.duplicates, 1)
+        [(sql, (caller, template))] = timing.repeated.items()
+        self.assertEqual(timing.statements[sql], 5)
+        self.assertRegex(caller, r'^myapp/tests\.py:\d+ in test_repeated_queries$')
+        self.assertIsNone(template)
+
+
+class MetricsAccessTests(TestCase):
+    """
+    /metrics is only served to staff, to the configured addresses and to
+    requests bearing the configured token.
+    """
+
+    def test_closed_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        # Behind a local proxy every request comes from the loopback address.
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code, 403)
+
+    def test_staff(self):
+        User.objects.create_user('staff@example.com', password='pass', is_staff=True)
+        self.client.login(username='staff@example.com', password='pass')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE gryphon_http_responses_total counter', response.content.decode())
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'], METRICS_TOKEN='s3cret')
+    def test_addresses_and_token(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code, 200)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 's3cret'}).status_code, 403)
+
+
+class MetricsFlushTests(TransactionTestCase):
+    """
+    Counts reach the METRICS_DB file from a background thread, without a
+    query on the request's database connection.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(
+            METRICS_DB=Path(directory.name) / 'metrics.sqlite3', METRICS_FLUSH_INTERVAL=0.05,
+        ))
+
+    def stored(self, series):
+        return {name: value for name, _, value in metrics.store.rows()}.get(series, 0)
+
+    def test_flushed_off_the_request_path(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/')
+        self.assertEqual(len(queries), 0)
+        deadline = time.monotonic() + 5
+        while not self.stored('gryphon_http_request_duration_seconds_count'):
+            self.assertLess(time.monotonic(), deadline, "metrics not flushed in time")
+            time.sleep(0.02)
+        self.assertNotIn('myapp_metricseries', connection.introspection.table_names())
+
+    def test_scrape_includes_the_buffer(self):
+        def scraped():
+            match = re.search(r'^gryphon_bookings_attempted_total (\S+)$', metrics.render(), re.M)
+            return float(match[1]) if match else 0.0
+
+        before = scraped()
+        metrics.bookings_attempted.inc()
+        self.assertEqual(scraped(), before + 1)
+
+
+class ProfilingTests(TestCase):
+    """
+    Staff can profile a request in place; profiles are stored, listed,
+    downloadable and pruned to the newest PROFILES_KEEP.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(PROFILES_DIR=directory.name, PROFILES_KEEP=2))
+        self.directory = Path(directory.name)
+        User.objects.create_user('staff@example.com', password='pass', is_staff=True)
+        User.objects.create_user('user@example.com', password='pass')
+
+    def test_only_staff(self):
+        self.client.login(username='user@example.com', password='pass')
+        response = self.client.get('/about/', {'_profile': '1'})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.client.get('/staff/profiles/').status_code, 302)
+        self.assertFalse(self.directory.exists() and any(self.directory.iterdir()))
+
+    def test_cprofile(self):
+        self.client.login(username='staff@example.com', password='pass')
+        name = self.client.get('/about/', {'_profile': '1'})['X-Profile-Id']
+        self.assertRegex(name, r'^\d{8}T\d{6}-about-[0-9a-f]{8}\.prof$')
+        stats = pstats.Stats(str(self.directory / name))
+        self.assertTrue(any(function == 'about' for _, _, function in stats.stats))
+        [meta] = list_profiles()
+        self.assertEqual((meta['name'], meta['mode'], meta['view'], meta['user']),
+                         (name, 'cprofile', 'about', 'staff@example.com'))
+        response = self.client.get(f'/staff/profiles/{name}')
+        self.assertEqual(b''.join(response.streaming_content), (self.directory / name).read_bytes())
+        self.assertEqual(self.client.get('/staff/profiles/..%2Fdb.sqlite3').status_code, 404)
+
+    def test_stack_samples(self):
+        self.client.login(username='staff@example.com', password='pass')
+        name = self.client.get('/about/', headers={'X-Profile': 'sample'})['X-Profile-Id']
+        self.assertTrue(name.endswith('.collapsed'))
+        for line in (self.directory / name).read_text().splitlines():
+            self.assertRegex(line, r'^\S.* \d+$')
+
+    def test_busy_and_pruning(self):
+        self.client.login(username='staff@example.com', password='pass')
+        with _cprofile_lock:
+            self.assertEqual(self.client.get('/about/', {'_profile': '1'})['X-Profile-Id'], 'busy')
+        names = [self.client.get('/about/', {'_profile': '1'})['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(len(set(names)), 3)
+        self.assertEqual(sorted(path.name for path in self.directory.glob('*.prof')), sorted(names[1:]))
+        self.assertEqual(len(list(self.directory.glob('*.json'))), 2)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_SAMPLE_VIEWS=['about'])
+    def test_sampling(self):
+        self.assertTrue(self.client.get('/about/')['X-Profile-Id'].endswith('.collapsed'))
+        self.assertNotIn('X-Profile-Id', self.client.get('/terms/'))
+        self.assertEqual(list_profiles()[0]['trigger'], 'sampled')
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0)
+class AsyncViewTests(TestCase):
+    """
+    The JSON API views run natively async, through async-capable
+    middleware, and answer like their synchronous counterparts did.
+    """
+
+    def setUp(self):
+        catalog_cache.clear()
+        self.user = User.objects.create_user('async@example.com')
+        self.vehicle = Vehicle.objects.create(name='Camry', type='car', price_per_day=Decimal('40.00'))
+        self.start = date.today() + timedelta(days=10)
+
+    def test_views_are_async(self):
+        for view in (vehicle_data_view, get_booked_dates_view, batch_booked_dates_view, rent_vehicle_view):
+            self.assertTrue(asyncio.iscoroutinefunction(view), view.__name__)
+
+    async def test_catalog(self):
+        response = await self.async_client.get('/api/vehicles/', {'total': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Server-Timing', response)
+        data = response.json()
+        self.assertEqual(([vehicle['name'] for vehicle in data['vehicles']], data['approx_total']), (['Camry'], 1))
+        self.assertEqual(data, (await sync_to_async(self.client.get)('/api/vehicles/', {'total': '1'})).json())
+
+    async def rent(self, offset, days, **overrides):
+        start = self.start + timedelta(days=offset)
+        body = {
+            'vehicle_id': self.vehicle.pk, 'pickup_location': 'airport',
+            'start_date': str(start), 'end_date': str(start + timedelta(days=days)), **overrides,
+        }
+        return await self.async_client.post('/api/rent/', body, content_type='application/json')
+
+    async def test_rent(self):
+        self.assertEqual((await self.rent(0, 3)).status_code, 302)  # login required
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.rent(0, 3)
+        self.assertEqual(response.status_code, 200)
+        reservation = await Reservation.objects.aget(pk=resolve(response.json()['redirect_url']).kwargs['reservation_id'])
+        self.assertEqual((reservation.status, reservation.pickup_location), ('pending_payment', 'Airport'))
+        # The default pricing rules are neutral: the daily price times the days.
+        self.assertEqual(reservation.total_cost, self.vehicle.price_per_day * 3)
+        self.assertEqual(reservation.total_cost, quote_vehicle(self.vehicle, self.start, self.start + timedelta(days=3)))
+
+        reservation.status = 'active'
+        await reservation.asave()
+        self.assertEqual((await self.rent(2, 3)).status_code, 409)
+        self.assertEqual((await self.rent(3, 3)).status_code, 200)
+        self.assertEqual((await self.rent(0, 3, vehicle_id=self.vehicle.pk + 100)).status_code, 404)
+        self.assertEqual((await self.rent(0, 3, start_date=str(date.today() - timedelta(days=1)))).status_code, 400)
+        self.assertEqual((await self.async_client.get('/api/rent/')).status_code, 405)
+
+        response = await self.async_client.get(f'/api/vehicle/{self.vehicle.pk}/booked-dates/')
+        self.assertEqual(response.json(), [{'from': str(self.start), 'to': str(self.start + timedelta(days=3))}])
+
+
+class BusyRetryTests(TestCase):
+    """
+    Statements outside a transaction, and IMMEDIATE transactions as a whole,
+    are retried while another connection holds the write lock; statements
+    inside a transaction are not.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'busy.sqlite3'
+        # Released from a timer thread in some tests.
+        self.holder = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.addCleanup(self.holder.close)
+        self.holder.execute('PRAGMA journal_mode = WAL')
+        self.holder.execute('CREATE TABLE t (x INTEGER)')
+        # Records the backoff waits, which still happen.
+        self.clock = self.enterContext(mock.patch('myapp.sqlite_backend.base.time', wraps=time))
+
+    def wrapper(self, **options):
+        settings_dict = {
+            **connection.settings_dict, 'NAME': str(self.path),
+            'OPTIONS': {'timeout': 0.02, 'busy_retries': 4, 'busy_backoff': 0.05, **options},
+        }
+        connections['busy'] = wrapper = SQLiteDatabaseWrapper(settings_dict, alias='busy')
+        self.addCleanup(connections.__delitem__, 'busy')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def lock(self, release_after=None):
+        self.holder.execute('BEGIN IMMEDIATE')
+        if release_after is not None:
+            timer = threading.Timer(release_after, self.holder.execute, ['COMMIT'])
+            timer.start()
+            self.addCleanup(timer.join)
+
+    def count(self):
+        return self.holder.execute('SELECT count(*) FROM t').fetchone()[0]
+
+    def test_retried_until_the_lock_is_released(self):
+        wrapper = self.wrapper()
+        self.lock(release_after=0.1)
+        with wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (%s)', [1])
+        self.assertTrue(self.clock.sleep.called)
+        self.assertEqual(self.count(), 1)
+
+    def test_gives_up_after_the_retries(self):
+        wrapper = self.wrapper(busy_retries=2)
+        self.lock()
+        with self.assertRaises(OperationalError), wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (%s)', [1])
+        self.assertEqual(self.clock.sleep.call_count, 2)
+        self.holder.execute('ROLLBACK')
+
+    def test_immediate_transactions_are_retried_whole(self):
+        wrapper = self.wrapper(transaction_mode='IMMEDIATE')
+        self.lock(release_after=0.1)
+        with transaction.atomic(using='busy'), wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (%s)', [1])
+        self.assertTrue(self.clock.sleep.called)
+        self.assertEqual(self.count(), 1)
+
+    def test_not_retried_inside_a_transaction(self):
+        wrapper = self.wrapper(transaction_mode='DEFERRED')
+        with self.assertRaises(OperationalError), transaction.atomic(using='busy'), wrapper.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM t')
+            self.lock()
+            cursor.execute('INSERT INTO t VALUES (%s)', [1])
+        self.assertFalse(self.clock.sleep.called)
+        self.holder.execute('ROLLBACK')
+
+
+class SessionEngineTests(TransactionTestCase):
+    """
+    Logins work under the default db engine and under write_behind, whose
+    timer adds session changes to the table without a further request. The
+    system check refuses write_behind on a per-process cache.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('renter', password='pw')
+        cache.clear()
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("session table not updated in time")
+            time.sleep(0.02)
+
+    def stored(self, key):
+        return Session.objects.filter(session_key=key).exists()
+
+    def test_db_engine_is_the_default(self):
+        self.assertEqual(settings.SESSION_ENGINE, 'django.contrib.sessions.backends.db')
+        self.client.force_login(self.user)
+        self.assertTrue(self.stored(self.client.session.session_key))
+        self.assertEqual(self.client.get('/home/').status_code, 200)
+
+    @override_settings(SESSION_ENGINE=WRITE_BEHIND_ENGINE, SESSION_WRITE_BEHIND_INTERVAL=0.05)
+    def test_write_behind_flushes_on_a_timer(self):
+        self.client.force_login(self.user)
+        key = self.client.session.session_key
+        self.assertEqual(self.client.get('/home/').status_code, 200)
+        self.wait_for(lambda: self.stored(key))
+
+        self.client.logout()
+        self.wait_for(lambda: not self.stored(key))
+        self.assertEqual(self.client.get('/home/').status_code, 302)
+
+    def test_write_behind_needs_a_shared_cache(self):
+        self.assertEqual(check_session_cache(None), [])
+        with override_settings(SESSION_ENGINE=WRITE_BEHIND_ENGINE):
+            self.assertEqual([error.id for error in check_session_cache(None)], ['myapp.E001'])
+            shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}}
+            with override_settings(CACHES=shared):
+                self.assertEqual(check_session_cache(None), [])
+
+
+class CatalogCacheTests(TestCase):
+    """
+    Catalog pages are cached and revalidated under the catalog version, which
+    moves with every committed vehicle change.
+    """
+
+    def setUp(self):
+        catalog_cache.clear()
+        Vehicle.objects.create(name='Camry', type='car')
+
+    def metric(self, series):
+        match = re.search(rf'^{re.escape(series)} (\S+)$', metrics.render(), re.M)
+        return float(match[1]) if match else 0.0
+
+    def test_change_and_bump_commit_together(self):
+        vehicle = Vehicle.objects.get()
+        vehicle.name = 'Corolla'
+        with mock.patch('myapp.signals.bump_catalog_version', side_effect=DatabaseError('disk I/O error')):
+            with self.assertRaises(DatabaseError):
+                vehicle.save()
+        self.assertEqual(Vehicle.objects.get().name, 'Camry')
+        version = get_catalog_version()
+        vehicle.save()
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_not_modified(self):
+        response = self.client.get('/api/vehicles/')
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        for if_none_match in (etag, f'"other", {etag}', '*'):
+            with self.subTest(if_none_match=if_none_match):
+                response = self.client.get('/api/vehicles/', headers={'If-None-Match': if_none_match})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response.content, b'')
+        # Other pages have their own tags.
+        response = self.client.get('/api/vehicles/', {'filter': 'bike'}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_vehicle_changes_move_the_version(self):
+        etag = self.client.get('/api/vehicles/')['ETag']
+        Vehicle.objects.create(name='Civic', type='car')
+        response = self.client.get('/api/vehicles/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([vehicle['name'] for vehicle in response.json()['vehicles']], ['Camry', 'Civic'])
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        Vehicle.objects.get(name='Civic').delete()
+        self.assertEqual(len(self.client.get('/api/vehicles/', headers={'If-None-Match': etag}).json()['vehicles']), 1)
+
+    def test_rolled_back_changes_keep_the_version(self):
+        version = get_catalog_version()
+        with self.assertRaises(ValueError), transaction.atomic():
+            Vehicle.objects.create(name='Civic', type='car')
+            self.assertGreater(get_catalog_version(), version)
+            raise ValueError
+        self.assertEqual(get_catalog_version(), version)
+        # A later bump never reuses a version seen inside the rolled back transaction.
+        Vehicle.objects.create(name='Civic', type='car')
+        self.assertGreater(get_catalog_version(), version + 1)
+
+    def test_metrics(self):
+        hits = self.metric('gryphon_cache_lookups_total{cache="catalog",result="hit"}')
+        misses = self.metric('gryphon_cache_lookups_total{cache="catalog",result="miss"}')
+        self.client.get('/api/vehicles/')
+        self.client.get('/api/vehicles/')
+        self.assertEqual(self.metric('gryphon_cache_lookups_total{cache="catalog",result="hit"}'), hits + 1)
+        self.assertEqual(self.metric('gryphon_cache_lookups_total{cache="catalog",result="miss"}'), misses + 1)
+
+        evictions = self.metric('gryphon_cache_evictions_total{cache="test"}')
+        lru = LRUCache(2, 'test')
+        for key in 'abc':
+            lru.set(key, key)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.get('c'), 'c')
+        self.assertEqual(lru.stats(), {'entries': 2, 'max_entries': 2, 'hits': 1, 'misses': 1, 'evictions': 1})
+        self.assertEqual(self.metric('gryphon_cache_evictions_total{cache="test"}'), evictions + 1)
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    /api/vehicles/ cursors walk the catalog in (name, id) order, forwards and
+    backwards, without skipping or repeating vehicles that share a name.
+    """
+
+    def setUp(self):
+        catalog_cache.clear()
+        cache.clear()
+        # Duplicate names straddle the page boundaries.
+        for name in ['Camry'] * 8 + ['Ather 450X'] * 3 + ['Zoom', 'Bolt']:
+            Vehicle.objects.create(name=name, type='car')
+        self.expected = list(Vehicle.objects.order_by('name', 'id').values_list('id', flat=True))
+
+    def page(self, **params):
+        response = self.client.get('/api/vehicles/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_round_trip(self):
+        pages = [self.page()]
+        while pages[-1]['has_next']:
+            pages.append(self.page(cursor=pages[-1]['next_cursor']))
+        self.assertEqual([len(page['vehicles']) for page in pages], [6, 6, 1])
+        self.assertEqual([v['id'] for page in pages for v in page['vehicles']], self.expected)
+        self.assertFalse(pages[0]['has_previous'])
+        self.assertIsNone(pages[-1]['next_cursor'])
+
+        # Walking back from the last page returns the same pages.
+        back = [pages[-1]]
+        while back[-1]['has_previous']:
+            back.append(self.page(cursor=back[-1]['previous_cursor']))
+        self.assertEqual(
+            [[v['id'] for v in page['vehicles']] for page in back[::-1]],
+            [[v['id'] for v in page['vehicles']] for page in pages],
+        )
+
+    def test_ties_on_name(self):
+        camrys = list(Vehicle.objects.filter(name='Camry').order_by('id').values_list('id', flat=True))
+        page = self.page(cursor=encode_cursor('next', 'Camry', camrys[2]))
+        self.assertEqual([v['id'] for v in page['vehicles']], camrys[3:] + self.expected[-1:])
+        page = self.page(cursor=encode_cursor('prev', 'Camry', camrys[2]))
+        self.assertEqual([v['id'] for v in page['vehicles']], self.expected[:6])
+
+    def test_invalid_cursors(self):
+        for cursor in ['garbage', encode_cursor('up', 'Camry', 1), encode_cursor('next', 'Camry', True)]:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/api/vehicles/', {'cursor': cursor}).status_code, 400)
+        # The HTML list starts over instead.
+        response = self.client.get('/vehicles/', {'cursor': 'garbage'})
+        self.assertEqual([v.pk for v in response.context['vehicles']], self.expected)
+
+    def test_total_only_on_request(self):
+        self.assertNotIn('approx_total', self.page())
+        self.assertEqual(self.page(total=1)['approx_total'], len(self.expected))
+        self.assertEqual(self.page(filter='bike', total=1)['approx_total'], 0)
+
+
+class SearchTests(TestCase):
+    """
+    Searches rank matches through the FTS5 index and page through them by
+    (rank, id); broad searches page by name instead.
+    """
+
+    def setUp(self):
+        catalog_cache.clear()
+        cache.clear()
+        for name in ['Tesla Model 3 Long Range', 'Tesla', 'Civic', 'Tesla Model Y', 'Tesla Model S Plaid']:
+            Vehicle.objects.create(name=name, type='car', fuel_type='electric' if 'Tesla' in name else 'petrol')
+
+    def names(self, **params):
+        return [vehicle['name'] for vehicle in self.client.get('/api/vehicles/', params).json()['vehicles']]
+
+    def walk(self, **params):
+        pages = [self.client.get('/api/vehicles/', params).json()]
+        while pages[-1]['has_next']:
+            pages.append(self.client.get('/api/vehicles/', {**params, 'cursor': pages[-1]['next_cursor']}).json())
+        return pages
+
+    def test_match_expression(self):
+        self.assertEqual(match_expression('Tesla mod'), '"tesla"* "mod"*')
+        self.assertEqual(match_expression('"3" OR x*'), '"3"* "or"* "x"*')
+        self.assertIsNone(match_expression(' -* '))
+
+    def test_ranking(self):
+        # Shorter documents score better under bm25.
+        self.assertEqual(self.names(search='tesla'), [
+            'Tesla', 'Tesla Model Y', 'Tesla Model S Plaid', 'Tesla Model 3 Long Range',
+        ])
+        self.assertEqual(self.names(search='mod'), ['Tesla Model Y', 'Tesla Model S Plaid', 'Tesla Model 3 Long Range'])
+        self.assertEqual(self.names(search='tesla plaid'), ['Tesla Model S Plaid'])
+        self.assertEqual(self.names(search='electric', filter='bike'), [])
+
+    def test_ranked_paging(self):
+        for i in range(10):
+            Vehicle.objects.create(name=f'Tesla Model {i}', type='car')
+        pages = self.walk(search='tesla model')
+        self.assertEqual([len(page['vehicles']) for page in pages], [6, 6, 1])
+        names = [vehicle['name'] for page in pages for vehicle in page['vehicles']]
+        self.assertEqual(len(set(names)), 13)
+        self.assertEqual(names[-1], 'Tesla Model 3 Long Range')
+
+        back = self.client.get('/api/vehicles/', {'search': 'tesla model', 'cursor': pages[-1]['previous_cursor']}).json()
+        self.assertEqual(back['vehicles'], pages[1]['vehicles'])
+
+    def test_broad_searches_page_by_name(self):
+        with mock.patch('myapp.search.RANKED_MATCH_LIMIT', 2):
+            pages = self.walk(search='tesla')
+        self.assertEqual([vehicle['name'] for vehicle in pages[0]['vehicles']], [
+            'Tesla', 'Tesla Model 3 Long Range', 'Tesla Model S Plaid', 'Tesla Model Y',
+        ])
+
+    def test_total_is_counted_once(self):
+        for i in range(10):
+            Vehicle.objects.create(name=f'Tesla Model {i}', type='car')
+        first = self.walk(search='tesla', total=1)
+        self.assertEqual(first[0]['approx_total'], 14)
+        # Every page asks for the total, as kahani.js does, but it is only
+        # counted once: later walks only count the FTS matches of their first
+        # page, to choose between ranked and name order.
+        catalog_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            pages = self.walk(search='tesla', total=1)
+        self.assertEqual([page['approx_total'] for page in pages], [14] * len(pages))
+        counts = [query['sql'] for query in queries if 'count(' in query['sql'].lower()]
+        self.assertEqual(len(counts), 1)
+        self.assertIn('myapp_vehicle_fts MATCH', counts[0])
+
+
+class CatalogJsonTests(TestCase):
+    """
+    /api/vehicles/ entries, built from values_list rows and the stored
+    feature labels, match the vehicles they describe.
+    """
+
+    def setUp(self):
+        catalog_cache.clear()
+
+    def test_features_follow_saves(self):
+        vehicle = Vehicle.objects.create(name='Camry', type='car', seats=4, transmission='manual')
+        self.assertEqual(vehicle.features, ['Manual', '4 Seats', 'Fuel: Petrol'])
+        vehicle.fuel_type = 'hybrid'
+        vehicle.save(update_fields=['fuel_type'])
+        vehicle.refresh_from_db()
+        self.assertEqual(vehicle.features, ['Manual', '4 Seats', 'Fuel: Hybrid'])
+
+    def test_catalog_entries(self):
+        Vehicle.objects.create(name='Ather 450X', type='bike', fuel_type='electric', transmission='none',
+                               price_per_day='19.99')
+        Vehicle.objects.create(name='Camry', type='car', image_url='/static/images/camry.png')
+        ather = {
+            'id': Vehicle.objects.get(name='Ather 450X').pk, 'name': 'Ather 450X', 'type': 'bike',
+            'price': 19.99, 'priceUnit': 'day', 'image': '/static/images/default.png',
+            'features': ['Fuel: Electric'], 'tags': ['electric'],
+        }
+        camry = {
+            'id': Vehicle.objects.get(name='Camry').pk, 'name': 'Camry', 'type': 'car',
+            'price': 25.0, 'priceUnit': 'day', 'image': '/static/images/camry.png',
+            'features': ['Automatic', '5 Seats', 'Fuel: Petrol'],
+        }
+        self.assertEqual(self.client.get('/api/vehicles/').json()['vehicles'], [ather, camry])
+        # Ranked searches read their rows separately.
+        self.assertEqual(self.client.get('/api/vehicles/', {'search': 'ather'}).json()['vehicles'], [ather])
+
+
+@override_settings(
+    QUOTE_WEEKEND_DAYS=(5, 6), QUOTE_WEEKEND_MULTIPLIER=1.5, QUOTE_SEASONS=[('12-30', '01-02', 2.0)],
+    QUOTE_LENGTH_DISCOUNTS=[(3, 0.1), (30, 0.5)], QUOTE_TYPE_SURCHARGES={'car': 1.00},
+)
+class QuoteTests(TestCase):
+    """
+    /api/quotes/ prices the fleet by the QUOTE_* rules, and bookings are
+    charged what they were quoted.
+    """
+
+    def setUp(self):
+        quote_engine.clear()
+        self.car = Vehicle.objects.create(name='Camry', type='car', price_per_day=Decimal('100.00'))
+        self.bike = Vehicle.objects.create(name='Duke', type='bike', price_per_day=Decimal('20.00'))
+
+    def test_rules(self):
+        # Friday 1 January 2027 in season, Saturday in season and weekend,
+        # Sunday weekend: 2 + 3 + 1.5 days' price, plus 3 days' surcharge, less 10%.
+        quote = self.client.get('/api/quotes/', {'start': '2027-01-01', 'end': '2027-01-04'}).json()
+        self.assertEqual(quote['days'], 3)
+        self.assertEqual(dict(zip(quote['ids'], quote['totals'])), {self.car.pk: 587.7, self.bike.pk: 117.0})
+        self.assertEqual(quote_vehicle(self.car, date(2027, 1, 1), date(2027, 1, 4)), Decimal('587.70'))
+
+        quote = self.client.get('/api/quotes/', {'start': '2027-01-04', 'end': '2027-01-05', 'ids': self.bike.pk})
+        self.assertEqual(quote.json()['totals'], [20.0])
+
+    def test_booking_is_charged_the_quote(self):
+        self.client.force_login(User.objects.create_user('quote@example.com'))
+        start, end = date.today() + timedelta(days=10), date.today() + timedelta(days=17)
+        quote = self.client.get('/api/quotes/', {'start': str(start), 'end': str(end), 'ids': self.car.pk}).json()
+        response = self.client.post('/api/rent/', json.dumps({
+            'vehicle_id': self.car.pk, 'start_date': str(start), 'end_date': str(end), 'pickup_location': 'downtown',
+        }), content_type='application/json')
+        reservation = Reservation.objects.get(pk=resolve(response.json()['redirect_url']).kwargs['reservation_id'])
+        self.assertEqual(reservation.total_cost, Decimal(str(quote['totals'][0])))
+
+    def test_price_changes_reach_quotes(self):
+        window = {'start': '2027-03-01', 'end': '2027-03-02', 'ids': self.bike.pk}
+        self.assertEqual(self.client.get('/api/quotes/', window).json()['totals'], [20.0])
+        self.bike.price_per_day = Decimal('30.00')
+        self.bike.save()
+        self.assertEqual(self.client.get('/api/quotes/', window).json()['totals'], [30.0])
+
+
+class UtilizationTests(TestCase):
+    """
+    The utilization matrix counts active and completed reservations, and its
+    incremental updates end up where a full build would.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(UTILIZATION_DIR=directory.name))
+        self.user = User.objects.create_user('fleet@example.com', is_staff=True)
+        self.car = Vehicle.objects.create(name='Camry', type='car')
+        self.other_car = Vehicle.objects.create(name='Civic', type='car')
+        self.bike = Vehicle.objects.create(name='Duke', type='bike')
+        self.reserve(self.car, date(2027, 1, 1), date(2027, 1, 5), 'active', '400.00', 'Downtown')
+        self.reserve(self.car, date(2027, 1, 8), date(2027, 1, 10), 'completed', '100.00', 'Airport')
+        self.reserve(self.other_car, date(2027, 1, 1), date(2027, 1, 9), 'cancelled', '800.00', 'Downtown')
+        self.reserve(self.bike, date(2027, 1, 2), date(2027, 1, 4), 'pending_payment', '40.00', 'Downtown')
+
+    def reserve(self, vehicle, start_date, end_date, status, total_cost, location):
+        return Reservation.objects.create(
+            user=self.user, vehicle=vehicle, start_date=start_date, end_date=end_date,
+            status=status, total_cost=Decimal(total_cost), pickup_location=location,
+        )
+
+    def report(self, matrix, by):
+        return {row['key']: row for row in utilization.report(matrix, date(2027, 1, 1), date(2027, 1, 11), by)}
+
+    def test_report(self):
+        matrix, _ = utilization.update()
+        vehicles = self.report(matrix, 'vehicle')
+        self.assertEqual(
+            {key: (row['booked_days'], row['utilization'], row['revenue_per_available_day'], row['longest_idle']) for key, row in vehicles.items()},
+            {'Camry': (6, 0.6, 50.0, 3), 'Civic': (0, 0.0, 0.0, 10), 'Duke': (0, 0.0, 0.0, 10)},
+        )
+        cars = self.report(matrix, 'type')['car']
+        self.assertEqual((cars['vehicles'], cars['available_days'], cars['booked_days'], cars['longest_idle']), (2, 20, 6, 6.5))
+        locations = self.report(matrix, 'location')
+        self.assertEqual({key: (row['booked_days'], row['revenue']) for key, row in locations.items()}, {'Downtown': (4, 400.0), 'Airport': (2, 100.0)})
+        self.assertEqual(locations['Downtown']['available_days'], 30)
+
+        self.client.force_login(self.user)
+        response = self.client.get('/staff/utilization/', {'from': '2027-01-01', 'to': '2027-01-11', 'by': 'vehicle'})
+        self.assertEqual([row['key'] for row in response.context['rows']], ['Camry', 'Civic', 'Duke'])
+
+    @mock.patch('myapp.utilization.CHANGE_OVERLAP', timedelta(0))
+    def test_incremental_update(self):
+        utilization.update()
+        self.assertEqual(utilization.update()[1], 0)
+
+        first = Reservation.objects.get(vehicle=self.car, status='active')
+        first.status = 'cancelled'
+        first.save(update_fields=['status'])
+        moved = Reservation.objects.get(vehicle=self.car, status='completed')
+        moved.vehicle = self.bike
+        moved.save()
+        Reservation.objects.filter(vehicle=self.other_car).update(status='active', updated_at=first.updated_at)
+        van = Vehicle.objects.create(name='Transit', type='van')
+        self.reserve(van, date(2027, 3, 1), date(2027, 3, 5), 'active', '200.00', 'Harbour')
+        matrix, rewritten = utilization.update()
+        self.assertEqual(rewritten, 4)
+
+        Reservation.objects.filter(vehicle=van).delete()
+        matrix, rewritten = utilization.update()
+        self.assertEqual(rewritten, 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            full, _ = utilization.update(directory=directory)
+            for by in utilization.GROUPINGS:
+                self.assertEqual(self.report(matrix, by), self.report(full, by))
+
+    def test_reservation_before_the_origin(self):
+        utilization.update()
+        self.reserve(self.bike, date(2026, 12, 1), date(2026, 12, 5), 'completed', '80.00', 'Airport')
+        self.reserve(self.bike, date(2026, 12, 30), date(2027, 1, 2), 'completed', '60.00', 'Airport')
+        matrix, _ = utilization.update()
+        # Both are placed, so the count of counted reservations still matches.
+        self.assertEqual(np.count_nonzero(matrix.placed >= 0), 4)
+        duke = self.report(matrix, 'vehicle')['Duke']
+        self.assertEqual((duke['booked_days'], duke['revenue']), (1, 20.0))
+
+        self.client.force_login(self.user)
+        response = self.client.get('/staff/utilization/', {'from': '2026-11-01', 'to': '2027-01-11'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_page_only_reads(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/staff/utilization/')
+        self.assertIsNone(response.context['last_run'])
+        self.assertIn('update_utilization', response.context['error'])
+
+        matrix, _ = utilization.update()
+        self.reserve(self.bike, date(2027, 1, 2), date(2027, 1, 4), 'active', '40.00', 'Downtown')
+        with mock.patch.object(utilization, 'update') as update:
+            response = self.client.get('/staff/utilization/', {'from': '2027-01-01', 'to': '2027-01-11', 'by': 'vehicle'})
+        update.assert_not_called()
+        self.assertEqual(response.context['last_run'], matrix.last_run)
+        rows = {row['key']: row['booked_days'] for row in response.context['rows']}
+        self.assertEqual(rows['Duke'], 0)
+
+
+class RollupTests(TestCase):
+    """
+    The daily rollups follow every reservation change to where a rebuild
+    would put them, and the admin report reads them.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('rollups@example.com')
+        self.car = Vehicle.objects.create(name='Camry', type='car')
+        self.bike = Vehicle.objects.create(name='Duke', type='bike')
+
+    def reserve(self, vehicle, start_date, days, total_cost, status='pending_payment'):
+        return Reservation.objects.create(
+            user=self.user, vehicle=vehicle, start_date=start_date, end_date=start_date + timedelta(days=days),
+            status=status, total_cost=Decimal(total_cost),
+        )
+
+    def rollups(self):
+        bookings = {
+            (row.date, row.vehicle_type, row.status): (row.bookings, row.rental_days)
+            for row in DailyBookings.objects.all() if row.bookings
+        }
+        revenue = {
+            (row.date, row.vehicle_type, row.status): row.revenue
+            for row in DailyRevenue.objects.all() if row.revenue
+        }
+        return bookings, revenue
+
+    def test_changes_match_rebuild(self):
+        day = date(2027, 5, 1)
+        paid = self.reserve(self.car, day, 3, '300.00')
+        self.reserve(self.car, day + timedelta(days=5), 2, '200.00', status='active')
+        moved = self.reserve(self.bike, day, 4, '80.00')
+        gone = self.reserve(self.bike, day + timedelta(days=10), 1, '20.00', status='completed')
+
+        paid.status = 'active'
+        paid.save(update_fields=['status'])
+        moved.vehicle = self.car
+        moved.start_date += timedelta(days=1)
+        moved.total_cost = Decimal('90.00')
+        moved.save()
+        gone.delete()
+        # Without total_cost loaded, the rollups of its day are recounted.
+        Reservation.objects.only('status', 'vehicle', 'start_date', 'end_date').get(pk=paid.pk).save()
+
+        bookings, revenue = self.rollups()
+        self.assertEqual(bookings[day, 'car', 'active'], (1, 3))
+        self.assertEqual(revenue[day + timedelta(days=1), 'car', 'pending_payment'], Decimal('90.00'))
+        self.assertNotIn((day, 'bike', 'pending_payment'), bookings)
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), (bookings, revenue))
+
+    def test_report(self):
+        self.reserve(self.car, date(2027, 5, 1), 3, '300.00', status='active')
+        self.reserve(self.car, date(2027, 5, 20), 2, '200.00', status='completed')
+        self.reserve(self.bike, date(2027, 5, 2), 1, '20.00', status='cancelled')
+        self.reserve(self.bike, date(2027, 6, 1), 1, '25.00', status='active')
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get('/admin/myapp/reservation/'), 'href="/admin/myapp/reservation/report/"')
+        response = self.client.get('/admin/myapp/reservation/report/', {'from': '2027-05-01', 'to': '2027-06-01', 'period': 'month'})
+        self.assertEqual(
+            [(row['period'], row['vehicle_type'], row['bookings'], row['rental_days'], row['revenue']) for row in response.context['rows']],
+            [(date(2027, 5, 1), 'car', 2, 5, Decimal('500.00'))],
+        )
+        response = self.client.get('/admin/myapp/reservation/report/', {'from': '2027-05-01', 'to': '2027-07-01', 'status': 'cancelled'})
+        self.assertEqual(response.context['totals'], {'bookings': 1, 'rental_days': 1, 'revenue': Decimal('20.00')})
+
+    def test_report_rejects_bad_periods(self):
+        self.client.force_login(self.user)
+        end_date = date.today() + timedelta(days=1)
+        for params, error in (
+            ({'from': '2027-05-01', 'to': '2027-06-31'}, 'Dates must be in YYYY-MM-DD format.'),
+            ({'from': 'May', 'to': '2027-06-01'}, 'Dates must be in YYYY-MM-DD format.'),
+            ({'from': '2027-06-01', 'to': '2027-06-01'}, 'The end date must be after the start date.'),
+            ({'from': '2027-06-01', 'to': '2027-05-01'}, 'The end date must be after the start date.'),
+        ):
+            with self.subTest(**params):
+                response = self.client.get('/admin/myapp/reservation/report/', params)
+                self.assertContains(response, error)
+                # Back to the default period, not half of the one asked for.
+                self.assertEqual((response.context['start_date'], response.context['end_date']), (end_date - timedelta(days=30), end_date))
+
+
+class BatchBookedDatesTests(TestCase):
+    """
+    /api/booked-dates/ answers for several vehicles what the per-vehicle
+    endpoint answers for each, and refuses malformed or oversized requests.
+    """
+
+    def setUp(self):
+        booking_index.clear()
+        self.user = User.objects.create_user('batch@example.com', password='pass')
+        self.client.force_login(self.user)
+        self.start = date.today() + timedelta(days=30)
+        self.vehicles = [Vehicle.objects.create(name=f'Car {number}', type='car') for number in range(3)]
+        for number, vehicle in enumerate(self.vehicles[:2]):
+            for offset in (0, 10 + number):
+                self.reserve(vehicle, offset, 3)
+
+    def reserve(self, vehicle, offset, days, status='active'):
+        start = self.start + timedelta(days=offset)
+        return Reservation.objects.create(
+            user=self.user, vehicle=vehicle, status=status,
+            start_date=start, end_date=start + timedelta(days=days),
+        )
+
+    def batch(self, ids, **params):
+        return self.client.get('/api/booked-dates/', {'ids': ','.join(map(str, ids)), **params})
+
+    def test_matches_the_per_vehicle_endpoint(self):
+        ids = [vehicle.pk for vehicle in self.vehicles]
+        for params in ({}, {'format': 'rle'}, {'from': str(self.start + timedelta(days=5))}):
+            with self.subTest(**params):
+                response = self.batch(ids, **params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), {
+                    str(pk): self.client.get(f'/api/vehicle/{pk}/booked-dates/', params).json() for pk in ids
+                })
+        self.assertEqual(response.json()[str(self.vehicles[2].pk)], [])
+
+    def test_window(self):
+        vehicle = self.vehicles[0]
+        response = self.batch([vehicle.pk], **{
+            'from': str(self.start + timedelta(days=5)), 'to': str(self.start + timedelta(days=20)),
+        })
+        self.assertEqual(response.json(), {str(vehicle.pk): [{
+            'from': str(self.start + timedelta(days=10)), 'to': str(self.start + timedelta(days=13)),
+        }]})
+
+    def test_unknown_and_repeated_ids(self):
+        vehicle = self.vehicles[0]
+        missing = max(v.pk for v in self.vehicles) + 1
+        response = self.batch([vehicle.pk, missing, vehicle.pk])
+        self.assertEqual(list(response.json()), [str(vehicle.pk)])
+
+    def test_one_query_for_the_ranges(self):
+        ids = [vehicle.pk for vehicle in self.vehicles]
+        # Session, user, versions, then the ranges of every vehicle at once.
+        with self.assertNumQueries(4):
+            self.batch(ids)
+        with self.assertNumQueries(3):
+            self.batch(ids)
+
+    def test_bad_requests(self):
+        too_many = range(1, MAX_BATCH_VEHICLES + 2)
+        for ids, params in (
+            ([], {}), (['x'], {}), (too_many, {}),
+            ([1], {'from': 'tomorrow'}), ([1], {'from': '2030-01-02', 'to': '2030-01-01'}),
+            ([1], {'format': 'csv'}),
+        ):
+            with self.subTest(ids=ids, **params):
+                response = self.batch(ids, **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['status'], 'error')
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.batch([self.vehicles[0].pk]).status_code, 302)
+
+
+class BookedDatesFormatTests(TestCase):
+    """
+    Booked ranges are merged when they overlap or touch, clipped to the
+    from/to horizon (from defaults to today), and encoded as ranges, run
+    lengths or a bitmap of the same days.
+    """
+
+    def setUp(self):
+        booking_index.clear()
+        self.user = User.objects.create_user('formats@example.com', password='pass')
+        self.client.force_login(self.user)
+        self.vehicle = Vehicle.objects.create(name='Camry', type='car')
+        self.today = date.today()
+
+    def day(self, offset):
+        return self.today + timedelta(days=offset)
+
+    def reserve(self, offset, days):
+        return Reservation.objects.create(
+            user=self.user, vehicle=self.vehicle, status='active',
+            start_date=self.day(offset), end_date=self.day(offset + days),
+        )
+
+    def booked_dates(self, **params):
+        response = self.client.get(f'/api/vehicle/{self.vehicle.pk}/booked-dates/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_coalesced(self):
+        # The database refuses overlapping active reservations, but the
+        # merge must not rely on that.
+        bookings = VehicleBookings(1, [
+            (self.day(0), self.day(3)), (self.day(1), self.day(2)), (self.day(2), self.day(5)),
+            (self.day(5), self.day(7)), (self.day(9), self.day(10)),
+        ])
+        self.assertEqual(bookings.coalesced(), [(self.day(0), self.day(7)), (self.day(9), self.day(10))])
+        self.assertEqual(bookings.coalesced(self.day(4), self.day(10)), [(self.day(4), self.day(7)), (self.day(9), self.day(10))])
+        self.assertEqual(bookings.coalesced(self.day(7)), [(self.day(9), self.day(10))])
+        self.assertEqual(bookings.coalesced(end=self.day(9)), [(self.day(0), self.day(7))])
+        self.assertEqual(bookings.coalesced(self.day(7), self.day(9)), [])
+
+    def test_encodings(self):
+        spans = [(self.day(2), self.day(4)), (self.day(7), self.day(8))]
+        start = self.day(0)
+        self.assertEqual(encode(spans, 'ranges', start), [
+            {'from': str(self.day(2)), 'to': str(self.day(4))}, {'from': str(self.day(7)), 'to': str(self.day(8))},
+        ])
+        self.assertEqual(encode(spans, 'rle', start), {'start': str(start), 'runs': [2, 2, 3, 1]})
+        # Days 2, 3 and 7: 0b10001100.
+        self.assertEqual(encode(spans, 'bitset', start), {'start': str(start), 'days': 8, 'bits': 'jA=='})
+        self.assertEqual(encode([], 'rle', start), {'start': str(start), 'runs': []})
+        self.assertEqual(encode([], 'bitset', start), {'start': str(start), 'days': 0, 'bits': ''})
+
+    def test_endpoint_clips_to_today(self):
+        self.reserve(-10, 5)
+        self.reserve(-2, 4)
+        self.reserve(2, 2)
+        self.reserve(6, 1)
+        self.assertEqual(self.booked_dates(), [
+            {'from': str(self.day(0)), 'to': str(self.day(4))}, {'from': str(self.day(6)), 'to': str(self.day(7))},
+        ])
+        self.assertEqual(self.booked_dates(format='rle'), {'start': str(self.day(0)), 'runs': [0, 4, 2, 1]})
+        # Days 0 to 3 and 6: 0b1001111.
+        self.assertEqual(self.booked_dates(format='bitset'), {'start': str(self.day(0)), 'days': 7, 'bits': 'Tw=='})
+        self.assertEqual(self.booked_dates(**{'from': str(self.day(-10)), 'to': str(self.day(3))}), [
+            {'from': str(self.day(-10)), 'to': str(self.day(-5))}, {'from': str(self.day(-2)), 'to': str(self.day(3))},
+        ])
+
+
+@override_settings(LIVE_AVAILABILITY=True, LIVE_POLL_INTERVAL=0.01)
+class AvailabilityStreamTests(TestCase):
+    """
+    Changes to active reservations reach open /api/availability/stream/
+    connections, and reconnecting browsers are sent what they missed. The
+    stream is only served over ASGI with LIVE_AVAILABILITY on.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('live@example.com', password='pass')
+        self.async_client.force_login(self.user)
+        self.vehicle = Vehicle.objects.create(name='Camry', type='car')
+
+    async def open_stream(self, **headers):
+        response = await self.async_client.get('/api/availability/stream/', headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        return chunks
+
+    async def next_event(self, chunks):
+        text = (await asyncio.wait_for(anext(chunks), 5)).decode()
+        fields = dict(line.split(': ', 1) for line in text.strip().split('\n'))
+        return fields['event'], fields.get('id'), json.loads(fields['data'])
+
+    async def test_booking_and_cancellation_are_streamed(self):
+        chunks = await self.open_stream()
+        start = date.today() + timedelta(days=3)
+        reservation = await Reservation.objects.acreate(
+            user=self.user, vehicle=self.vehicle, start_date=start, end_date=start + timedelta(days=2),
+        )
+        reservation.status = 'active'
+        await sync_to_async(reservation.save)()
+        kind, booked_id, data = await self.next_event(chunks)
+        self.assertEqual((kind, data['vehicle'], data['change']), ('availability', self.vehicle.pk, 'booked'))
+        self.assertEqual((data['from'], data['to']), (str(start), str(start + timedelta(days=2))))
+
+        reservation.status = 'cancelled'
+        await sync_to_async(reservation.save)()
+        _, _, data = await self.next_event(chunks)
+        self.assertEqual(data['change'], 'freed')
+
+        # Reconnecting after the booking replays the cancellation.
+        _, _, data = await self.next_event(await self.open_stream(**{'Last-Event-ID': booked_id}))
+        self.assertEqual(data['change'], 'freed')
+
+    async def test_reconnecting_past_pruned_events_resets(self):
+        await AvailabilityEvent.objects.acreate(
+            vehicle=self.vehicle, start_date=date.today(), end_date=date.today(), change='booked', version=1,
+        )
+        kind, _, _ = await self.next_event(await self.open_stream(**{'Last-Event-ID': '999999'}))
+        self.assertEqual(kind, 'reset')
+
+    def test_not_streamed_under_wsgi(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/availability/stream/')
+        self.assertEqual(response.status_code, 204)
+        self.assertContains(self.client.get('/home/'), 'data-live-availability="on"')
+
+    @override_settings(LIVE_AVAILABILITY=False)
+    async def test_off_by_setting(self):
+        response = await self.async_client.get('/api/availability/stream/')
+        self.assertEqual(response.status_code, 204)
+        home = await self.async_client.get('/home/')
+        self.assertContains(home, 'data-live-availability="off"')
+
+
+class QueryPlanTests(TestCase):
+    """
+    Every query issued by the views is answered through an index: no EXPLAIN
+    QUERY PLAN may show a full scan of a table.
+    """
+
+    # Plan lines that walk a table or an index from end to end. Any of them
+    # fails the test unless ALLOWED_SCANS lists it; searches are always fine.
+    FULL_SCAN = re.compile(r'^SCAN (\S+)(?: .*)?$')
+    ALLOWED_SCANS = [re.compile(pattern) for pattern in (
+        # Keyset pages: ordered walks of the name index that stop at the LIMIT.
+        r'SCAN myapp_vehicle USING INDEX vehicle_name_id_idx',
+        # approx_total's COUNT(*), run at most every APPROX_TOTAL_TTL seconds.
+        r'SCAN myapp_vehicle USING COVERING INDEX vehicle_name_id_idx',
+        # FTS5 MATCH lookups in the full-text index (plan flag M).
+        r'SCAN myapp_vehicle_fts VIRTUAL TABLE INDEX \d+:M\d*',
+        # The VALUES list of a multi-row INSERT.
+        r'SCAN \d+ CONSTANT ROWS',
+    )]
+    # Intermediate results SQLite builds itself, which are named in the plan.
+    MATERIALIZED = re.compile(r'^(?:MATERIALIZE|CO-ROUTINE) (\S+)$')
+    EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+    def setUp(self):
+        self.user = User.objects.create_user('Plan@Example.com', email='plan@example.com', password='pass')
+        UserProfile.objects.create(user=self.user, phone='+15550100')
+        self.vehicles = [
+            Vehicle.objects.create(name=f'{name} {i}', type=vehicle_type, fuel_type=fuel)
+            for i in range(10)
+            for name, vehicle_type, fuel in (('Camry', 'car', 'petrol'), ('Model 3', 'car', 'electric'), ('Duke', 'bike', 'manual'))
+        ]
+        self.start = date.today() + timedelta(days=5)
+        self.reservations = [
+            Reservation.objects.create(
+                user=self.user, vehicle=vehicle, status=status, total_cost=100,
+                start_date=self.start, end_date=self.start + timedelta(days=3),
+            )
+            for vehicle, status in zip(self.vehicles, ('active', 'pending_payment', 'completed', 'payment_failed'))
+        ]
+        catalog_cache.clear()
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            details = [row[-1] for row in cursor.fetchall()]
+        materialized = {match[1] for match in map(self.MATERIALIZED.match, details) if match}
+        return [
+            detail for detail in details
+            if (match := self.FULL_SCAN.match(detail))
+            and match[1] not in materialized
+            and not any(allowed.fullmatch(detail) for allowed in self.ALLOWED_SCANS)
+        ]
+
+    def assertIndexed(self, method, path, data=None, **extra):
+        """Requests path and fails if any query it ran scans a whole table."""
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, data, **extra)
+        self.assertLess(response.status_code, 500, path)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if sql.lstrip().split(None, 1)[0].upper() not in self.EXPLAINABLE:
+                continue
+            scans = self.full_scans(sql)
+            self.assertEqual(scans, [], f'{method.upper()} {path} runs a full scan:\n{sql}')
+        return response
+
+    def test_index_walks_are_scans(self):
+        self.assertEqual(self.full_scans('SELECT * FROM myapp_vehicle WHERE seats > 2'), ['SCAN myapp_vehicle'])
+        self.assertEqual(
+            self.full_scans('SELECT id FROM myapp_reservation ORDER BY status, end_date'),
+            ['SCAN myapp_reservation USING COVERING INDEX reservation_status_end_idx'],
+        )
+
+    def test_public_pages(self):
+        for path in ('/', '/about/', '/contact/', '/terms/', '/policy/'):
+            self.assertIndexed('get', path)
+
+    def test_register_and_login(self):
+        self.assertIndexed('post', '/register/', {
+            'firstName': 'New', 'lastName': 'User', 'email': 'new@example.com',
+            'registerPassword': 'pass', 'phone': '5550199', 'registerCountryCode': '+1',
+        })
+        self.assertIndexed('get', '/logout/')
+        self.assertIndexed('post', '/login/', {'loginEmail': 'PLAN@example.com', 'loginPassword': 'pass'})
+        self.assertIndexed('post', '/login/', {'loginPhone': '5550100', 'countryCode': '+1', 'loginPassword': 'pass'})
+
+    def test_vehicle_list(self):
+        for vehicle_filter in ('all', 'car', 'bike', 'electric'):
+            self.assertIndexed('get', '/vehicles/', {'filter': vehicle_filter})
+
+    def test_vehicle_api(self):
+        window = {'start': str(self.start), 'end': str(self.start + timedelta(days=2))}
+        for vehicle_filter in ('all', 'car', 'bike', 'electric'):
+            response = self.assertIndexed('get', '/api/vehicles/', {'filter': vehicle_filter, 'total': '1'})
+            self.assertIndexed('get', '/api/vehicles/', {'filter': vehicle_filter, 'cursor': response.json()['next_cursor']})
+            self.assertIndexed('get', '/api/vehicles/', {'filter': vehicle_filter, **window})
+        self.assertIndexed('get', '/api/vehicles/', {'search': 'camry', 'filter': 'car', 'total': '1', **window})
+        with mock.patch('myapp.search.RANKED_MATCH_LIMIT', 0):
+            self.assertIndexed('get', '/api/vehicles/', {'search': 'mod'})
+
+    def test_dashboard_and_booking(self):
+        self.client.force_login(self.user)
+        self.assertIndexed('get', '/home/')
+        self.assertIndexed('get', f'/api/vehicle/{self.vehicles[0].pk}/booked-dates/')
+        self.assertIndexed('get', '/api/booked-dates/', {
+            'ids': ','.join(str(vehicle.pk) for vehicle in self.vehicles[:6]), 'from': str(date.today()),
+        })
+        self.assertIndexed('post', '/api/rent/', json.dumps({
+            'vehicle_id': self.vehicles[-1].pk, 'start_date': str(self.start),
+            'end_date': str(self.start + timedelta(days=2)), 'pickup_location': 'downtown',
+        }), content_type='application/json')
+        pending = self.reservations[1]
+        self.assertIndexed('get', f'/payment/{pending.pk}/')
+        self.assertIndexed('post', '/process-payment/', {'reservation_id': pending.pk, 'cvv': '000'})
+        self.assertIndexed('post', '/process-payment/', {'reservation_id': pending.pk, 'cvv': '123'})
+        self.assertIndexed('post', '/home/', {'reservation_id': pending.pk, 'action': 'complete'})
+        self.assertIndexed('post', '/profile/add-phone/', {'phone': '5550111', 'countryCode': '+1'})
+
+
+# No metrics or session flush mid-request, so query counts do not depend on timing.
+class QueryBudgetTests(TestCase):
+    """
+    Each endpoint stays within a fixed number of SQL queries and a wall-clock
+    budget on a realistic dataset. The query budgets are today's counts: a new
+    lazy relation access or aggregate fails here first. Wall-clock budgets
+    leave room for slow CI machines and only catch gross regressions.
+    """
+
+    READ_MS = 150
+    WRITE_MS = 300
+    # The dashboard renders all of the user's ~150 reservation cards.
+    DASHBOARD_MS = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_fleet(vehicles=300, users=20, reservations_per_vehicle=10, seed=1)
+        # About 150 reservations, shown on one dashboard.
+        cls.user = User.objects.get(username='loadtest0@example.com')
+        cls.vehicle = Vehicle.objects.order_by('id').first()
+        cls.start = date.today() + timedelta(days=400)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def request(self, method, path, data=None, **extra):
+        catalog_cache.clear()
+        return getattr(self.client, method)(path, data, **extra)
+
+    def assertBudget(self, max_queries, max_ms, method, path, data=None, warm_up=True, **extra):
+        """
+        Requests path and checks its query count and duration. GETs are warmed
+        up first, so template compilation and cold caches are not timed.
+        """
+        if warm_up:
+            self.request(method, path, data, **extra)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.request(method, path, data, **extra)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        self.assertLess(response.status_code, 400, path)
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f"{method.upper()} {path} ran {len(queries)} queries:\n"
+            + '\n'.join(query['sql'] for query in queries.captured_queries),
+        )
+        self.assertLessEqual(elapsed_ms, max_ms, f"{method.upper()} {path} took {elapsed_ms:.0f}ms")
+        return response
+
+    def book(self):
+        response = self.assertBudget(13, self.WRITE_MS, 'post', '/api/rent/', json.dumps({
+            'vehicle_id': self.vehicle.pk, 'start_date': str(self.start),
+            'end_date': str(self.start + timedelta(days=2)), 'pickup_location': 'downtown',
+        }), warm_up=False, content_type='application/json')
+        return resolve(response.json()['redirect_url']).kwargs['reservation_id']
+
+    def test_index(self):
+        self.client.logout()
+        self.assertBudget(0, self.READ_MS, 'get', '/')
+
+    def test_home(self):
+        self.assertBudget(5, self.DASHBOARD_MS, 'get', '/home/')
+
+    def test_vehicle_list(self):
+        for vehicle_filter in ('all', 'car', 'bike', 'electric'):
+            with self.subTest(filter=vehicle_filter):
+                self.assertBudget(1, self.READ_MS, 'get', '/vehicles/', {'filter': vehicle_filter})
+
+    def test_vehicle_api(self):
+        # The catalog version, then the page.
+        for vehicle_filter in ('all', 'car', 'bike', 'electric'):
+            with self.subTest(filter=vehicle_filter):
+                self.assertBudget(2, self.READ_MS, 'get', '/api/vehicles/', {'filter': vehicle_filter})
+        window = {'start': str(self.start), 'end': str(self.start + timedelta(days=3))}
+        self.assertBudget(1, self.READ_MS, 'get', '/api/vehicles/', window)
+        self.assertBudget(4, self.READ_MS, 'get', '/api/vehicles/', {'search': 'tesla'})
+
+    def test_vehicle_api_cached(self):
+        self.client.get('/api/vehicles/')
+        # Only the catalog version is read.
+        with self.assertNumQueries(1):
+            self.client.get('/api/vehicles/')
+
+    def test_booked_dates(self):
+        # Session, user and version lookups, plus the ranges when the index is cold.
+        self.assertBudget(4, self.READ_MS, 'get', f'/api/vehicle/{self.vehicle.pk}/booked-dates/', warm_up=False)
+        self.assertBudget(3, self.READ_MS, 'get', f'/api/vehicle/{self.vehicle.pk}/booked-dates/')
+
+    def test_batch_booked_dates(self):
+        # The same queries as for one vehicle, however many are asked for.
+        ids = ','.join(str(pk) for pk in Vehicle.objects.order_by('id').values_list('id', flat=True)[:6])
+        self.assertBudget(4, self.READ_MS, 'get', '/api/booked-dates/', {'ids': ids}, warm_up=False)
+        self.assertBudget(3, self.READ_MS, 'get', '/api/booked-dates/', {'ids': ids})
+
+    def test_quotes(self):
+        # The whole fleet's prices are read once, then quoted from memory
+        # as long as the catalog version stays the same.
+        window = {'start': str(self.start), 'end': str(self.start + timedelta(days=10))}
+        quote_engine.clear()
+        self.assertBudget(2, self.READ_MS, 'get', '/api/quotes/', window, warm_up=False)
+        self.assertBudget(1, self.READ_MS, 'get', '/api/quotes/', window)
+
+    def test_rent_and_payment_page(self):
+        reservation_id = self.book()
+        self.assertBudget(4, self.READ_MS, 'get', f'/payment/{reservation_id}/')
+
+    def test_process_payment(self):
+        reservation_id = self.book()
+        self.assertBudget(10, self.WRITE_MS, 'post', '/process-payment/',
+                          {'reservation_id': reservation_id, 'cvv': '000'}, warm_up=False)
+        self.assertBudget(14, self.WRITE_MS, 'post', '/process-payment/',
+                          {'reservation_id': reservation_id, 'cvv': '123'}, warm_up=False)
@@ -22,7 +22,20 @@ urlpatterns = [
     # API endpoints for frontend JavaScript
     path('api/vehicles/', views.vehicle_data_view, name='vehicle_data'),
     path('api/vehicle/<int:vehicle_id>/booked-dates/', views.get_booked_dates_view, name='get_booked_dates'),
+    path('api/booked-dates/', views.batch_booked_dates_view, name='batch_booked_dates'),
+    path('api/availability/stream/', views.availability_stream_view, name='availability_stream'),
+    path('api/quotes/', views.quotes_view, name='quotes'),
     path('api/rent/', views.rent_vehicle_view, name='rent_vehicle'),
     path('payment/<int:reservation_id>/', views.payment_page, name='payment_page'),
     path('process-payment/', views.process_payment, name='process_payment'),
+
+    # Prometheus scrape target (staff, METRICS_TOKEN or METRICS_ALLOWED_IPS only)
+    path('metrics', views.metrics_view, name='metrics'),
+
+    # Request profiles captured by ProfilingMiddleware (staff only)
+    path('staff/profiles/', views.profile_list_view, name='profile_list'),
+    path('staff/profiles/<str:name>', views.profile_download_view, name='profile_download'),
+
+    # Fleet utilization analytics (staff only)
+    path('staff/utilization/', views.utilization_view, name='utilization'),
 ]
@@ -0,0 +1,374 @@
+"""
+Fleet utilization: which vehicle was out on which day, kept as a vehicle x
+day matrix on disk, and the analytics of the staff utilization page.
+
+The matrix lives in UTILIZATION_DIR as NumPy arrays that are memory-mapped,
+so a large fleet's history is paged in as it is read rather than loaded
+whole:
+
+- booked.npy (uint8, vehicle rows x days): 0 on a free day, else 1 + the
+  index in state.json's locations of the pickup location of the active or
+  completed reservation that had the vehicle out that day;
+- revenue.npy (float32, same shape): each of those reservations'
+  total_cost, spread evenly over its days;
+- placed.npy (int32, by reservation id): the row each of those
+  reservations is written to, or -1;
+- state.json: the first day, the vehicle id of each row, the locations and
+  when the last update started.
+
+update() brings the matrix up to date from the reservations changed since
+its last run (Reservation.updated_at): the rows of their vehicles are
+rewritten, along with the rows they were written to before. Deleted
+reservations are noticed by their count. The first run, or full=True, builds
+everything. The arrays grow as later days and new vehicles come in; days
+before the first day of the first run are left out.
+"""
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+from numpy.lib.format import open_memmap
+
+from .models import Reservation, Vehicle
+
+# Reservations that take a vehicle out of the fleet for their days.
+COUNTED_STATUSES = ('active', 'completed')
+
+# Room added when the matrix has to grow, so that it is not copied every run.
+GROW_DAYS = 366
+GROW_VEHICLES = 1024
+
+# booked.npy holds a location per cell in a byte; locations past this many
+# are all counted under the last one.
+MAX_LOCATIONS = 255
+
+# Changes are read from this long before the last run started, for the
+# transactions that were still open then.
+CHANGE_OVERLAP = timedelta(minutes=5)
+
+# Vehicle rows rewritten or reported on, and reservations written, at a
+# time, to bound memory use.
+CHUNK_VEHICLES = 4096
+PAINT_BATCH = 100000
+
+GROUPINGS = ('vehicle', 'type', 'location')
+
+
+def utilization_dir():
+    return Path(getattr(settings, 'UTILIZATION_DIR', Path(settings.BASE_DIR) / 'utilization'))
+
+
+@contextmanager
+def _locked(directory):
+    """Serializes updates of one matrix, e.g. overlapping update_utilization runs."""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / 'update.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _grown(path, array, shape, fill):
+    """array copied into a new file of the larger shape, which replaces path."""
+    temporary = path.with_suffix('.tmp.npy')
+    grown = open_memmap(temporary, mode='w+', dtype=array.dtype, shape=shape)
+    grown[...] = fill
+    grown[tuple(slice(0, size) for size in array.shape)] = array
+    grown.flush()
+    del grown
+    os.replace(temporary, path)
+    return open_memmap(path, mode='r+')
+
+
+class UtilizationMatrix:
+    """The arrays and state of one UTILIZATION_DIR."""
+
+    def __init__(self, directory, state, mode='r'):
+        self.directory = directory
+        self.origin = date.fromisoformat(state['origin'])
+        self.vehicle_ids = state['vehicle_ids']
+        self.rows = {vehicle_id: row for row, vehicle_id in enumerate(self.vehicle_ids)}
+        self.locations = state['locations']
+        self.codes = {location: code for code, location in enumerate(self.locations, 1)}
+        self.last_run = datetime.fromisoformat(state['last_run']) if state.get('last_run') else None
+        self.booked = open_memmap(directory / 'booked.npy', mode=mode)
+        self.revenue = open_memmap(directory / 'revenue.npy', mode=mode)
+        self.placed = open_memmap(directory / 'placed.npy', mode=mode)
+
+    @classmethod
+    def open(cls, directory=None, mode='r'):
+        """The matrix in directory, or None if none has been built there."""
+        directory = Path(directory or utilization_dir())
+        try:
+            state = json.loads((directory / 'state.json').read_text())
+        except FileNotFoundError:
+            return None
+        return cls(directory, state, mode)
+
+    @classmethod
+    def create(cls, directory, origin, days):
+        """An empty matrix from origin, with room for days days."""
+        directory.mkdir(parents=True, exist_ok=True)
+        open_memmap(directory / 'booked.npy', mode='w+', dtype=np.uint8, shape=(GROW_VEHICLES, days)).flush()
+        open_memmap(directory / 'revenue.npy', mode='w+', dtype=np.float32, shape=(GROW_VEHICLES, days)).flush()
+        placed = open_memmap(directory / 'placed.npy', mode='w+', dtype=np.int32, shape=(GROW_VEHICLES,))
+        placed[:] = -1
+        placed.flush()
+        state = {'origin': origin.isoformat(), 'vehicle_ids': [], 'locations': [], 'last_run': None}
+        return cls(directory, state, mode='r+')
+
+    @property
+    def days(self):
+        return self.booked.shape[1]
+
+    def save(self, last_run):
+        """Flushes the arrays, then records the state as of last_run."""
+        for array in (self.booked, self.revenue, self.placed):
+            array.flush()
+        self.last_run = last_run
+        temporary = self.directory / 'state.json.tmp'
+        temporary.write_text(json.dumps({
+            'origin': self.origin.isoformat(),
+            'vehicle_ids': self.vehicle_ids,
+            'locations': self.locations,
+            'last_run': last_run.isoformat(),
+        }))
+        os.replace(temporary, self.directory / 'state.json')
+
+    def _row(self, vehicle_id):
+        row = self.rows.get(vehicle_id)
+        if row is None:
+            row = self.rows[vehicle_id] = len(self.vehicle_ids)
+            self.vehicle_ids.append(vehicle_id)
+            if row >= self.booked.shape[0]:
+                shape = (row + GROW_VEHICLES, self.days)
+                self.booked = _grown(self.directory / 'booked.npy', self.booked, shape, 0)
+                self.revenue = _grown(self.directory / 'revenue.npy', self.revenue, shape, 0)
+        return row
+
+    def _code(self, location):
+        code = self.codes.get(location)
+        if code is None:
+            if len(self.locations) == MAX_LOCATIONS:
+                return MAX_LOCATIONS
+            self.locations.append(location)
+            code = self.codes[location] = len(self.locations)
+        return code
+
+    def _ensure(self, days, reservation_id):
+        if days > self.days:
+            shape = (self.booked.shape[0], days + GROW_DAYS)
+            self.booked = _grown(self.directory / 'booked.npy', self.booked, shape, 0)
+            self.revenue = _grown(self.directory / 'revenue.npy', self.revenue, shape, 0)
+        if reservation_id >= len(self.placed):
+            self.placed = _grown(self.directory / 'placed.npy', self.placed, (reservation_id * 2 + 1,), -1)
+
+    def paint(self, reservations):
+        """Writes (id, vehicle id, start, end, pickup location, total cost) rows into the matrix."""
+        reservations = iter(reservations)
+        while batch := list(islice(reservations, PAINT_BATCH)):
+            self._paint(batch)
+
+    def _paint(self, batch):
+        ids, rows, firsts, lasts, codes, per_day = [], [], [], [], [], []
+        for reservation_id, vehicle_id, start_date, end_date, location, total_cost in batch:
+            first, last = (start_date - self.origin).days, (end_date - self.origin).days
+            if last <= first:
+                continue
+            ids.append(reservation_id)
+            rows.append(self._row(vehicle_id))
+            firsts.append(first)
+            lasts.append(last)
+            codes.append(self._code(location))
+            per_day.append(float(total_cost) / (last - first))
+        if not ids:
+            return
+        firsts, lasts = np.array(firsts, dtype=np.int64), np.array(lasts, dtype=np.int64)
+        self._ensure(int(lasts.max()), max(ids))
+        # One (row, day) cell per day of every reservation.
+        # Days before the origin are left out, all of them for reservations
+        # that end by it: those are placed but paint nothing.
+        starts = np.maximum(firsts, 0)
+        lengths = np.maximum(lasts - starts, 0)
+        cell_rows = np.repeat(np.array(rows, dtype=np.int64), lengths)
+        cell_days = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        self.booked[cell_rows, cell_days] = np.repeat(np.array(codes, dtype=np.uint8), lengths)
+        np.add.at(self.revenue, (cell_rows, cell_days), np.repeat(np.array(per_day, dtype=np.float32), lengths))
+        self.placed[np.array(ids, dtype=np.int64)] = rows
+
+    def rewrite(self, vehicle_ids):
+        """Rewrites the rows of vehicle_ids from their counted reservations."""
+        vehicle_ids = sorted(vehicle_ids)
+        for offset in range(0, len(vehicle_ids), CHUNK_VEHICLES):
+            chunk = vehicle_ids[offset:offset + CHUNK_VEHICLES]
+            rows = np.array([self.rows[vehicle_id] for vehicle_id in chunk if vehicle_id in self.rows], dtype=np.int64)
+            if len(rows):
+                self.booked[rows] = 0
+                self.revenue[rows] = 0
+                self.placed[np.isin(self.placed, rows)] = -1
+            self.paint(Reservation.objects.filter(
+                vehicle_id__in=chunk, status__in=COUNTED_STATUSES,
+            ).values_list('id', 'vehicle_id', 'start_date', 'end_date', 'pickup_location', 'total_cost'))
+        return len(vehicle_ids)
+
+    def vehicles_at(self, rows):
+        return {self.vehicle_ids[row] for row in rows.tolist() if row >= 0}
+
+
+def build(directory):
+    """Builds the matrix in directory from scratch. Returns it, unsaved."""
+    counted = Reservation.objects.filter(status__in=COUNTED_STATUSES)
+    span = counted.aggregate(first=Min('start_date'), last=Max('end_date'))
+    origin = span['first'] or date.today()
+    matrix = UtilizationMatrix.create(directory, origin, ((span['last'] or origin) - origin).days + GROW_DAYS)
+    for vehicle_id in Vehicle.objects.order_by('id').values_list('id', flat=True):
+        matrix._row(vehicle_id)
+    matrix.paint(counted.order_by('vehicle_id', 'start_date').values_list(
+        'id', 'vehicle_id', 'start_date', 'end_date', 'pickup_location', 'total_cost',
+    ).iterator(chunk_size=10000))
+    return matrix
+
+
+def update(full=False, directory=None):
+    """
+    Brings the matrix up to date, incrementally unless full is set or none
+    has been built yet. Returns (matrix, vehicle rows rewritten, or None
+    after a full build).
+    """
+    directory = Path(directory or utilization_dir())
+    with _locked(directory):
+        started = timezone.now()
+        matrix = None if full else UtilizationMatrix.open(directory, mode='r+')
+        if matrix is None:
+            matrix = build(directory)
+            matrix.save(started)
+            return matrix, None
+
+        changed = list(Reservation.objects.filter(
+            updated_at__gte=matrix.last_run - CHANGE_OVERLAP,
+        ).values_list('id', 'vehicle_id'))
+        vehicle_ids = {vehicle_id for _, vehicle_id in changed}
+        # The rows they were written to, should they have moved to another vehicle.
+        reservation_ids = np.array([reservation_id for reservation_id, _ in changed], dtype=np.int64)
+        vehicle_ids |= matrix.vehicles_at(matrix.placed[reservation_ids[reservation_ids < len(matrix.placed)]])
+        rewritten = matrix.rewrite(vehicle_ids)
+
+        # Deleted reservations leave no updated_at behind, only a count that is short.
+        counted = Reservation.objects.filter(status__in=COUNTED_STATUSES)
+        if np.count_nonzero(matrix.placed >= 0) != counted.count():
+            placed_ids = np.flatnonzero(matrix.placed >= 0)
+            deleted = np.setdiff1d(placed_ids, np.fromiter(counted.values_list('id', flat=True), dtype=np.int64))
+            rewritten += matrix.rewrite(matrix.vehicles_at(matrix.placed[deleted]))
+
+        # New vehicles without reservations yet still count as available.
+        for vehicle_id in Vehicle.objects.filter(id__gt=max(matrix.vehicle_ids, default=0)).values_list('id', flat=True):
+            matrix._row(vehicle_id)
+        matrix.save(started)
+        return matrix, rewritten
+
+
+def idle_streaks(free):
+    """The longest run of True in each row of a 2-D boolean array."""
+    rows, days = free.shape
+    padded = np.zeros((rows, days + 2), dtype=np.int8)
+    padded[:, 1:-1] = free
+    edges = np.diff(padded, axis=1)
+    # nonzero() goes row by row, so the n-th run start and end pair up.
+    start_rows, start_days = np.nonzero(edges == 1)
+    _, end_days = np.nonzero(edges == -1)
+    longest = np.zeros(rows, dtype=np.int64)
+    np.maximum.at(longest, start_rows, end_days - start_days)
+    return longest
+
+
+def report(matrix, start_date, end_date, by='vehicle'):
+    """
+    Utilization of the fleet over [start_date, end_date), one dict per
+    vehicle, vehicle type or pickup location:
+
+    - utilization: share of the available vehicle-days that were booked;
+    - revenue_per_available_day: revenue over available vehicle-days;
+    - longest_idle: the longest run of free days (for types, the mean of
+      their vehicles' longest runs).
+
+    Every existing vehicle is available every day. Any vehicle can be picked
+    up anywhere, so each location's figures are over the whole fleet's
+    available days, and the locations add up to the fleet. Locations with
+    no bookings in the period are left out.
+    """
+    if by not in GROUPINGS:
+        raise ValueError(f"by must be one of {', '.join(GROUPINGS)}.")
+    if end_date <= start_date:
+        raise ValueError("The period must end after it starts.")
+    vehicles = {vehicle_id: (name, vehicle_type) for vehicle_id, name, vehicle_type in Vehicle.objects.values_list('id', 'name', 'type')}
+    rows = np.array([row for row, vehicle_id in enumerate(matrix.vehicle_ids) if vehicle_id in vehicles], dtype=np.int64)
+    days = (end_date - start_date).days
+    # Days outside the matrix have no bookings: they count as free.
+    first = min(max((start_date - matrix.origin).days, 0), matrix.days)
+    last = min(max((end_date - matrix.origin).days, 0), matrix.days)
+
+    booked_days = np.zeros(len(rows), dtype=np.int64)
+    revenue = np.zeros(len(rows))
+    longest = np.full(len(rows), days, dtype=np.int64)
+    location_days = np.zeros(MAX_LOCATIONS + 1, dtype=np.int64)
+    location_revenue = np.zeros(MAX_LOCATIONS + 1)
+    for offset in range(0, len(rows), CHUNK_VEHICLES):
+        chunk = slice(offset, offset + CHUNK_VEHICLES)
+        booked = matrix.booked[rows[chunk], first:last]
+        earned = matrix.revenue[rows[chunk], first:last].astype(np.float64)
+        booked_days[chunk] = np.count_nonzero(booked, axis=1)
+        revenue[chunk] = earned.sum(axis=1)
+        free = np.ones((len(booked), days), dtype=bool)
+        before = (matrix.origin + timedelta(days=first) - start_date).days
+        free[:, before:before + (last - first)] = booked == 0
+        longest[chunk] = idle_streaks(free)
+        location_days += np.bincount(booked.ravel(), minlength=MAX_LOCATIONS + 1)
+        location_revenue += np.bincount(booked.ravel(), weights=earned.ravel(), minlength=MAX_LOCATIONS + 1)
+
+    def figures(key, vehicle_count, booked, earned, available, **extra):
+        return {
+            'key': key,
+            'vehicles': vehicle_count,
+            'available_days': available,
+            'booked_days': int(booked),
+            'utilization': booked / available if available else 0.0,
+            'revenue': round(float(earned), 2),
+            'revenue_per_available_day': round(float(earned) / available, 2) if available else 0.0,
+            **extra,
+        }
+
+    if by == 'location':
+        available = len(rows) * days
+        return [
+            figures(location, len(rows), location_days[code], location_revenue[code], available)
+            for code, location in enumerate(matrix.locations, 1)
+            if location_days[code]
+        ]
+
+    ids = [matrix.vehicle_ids[row] for row in rows.tolist()]
+    if by == 'vehicle':
+        return [
+            figures(vehicles[vehicle_id][0], 1, booked_days[i], revenue[i], days,
+                    id=vehicle_id, type=vehicles[vehicle_id][1], longest_idle=int(longest[i]))
+            for i, vehicle_id in enumerate(ids)
+        ]
+    types = np.array([vehicles[vehicle_id][1] for vehicle_id in ids], dtype=object)
+    results = []
+    for vehicle_type in sorted(set(types.tolist())):
+        members = types == vehicle_type
+        count = int(np.count_nonzero(members))
+        results.append(figures(
+            vehicle_type, count, booked_days[members].sum(), revenue[members].sum(), count * days,
+            longest_idle=round(float(longest[members].mean()), 1),
+        ))
+    return results
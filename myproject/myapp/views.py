@@ -1,24 +1,48 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages 
 from django.contrib.auth.models import User
 from .models import Reservation, Vehicle, UserProfile
+from .availability import booked_vehicle_ids, parse_vehicle_ids, parse_window
+from .booked_dates import encode, parse_format, parse_horizon
+from . import live, metrics
+from .booking_index import booking_index
+from .catalog import CATALOG_VALUES, catalog_json
+from .catalog_cache import aget_catalog_version, catalog_cache, catalog_etag
+from .pagination import InvalidCursor, aapproximate_total, keyset_page
+from .profiling import list_profiles, profile_path
+from .quotes import quote_engine, quote_vehicle
+from .rental_stats import stats_for
+from .search import asearch_page, filter_matching
+from . import utilization
+import hmac
 import json
+from asgiref.sync import sync_to_async
 from django.urls import reverse
 from django.conf import settings
-from datetime import date, datetime
-from django.db.models import Sum, Count, Value, DecimalField
-from django.db.models.functions import Coalesce
+from datetime import date, datetime, timedelta
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.template.loader import render_to_string
 from django.contrib.sites.shortcuts import get_current_site
-from django.http import JsonResponse, HttpResponse
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.db import IntegrityError, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
 
 
+def users_by_username(username):
+    """
+    Users whose username equals username, ignoring case. Unlike username__iexact,
+    which SQLite runs as a LIKE, this can use the LOWER(username) index.
+    """
+    return User.objects.alias(username_lower=Lower('username')).filter(username_lower=Lower(Value(username)))
+
 def index_view(request):
     """
     Renders the main landing/login page.
@@ -48,7 +72,7 @@ def register_view(request):
             return redirect('index')
         
         # Check if user already exists using a case-insensitive lookup.
-        if User.objects.filter(username__iexact=email).exists():
+        if users_by_username(email).exists():
             messages.error(request, 'An account with this email already exists.')
             return redirect('index')
 
@@ -107,7 +131,7 @@ def login_view(request):
 
             # First, find the user with a case-insensitive lookup on the email/username.
             try:
-                user_obj = User.objects.get(username__iexact=email)
+                user_obj = users_by_username(email).get()
             except User.DoesNotExist:
                 user_obj = None
 
@@ -160,34 +184,16 @@ def home_view(request):
 
     # --- Handle GET request ---
 
-    # 1. Automatically update status of any rentals whose end date has passed.
-    # This is more efficient than looping in Python.
-    Reservation.objects.filter(user=request.user, status='active', end_date__lt=date.today()).update(status='completed')
-
-    # 2. Fetch all reservations for the logged-in user
-    user_reservations = Reservation.objects.filter(user=request.user).order_by('-start_date')
+    # This path is read-only. Expired rentals are completed, and abandoned
+    # unpaid ones cancelled, by the sweep_reservations command.
 
-    # 3. --- Rental Statistics Calculation ---
-    total_rentals = user_reservations.count()
-    active_rentals = user_reservations.filter(status='active').count()
-    pending_rentals = user_reservations.filter(status__in=['pending_payment', 'payment_failed']).count()
+    # 1. Fetch all reservations for the logged-in user, with their vehicles
+    # in the same query since every card shows the vehicle.
+    user_reservations = Reservation.objects.filter(user=request.user).select_related('vehicle').order_by('-start_date')
 
-    # Calculate total spent on completed rentals, defaulting to 0 if none.
-    total_spent = user_reservations.filter(status='completed').aggregate(
-        total=Coalesce(Sum('total_cost'), Value(0, output_field=DecimalField()))
-    )['total']
-
-    # Determine favorite vehicle type
-    type_counts = user_reservations.values('vehicle__type').annotate(
-        count=Count('vehicle__type')
-    ).order_by('-count')
-
-    # Safely get the favorite type
-    first_type = type_counts.first()
-    if first_type and first_type['vehicle__type']:
-        favorite_type = first_type['vehicle__type'].capitalize()
-    else:
-        favorite_type = 'N/A'
+    # 2. --- Rental Statistics ---
+    # Maintained incrementally on every reservation change; one row lookup.
+    stats = stats_for(request.user)
 
     # Fetch user profile to display phone number
     user_profile = None
@@ -198,24 +204,25 @@ def home_view(request):
 
     context = {
         'reservations': user_reservations,
-        'total_rentals': total_rentals,
-        'active_rentals': active_rentals,
-        'pending_rentals': pending_rentals,
-        'total_spent': total_spent,
-        'favorite_type': favorite_type,
+        'total_rentals': stats.total_rentals,
+        'active_rentals': stats.active_rentals,
+        'pending_rentals': stats.pending_rentals,
+        'total_spent': stats.total_spent,
+        'favorite_type': stats.favorite_type,
         'user_profile': user_profile,
+        'live_availability': getattr(settings, 'LIVE_AVAILABILITY', False),
     }
     return render(request, 'home.html', context)
 
 def vehicle_list(request):
     """
-    Renders a standalone page listing vehicles, with support for filtering.
+    Renders a standalone page listing vehicles, with support for filtering
+    and cursor pagination.
     """
     # Get the filter from the query parameter, default to 'all'
     vehicle_filter = request.GET.get('filter', 'all')
 
-    # Start with all vehicles, ordered by name
-    vehicles = Vehicle.objects.all().order_by('name')
+    vehicles = Vehicle.objects.all()
 
     # Apply the filter based on the query parameter
     if vehicle_filter == 'car':
@@ -225,8 +232,15 @@ def vehicle_list(request):
     elif vehicle_filter == 'electric':
         vehicles = vehicles.filter(fuel_type='electric')
 
+    # Page through the fleet by (name, id) instead of rendering the whole table.
+    try:
+        page_obj = keyset_page(vehicles, request.GET.get('cursor'), 24)
+    except InvalidCursor:
+        page_obj = keyset_page(vehicles, None, 24)
+
     context = {
-        'vehicles': vehicles,
+        'vehicles': page_obj.object_list,
+        'page_obj': page_obj,
         'active_filter': vehicle_filter,  # To highlight the active filter button
     }
     return render(request, 'vehicles.html', context)
@@ -242,18 +256,38 @@ def terms_view(request):
 def policy_view(request):
     return render(request, 'policy.html')
 
-def vehicle_data_view(request):
+async def vehicle_data_view(request):
     """
     Provides vehicle data as JSON to be used by the frontend JavaScript.
-    Now supports filtering, searching, and pagination.
+    Now supports filtering, searching, cursor pagination and an optional
+    start/end availability window. Async, so a worker can serve other
+    requests while this one waits on the database.
     """
-    # Get filter, search, and page from query parameters
+    # Get filter, search, and cursor from query parameters
     vehicle_type_filter = request.GET.get('filter', 'all')
     search_query = request.GET.get('search', '')
-    page_number = request.GET.get('page', 1)
-
-    # Start with all vehicles, ordered for consistent pagination
-    vehicle_list = Vehicle.objects.all().order_by('name')
+    cursor = request.GET.get('cursor')
+    start_str = request.GET.get('start')
+    end_str = request.GET.get('end')
+
+    # Catalog pages only change when a Vehicle does, so they are cached under
+    # the global catalog version and revalidated with a strong ETag, both
+    # for the cost of one primary-key lookup. Window searches also depend on
+    # reservations and are always built fresh.
+    cache_key = None
+    if not (start_str or end_str):
+        cache_key = (vehicle_type_filter, search_query, cursor or '', bool(request.GET.get('total')))
+        version = await aget_catalog_version()
+        etag = catalog_etag(version, cache_key)
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            return HttpResponseNotModified(headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+        body = catalog_cache.get((version, cache_key))
+        if body is not None:
+            return HttpResponse(body, content_type='application/json',
+                                headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+    vehicle_list = Vehicle.objects.all()
 
     # Apply filters from the request
     if vehicle_type_filter == 'car':
@@ -263,77 +297,180 @@ def vehicle_data_view(request):
     elif vehicle_type_filter == 'electric':
         vehicle_list = vehicle_list.filter(fuel_type='electric')
 
-    # Apply search query if it exists
-    if search_query:
-        vehicle_list = vehicle_list.filter(name__icontains=search_query)
-
-    # Set up pagination with 6 vehicles per page
-    paginator = Paginator(vehicle_list, 6)
+    # Only keep vehicles with no active booking in the requested window.
+    # The occupancy bitmaps answer this without scanning reservations.
+    if start_str or end_str:
+        try:
+            start_date, end_date = parse_window(start_str or '', end_str or '')
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        vehicle_list = vehicle_list.exclude(id__in=booked_vehicle_ids(start_date, end_date))
+
+    # Keyset pagination, 6 vehicles per page: on (name, id), or on (rank, id)
+    # through the FTS5 index when searching. No COUNT(*) or OFFSET, so deep
+    # pages cost the same as the first.
     try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        # If page is not an integer, deliver first page.
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        # If page is out of range, deliver last page of results.
-        page_obj = paginator.page(paginator.num_pages)
-
-    # Serialize the vehicle data for the current page
-    vehicles_on_page = []
-    for v in page_obj.object_list:
-        # Build a dynamic list of features based on vehicle type
-        features = []
-        if v.type == 'car':
-            features.append(f"{v.get_transmission_display()}")
-            features.append(f"{v.seats} Seats")
-        features.append(f"Fuel: {v.get_fuel_type_display()}")
-
-        vehicle_data = {
-            'id': v.id,
-            'name': v.name,
-            'type': v.type,
-            'price': float(v.price_per_day),
-            'priceUnit': 'day',
-            'image': v.image_url or '/static/images/default.png', # Provide a default
-            'features': features
-        }
-        # Add 'tags' if the vehicle is electric so the filter works
-        if v.fuel_type == 'electric':
-            vehicle_data['tags'] = ['electric']
-        vehicles_on_page.append(vehicle_data)
+        page_obj = await asearch_page(vehicle_list, search_query, cursor, 6, CATALOG_VALUES)
+    except InvalidCursor as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    # Serialize the vehicle data for the current page, straight from the
+    # values_list rows (see catalog.py).
+    vehicles_on_page = catalog_json(page_obj.object_list)
 
     # Return a structured response with pagination info
-    return JsonResponse({
+    response_data = {
         'vehicles': vehicles_on_page,
-        'has_next': page_obj.has_next(),
-        'has_previous': page_obj.has_previous(),
-        'current_page': page_obj.number,
-        'total_pages': paginator.num_pages,
+        'has_next': page_obj.has_next,
+        'has_previous': page_obj.has_previous,
+        'next_cursor': page_obj.next_cursor,
+        'previous_cursor': page_obj.previous_cursor,
+    }
+    # The total is only counted on request, and then at most every few minutes.
+    if request.GET.get('total'):
+        response_data['approx_total'] = await aapproximate_total(
+            filter_matching(vehicle_list, search_query),
+            vehicle_type_filter, search_query, start_str, end_str,
+        )
+    response = JsonResponse(response_data)
+    if cache_key is not None:
+        catalog_cache.set((version, cache_key), response.content)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+    return response
+
+@login_required
+async def get_booked_dates_view(request, vehicle_id):
+    """
+    Returns the booked date ranges of a specific vehicle in a format that
+    flatpickr can understand, merged and clipped to the from/to horizon,
+    or in one of the compact formats of booked_dates.py.
+    """
+    try:
+        start_date, end_date = parse_horizon(request.GET.get('from'), request.GET.get('to'))
+        fmt = parse_format(request.GET.get('format'))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    # A primary-key lookup for the version; the ranges themselves come from
+    # the in-process booking index and only hit the database when stale.
+    version = await Vehicle.objects.filter(id=vehicle_id).values_list('availability_version', flat=True).afirst()
+    if version is None:
+        return JsonResponse({'error': 'Vehicle not found'}, status=404)
+
+    # We only care about reservations that are currently 'active'
+    entry = await booking_index.aget(vehicle_id, version)
+    return JsonResponse(encode(entry.coalesced(start_date, end_date), fmt, start_date), safe=False)
+
+@login_required
+async def batch_booked_dates_view(request):
+    """
+    Booked date ranges of several vehicles at once, for prefetching the
+    calendars of a whole catalog page: ?ids=1,2,3, with the from, to and
+    format parameters of get_booked_dates_view. Returns {vehicle id: booked
+    dates}, leaving out ids that do not exist.
+    """
+    try:
+        vehicle_ids = parse_vehicle_ids(request.GET.get('ids', ''))
+        start_date, end_date = parse_horizon(request.GET.get('from'), request.GET.get('to'))
+        fmt = parse_format(request.GET.get('format'))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    # One query for all the versions, and at most one more for the ranges of
+    # whichever vehicles the booking index holds no current entry for.
+    versions = {
+        vehicle_id: version
+        async for vehicle_id, version in Vehicle.objects.filter(id__in=vehicle_ids).values_list('id', 'availability_version')
+    }
+    entries = await booking_index.aget_many(versions)
+    booked_dates = {
+        str(vehicle_id): encode(entries[vehicle_id].coalesced(start_date, end_date), fmt, start_date)
+        for vehicle_id in vehicle_ids
+        if vehicle_id in entries
+    }
+    return JsonResponse(booked_dates)
+
+async def quotes_view(request):
+    """
+    What renting each vehicle from start to end would cost: ?start=&end=,
+    optionally with ids=1,2,3 to quote only those vehicles. Returns the ids
+    and, in the same order, their totals.
+    """
+    try:
+        start_date, end_date = parse_window(request.GET.get('start', ''), request.GET.get('end', ''))
+        vehicle_ids = parse_vehicle_ids(request.GET['ids']) if request.GET.get('ids') else None
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    ids, totals = await quote_engine.aquote(start_date, end_date, vehicle_ids)
+    return JsonResponse({
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'days': (end_date - start_date).days,
+        'ids': ids.tolist(),
+        'totals': (totals / 100).tolist(),
     })
 
 @login_required
-def get_booked_dates_view(request, vehicle_id):
+async def availability_stream_view(request):
     """
-    Returns a list of booked date ranges for a specific vehicle
-    in a format that flatpickr can understand.
+    Server-Sent Events stream of changes to vehicles' booked dates, for
+    updating open calendars (see live.py). Only served over ASGI with
+    LIVE_AVAILABILITY on: a WSGI worker would buffer the endless stream on a
+    thread of its own. Otherwise answers 204, which stops EventSource from
+    reconnecting.
     """
+    if not getattr(settings, 'LIVE_AVAILABILITY', False) or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
     try:
-        # We only care about reservations that are currently 'active'
-        reservations = Reservation.objects.filter(
-            vehicle_id=vehicle_id,
-            status='active'
+        last_event_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_event_id = None
+    response = StreamingHttpResponse(live.stream(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+def book_vehicle(user, vehicle_id, start_date, end_date, pickup_location):
+    """
+    Creates a 'pending_payment' reservation of the vehicle for the dates, or
+    returns None if an active reservation already overlaps them. Raises
+    Vehicle.DoesNotExist for an unknown vehicle.
+
+    Synchronous: the check and the insert must share one transaction, which
+    the async ORM cannot open.
+    """
+    # The check and the insert run in one IMMEDIATE transaction (see DATABASES),
+    # which holds SQLite's write lock, so concurrent requests for the same
+    # vehicle are serialized and cannot both pass the conflict check.
+    with transaction.atomic():
+        vehicle = Vehicle.objects.get(id=vehicle_id)
+
+        # --- Check for booking conflicts ---
+        # A vehicle is unavailable if another active reservation overlaps with the requested dates.
+        # Overlap exists if: existing_start_date < new_end_date AND existing_end_date > new_start_date
+        # The in-process index answers this from memory while vehicle.availability_version matches.
+        if booking_index.has_conflict(vehicle, start_date, end_date):
+            return None
+
+        # Server-side cost calculation for security, by the rules of the
+        # quotes shown beforehand (see quotes.py).
+        total_cost = quote_vehicle(vehicle, start_date, end_date)
+
+        # Create the reservation with a 'pending_payment' status
+        return Reservation.objects.create(
+            user=user,
+            vehicle=vehicle,
+            start_date=start_date,
+            end_date=end_date,
+            pickup_location=pickup_location.capitalize(),
+            total_cost=total_cost,
+            status='pending_payment'  # Explicitly set status
         )
-        
-        booked_dates = [
-            {"from": res.start_date.strftime('%Y-%m-%d'), "to": res.end_date.strftime('%Y-%m-%d')}
-            for res in reservations
-        ]
-        return JsonResponse(booked_dates, safe=False)
-    except Vehicle.DoesNotExist:
-        return JsonResponse({'error': 'Vehicle not found'}, status=404)
 
 @login_required
-def rent_vehicle_view(request):
+async def rent_vehicle_view(request):
     """
     Handles the creation of a new reservation via a POST request from the frontend.
     The reservation is created with a 'pending_payment' status.
@@ -349,41 +486,22 @@ def rent_vehicle_view(request):
             if not all([vehicle_id, start_date_str, end_date_str, pickup_location]):
                 return JsonResponse({'status': 'error', 'message': 'Missing required fields.'}, status=400)
 
-            vehicle = Vehicle.objects.get(id=vehicle_id)
             start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
 
             if start_date < date.today() or end_date <= start_date:
                 return JsonResponse({'status': 'error', 'message': 'Invalid date range.'}, status=400)
 
-            # --- Check for booking conflicts ---
-            # A vehicle is unavailable if another active reservation overlaps with the requested dates.
-            # Overlap exists if: existing_start_date < new_end_date AND existing_end_date > new_start_date
-            conflicting_reservations = Reservation.objects.filter(
-                vehicle=vehicle,
-                status='active',
-                start_date__lt=end_date,
-                end_date__gt=start_date
-            ).exists()
-
-            if conflicting_reservations:
+            metrics.bookings_attempted.inc()
+
+            user = await request.auser()
+            new_reservation = await sync_to_async(book_vehicle)(user, vehicle_id, start_date, end_date, pickup_location)
+            if new_reservation is None:
+                metrics.booking_conflicts.inc()
                 return JsonResponse({'status': 'error', 'message': 'This vehicle is already booked for some of the selected dates. Please choose different dates.'}, status=409) # 409 Conflict
 
-            # Server-side cost calculation for security
-            duration = (end_date - start_date).days
-            total_cost = vehicle.price_per_day * duration
-
-            # Create the reservation with a 'pending_payment' status
-            new_reservation = Reservation.objects.create(
-                user=request.user,
-                vehicle=vehicle,
-                start_date=start_date,
-                end_date=end_date,
-                pickup_location=pickup_location.capitalize(),
-                total_cost=total_cost,
-                status='pending_payment'  # Explicitly set status
-            )
-            
+            metrics.bookings_created.inc()
+
             # Instead of a generic success message, return a URL to the payment page
             payment_url = reverse('payment_page', args=[new_reservation.id])
             return JsonResponse({
@@ -424,15 +542,34 @@ def process_payment(request):
 
     reservation_id = request.POST.get('reservation_id')
     cvv = request.POST.get('cvv')
-    reservation = get_object_or_404(Reservation, id=reservation_id, user=request.user)
+    # The vehicle is shown on success, and its type spares the rollups a lookup.
+    reservation = get_object_or_404(Reservation.objects.select_related('vehicle'), id=reservation_id, user=request.user)
+
+    # Same rule as payment_page: e.g. a reservation cancelled by the sweeper
+    # for being left unpaid cannot be activated any more.
+    if reservation.status not in Reservation.PENDING_STATUSES:
+        messages.warning(request, "This reservation cannot be paid for at this time.")
+        return redirect('home')
 
     # --- Dummy Payment Condition ---
     # For this demo, a CVV of "123" will succeed, anything else will fail.
     if cvv == "123":
         # PAYMENT SUCCESS
         reservation.status = 'active'
-        reservation.save()
-        
+        try:
+            reservation.save()
+        except IntegrityError as error:
+            if Reservation.OVERLAP_ERROR not in str(error):
+                raise
+            # The overlap trigger rejected the activation: another booking for
+            # these dates was confirmed first. Release this one instead.
+            reservation.status = 'cancelled'
+            reservation.save()
+            metrics.payments.inc(outcome='conflict')
+            messages.error(request, f'Sorry, "{reservation.vehicle.name}" was booked by someone else for these dates. You have not been charged.')
+            return redirect('home')
+
+        metrics.payments.inc(outcome='succeeded')
         return render(request, 'payment_status.html', {
             'title': 'Payment Successful',
             'message': f'Your payment was successful! Your rental for "{reservation.vehicle.name}" is confirmed.',
@@ -442,6 +579,7 @@ def process_payment(request):
         # PAYMENT FAILURE
         reservation.status = 'payment_failed'
         reservation.save()
+        metrics.payments.inc(outcome='failed')
         messages.error(request, "Your payment failed. You can retry from the 'My Reservations' section.")
         return redirect('home')
 @login_required
@@ -472,3 +610,66 @@ def add_phone_number_view(request):
         
         messages.success(request, 'Your phone number has been added successfully.')
     return redirect('home')
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, for staff users, requests bearing
+    settings.METRICS_TOKEN and the addresses listed in
+    settings.METRICS_ALLOWED_IPS.
+    """
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', [])
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    has_token = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not (request.user.is_staff or has_token or request.META.get('REMOTE_ADDR') in allowed_ips):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@staff_member_required
+def profile_list_view(request):
+    """
+    Lists the stored request profiles (see profiling.py), newest first.
+    """
+    return render(request, 'profiles.html', {'profiles': list_profiles()})
+
+@staff_member_required
+def profile_download_view(request, name):
+    path = profile_path(name)
+    if path is None:
+        raise Http404('No such profile.')
+    return FileResponse(path.open('rb'), as_attachment=True, filename=name)
+
+@staff_member_required
+def utilization_view(request):
+    """
+    Fleet utilization over ?from= to ?to= (default: the last 30 days),
+    grouped by ?by= vehicle, type or location (see utilization.py). Only
+    reads the matrix, as the update_utilization command last left it.
+    """
+    by = request.GET.get('by', 'type')
+    end_date = date.today()
+    start_date = end_date - timedelta(days=30)
+    error = None
+    try:
+        if request.GET.get('from'):
+            start_date = date.fromisoformat(request.GET['from'])
+        if request.GET.get('to'):
+            end_date = date.fromisoformat(request.GET['to'])
+    except ValueError:
+        error = 'Dates must be in YYYY-MM-DD format.'
+    if not error and end_date <= start_date:
+        error = 'End date must be after start date.'
+    if by not in utilization.GROUPINGS:
+        error = f"Group by one of: {', '.join(utilization.GROUPINGS)}."
+
+    rows = []
+    matrix = utilization.UtilizationMatrix.open()
+    if matrix is None:
+        error = error or 'No utilization matrix yet: run manage.py update_utilization.'
+    elif not error:
+        rows = utilization.report(matrix, start_date, end_date, by)
+    return render(request, 'utilization.html', {
+        'rows': rows, 'by': by, 'groupings': utilization.GROUPINGS,
+        'start_date': start_date, 'end_date': end_date, 'error': error,
+        'last_run': matrix.last_run if matrix else None,
+    })
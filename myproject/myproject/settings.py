@@ -41,6 +41,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware (see myapp/instrumentation.py).
+    'myapp.instrumentation.RequestTimingMiddleware',
+    'myapp.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,14 +51,17 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Needs request.user, so after AuthenticationMiddleware (see myapp/profiling.py).
+    'myapp.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'myproject.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [os.path.join(BASE_DIR, 'Templates')],
+        # DjangoTemplates, plus render time for RequestTimingMiddleware.
+        'BACKEND': 'myapp.instrumentation.TimedDjangoTemplates',
+        'DIRS': [os.path.join(BASE_DIR, 'template')],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -75,8 +81,31 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # The stock backend plus WAL, tuned pragmas and retries when the
+        # database is busy; see myapp/sqlite_backend/base.py.
+        'ENGINE': 'myapp.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts rather than on its
+            # first write, so check-then-insert blocks (e.g. booking a vehicle)
+            # run one at a time instead of failing with "database is locked".
+            'transaction_mode': 'IMMEDIATE',
+            # SQLite's own busy wait; after it, the backend retries a BEGIN
+            # or autocommit statement up to busy_retries times with jitter.
+            'timeout': 5,
+            'busy_retries': 5,
+            'busy_backoff': 0.05,
+        },
+        # Keep connections (and their pragmas and page cache) across
+        # requests. Under ASGI each request runs its queries on a fresh
+        # thread, so this only helps WSGI workers.
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        # Tests and benchmarks exercise concurrent bookings, which an
+        # in-memory shared-cache database cannot do, so use a real file.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -112,6 +141,134 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The default cache holds the sessions and other small shared counters.
+# Local memory is per process: deployments with several workers should point
+# this at a shared backend. (The catalog version lives in the database, see
+# myapp/catalog_cache.py.)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # Room for a session per active user; the default of 300 would evict them.
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
+
+# Rendered /api/vehicles/ pages kept by each worker (least recently used evicted).
+CATALOG_CACHE_MAX_ENTRIES = 512
+
+
+# Sessions
+# Stored in the django_session table. With 'myapp.sessions.write_behind',
+# logged-in requests read their session from the default cache instead, and
+# session changes reach the table in batches every this many seconds; that
+# engine needs a cache shared by every worker, and manage.py check refuses
+# it on a per-process one such as LocMemCache. 'myapp.sessions.signed_cookies'
+# keeps sessions in the cookie. Both accept existing sessions (see
+# myapp/sessions/__init__.py).
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_WRITE_BEHIND_INTERVAL = 1.0
+
+
+# Request timing
+# Share of requests whose query count, SQL, template and view time are
+# measured and reported (Server-Timing header and the myapp.request_timing
+# log). A SELECT run more often than the threshold in one request is logged
+# as a repeated query pattern.
+
+REQUEST_TIMING_SAMPLE_RATE = 1.0 if DEBUG else 0.05
+REQUEST_TIMING_REPEAT_THRESHOLD = 5
+
+# Metrics
+# Served at /metrics to staff users, to requests bearing METRICS_TOKEN
+# (Authorization: Bearer <token>) and to the client addresses listed (e.g.
+# the Prometheus server). Behind a reverse proxy every request comes from the
+# proxy's address, so prefer the token there. Workers add their buffered
+# counts this often, in seconds, from a background thread, to METRICS_DB: an
+# SQLite file of its own, so the counts never contend with the database's
+# write lock.
+
+METRICS_ALLOWED_IPS = []
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_DB = BASE_DIR / 'metrics.sqlite3'
+
+# Profiling
+# Staff can profile any request with ?_profile=1 (cProfile) or ?_profile=sample
+# (collapsed stacks). Besides that, this share of requests to the listed views
+# is stack-sampled for everyone; 0 turns random sampling off.
+
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_SAMPLE_VIEWS = ['home', 'vehicle_data']
+PROFILING_SAMPLE_INTERVAL = 0.001  # seconds between stack samples
+PROFILES_DIR = BASE_DIR / 'profiles'
+PROFILES_KEEP = 50
+
+# Live availability
+# Open calendars follow bookings over /api/availability/stream/. Off unless
+# served over ASGI (myproject/asgi.py): under WSGI every open stream would
+# hold a worker thread, so the endpoint answers 204 there and the page does
+# not subscribe. Each worker checks for new availability events this often,
+# in seconds, while it has open streams, and sends idle ones a heartbeat this
+# often. The sweeper prunes events older than LIVE_EVENT_RETENTION seconds.
+
+LIVE_AVAILABILITY = False
+LIVE_POLL_INTERVAL = 0.5
+LIVE_HEARTBEAT = 15
+LIVE_EVENT_RETENTION = 3600
+
+# Pricing
+# Rules of the rental quotes (see myapp/quotes.py), all off by default, so a
+# rental costs price_per_day times its days. Every day of a rental costs
+# price_per_day times the weekend multiplier on weekend days (Monday is 0)
+# and the highest multiplier of the seasons covering it ('MM-DD' to 'MM-DD',
+# inclusive, may wrap the new year), plus its type's surcharge. Rentals of
+# at least N days get the largest discount they qualify for. For example:
+#
+#   QUOTE_WEEKEND_MULTIPLIER = 1.15
+#   QUOTE_SEASONS = [('06-15', '08-31', 1.20)]  # Summer holidays
+#   QUOTE_LENGTH_DISCOUNTS = [(7, 0.10), (28, 0.25)]  # (minimum days, share off)
+#   QUOTE_TYPE_SURCHARGES = {'car': 5.00, 'bike': 2.00}  # per day
+
+QUOTE_WEEKEND_DAYS = (5, 6)
+QUOTE_WEEKEND_MULTIPLIER = 1.0
+QUOTE_SEASONS = []
+QUOTE_LENGTH_DISCOUNTS = []
+QUOTE_TYPE_SURCHARGES = {}
+
+# Utilization
+# The vehicle x day occupancy matrix behind /staff/utilization/ (see
+# myapp/utilization.py). Only `manage.py update_utilization` (e.g. from cron)
+# updates it; the page shows it as of that command's last run.
+
+UTILIZATION_DIR = BASE_DIR / 'utilization'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'require_debug_true': {'()': 'django.utils.log.RequireDebugTrue'},
+    },
+    'handlers': {
+        # Development only; in production attach the logger to your log shipper.
+        'console': {
+            'level': 'INFO',
+            'filters': ['require_debug_true'],
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'myapp.request_timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -19,15 +19,20 @@
         // Current state
         let selectedVehicle = null;
         let activeFilter = 'all';
-        let currentPage = 1;
+        let currentPage = 1; // Shown to the user only; the API pages by cursor
+        let currentCursor = null;
+        const PAGE_SIZE = 6; // Must match the page size of /api/vehicles/
         let pickupDatepicker = null;
         let returnDatepicker = null;
         let searchTimer = null; // For debouncing search input
+        const bookedDates = new Map(); // Vehicle id -> booked ranges, prefetched per page
 
         // Initialize
         document.addEventListener('DOMContentLoaded', function() {
             loadVehicles();
             setMinDates();
+            // Only when the server streams them (LIVE_AVAILABILITY, over ASGI)
+            if (document.body.dataset.liveAvailability === 'on') subscribeToAvailability();
         });
 
         // Navigation
@@ -60,7 +65,9 @@
                 filterBtns.forEach(filterBtn => filterBtn.classList.remove('active'));
                 this.classList.add('active');
                 
-                // Filter vehicles
+                // Filter vehicles, starting again from the first page
+                currentPage = 1;
+                currentCursor = null;
                 loadVehicles();
             });
         });
@@ -70,8 +77,11 @@
             const searchQuery = document.getElementById('searchInput').value;
             try {
                 // Build the URL with query parameters for pagination, filtering, and search
-                const url = `/api/vehicles/?page=${currentPage}&filter=${activeFilter}&search=${searchQuery}`;
-                const response = await fetch(url);
+                const params = new URLSearchParams({ filter: activeFilter, search: searchQuery, total: 1 });
+                if (currentCursor) {
+                    params.set('cursor', currentCursor);
+                }
+                const response = await fetch(`/api/vehicles/?${params}`);
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
                 }
@@ -91,12 +101,114 @@
                 // Render the pagination controls based on the response data
                 renderPagination(data);
 
+                // Fetch the calendars of every card on the page in one request
+                prefetchBookedDates(data.vehicles || []);
+
             } catch (error) {
                 console.error("Could not load vehicles:", error);
                 vehicleGrid.innerHTML = '<p class="error-message">Could not load vehicles. Please try again later.</p>';
             }
         }
 
+        // Load booked dates of the given vehicles into bookedDates. Failures are
+        // ignored: openRentalModal then fetches the one vehicle it needs.
+        async function prefetchBookedDates(vehicles) {
+            if (vehicles.length === 0) return;
+            const params = new URLSearchParams({
+                ids: vehicles.map(vehicle => vehicle.id).join(','),
+                from: new Date().toLocaleDateString('en-CA'), // Local YYYY-MM-DD
+                format: 'rle',
+            });
+            try {
+                const response = await fetch(`/api/booked-dates/?${params}`);
+                if (!response.ok) return;
+                const data = await response.json();
+                Object.entries(data).forEach(([id, booked]) => bookedDates.set(Number(id), decodeBookedDates(booked)));
+            } catch (error) {
+                console.error("Could not prefetch booked dates:", error);
+            }
+        }
+
+        // Turn any booked-dates format (see booked_dates.py) into the
+        // [{from, to}, ...] ranges that flatpickr's disable option takes
+        function decodeBookedDates(booked) {
+            if (Array.isArray(booked)) return booked;
+            const day = new Date(`${booked.start}T00:00:00Z`);
+            const isoDate = () => day.toISOString().slice(0, 10);
+            const ranges = [];
+            if (booked.runs) {
+                // Alternating free and booked run lengths
+                for (let i = 0; i + 1 < booked.runs.length; i += 2) {
+                    day.setUTCDate(day.getUTCDate() + booked.runs[i]);
+                    const from = isoDate();
+                    day.setUTCDate(day.getUTCDate() + booked.runs[i + 1]);
+                    ranges.push({ from, to: isoDate() });
+                }
+            } else if (booked.bits !== undefined) {
+                // Bit i of the little-endian bitmap is day start + i
+                const bytes = atob(booked.bits);
+                let from = null;
+                for (let i = 0; i <= booked.days; i++) {
+                    const isBooked = i < booked.days && (bytes.charCodeAt(i >> 3) >> (i & 7)) & 1;
+                    if (isBooked && from === null) from = isoDate();
+                    if (!isBooked && from !== null) {
+                        ranges.push({ from, to: isoDate() });
+                        from = null;
+                    }
+                    day.setUTCDate(day.getUTCDate() + 1);
+                }
+            }
+            return ranges;
+        }
+
+        // Booked dates of one vehicle, prefetched or else fetched now
+        async function loadBookedDates(vehicle) {
+            if (!bookedDates.has(vehicle.id)) {
+                const params = new URLSearchParams({ from: new Date().toLocaleDateString('en-CA'), format: 'rle' });
+                const response = await fetch(`/api/vehicle/${vehicle.id}/booked-dates/?${params}`);
+                if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+                bookedDates.set(vehicle.id, decodeBookedDates(await response.json()));
+            }
+            return bookedDates.get(vehicle.id);
+        }
+
+        // Re-apply the booked dates of the vehicle in the open rental modal
+        async function refreshOpenCalendar() {
+            if (!selectedVehicle || !pickupDatepicker) return;
+            try {
+                const disabledDates = await loadBookedDates(selectedVehicle);
+                if (pickupDatepicker) pickupDatepicker.set('disable', disabledDates);
+                if (returnDatepicker) returnDatepicker.set('disable', disabledDates);
+            } catch (error) {
+                console.error("Could not refresh booked dates:", error);
+            }
+        }
+
+        // Live availability changes from other users (see myapp/live.py),
+        // so open calendars update without polling
+        function subscribeToAvailability() {
+            if (!window.EventSource) return;
+            const source = new EventSource('/api/availability/stream/');
+            source.addEventListener('availability', event => {
+                const change = JSON.parse(event.data);
+                const ranges = bookedDates.get(change.vehicle);
+                if (change.change === 'booked' && ranges) {
+                    ranges.push({ from: change.from, to: change.to });
+                } else {
+                    // Freed days may be part of a merged range: refetch when next needed
+                    bookedDates.delete(change.vehicle);
+                }
+                if (selectedVehicle && selectedVehicle.id === change.vehicle) refreshOpenCalendar();
+            });
+            source.addEventListener('reset', () => {
+                // Too far behind to catch up: start over with a new stream
+                source.close();
+                bookedDates.clear();
+                refreshOpenCalendar();
+                subscribeToAvailability();
+            });
+        }
+
         // Create and manage pagination controls
         function renderPagination(data) {
             const paginationControls = document.getElementById('paginationControls');
@@ -105,7 +217,7 @@
             paginationControls.innerHTML = ''; // Clear old controls
 
             // Don't show controls if there's only one page or no results
-            if (data.total_pages <= 1) {
+            if (!data.has_next && !data.has_previous) {
                 return;
             }
 
@@ -117,6 +229,7 @@
             prevBtn.addEventListener('click', () => {
                 if (data.has_previous) {
                     currentPage--;
+                    currentCursor = data.previous_cursor;
                     loadVehicles();
                 }
             });
@@ -124,7 +237,9 @@
             // Page Info Text
             const pageInfo = document.createElement('span');
             pageInfo.className = 'page-info';
-            pageInfo.textContent = `Page ${data.current_page} of ${data.total_pages}`;
+            // approx_total is cached server-side and may lag behind slightly
+            const totalPages = Math.max(currentPage, Math.ceil(data.approx_total / PAGE_SIZE));
+            pageInfo.textContent = `Page ${currentPage} of ${totalPages}`;
 
             // Next Button
             const nextBtn = document.createElement('button');
@@ -134,6 +249,7 @@
             nextBtn.addEventListener('click', () => {
                 if (data.has_next) {
                     currentPage++;
+                    currentCursor = data.next_cursor;
                     loadVehicles();
                 }
             });
@@ -187,8 +303,7 @@
 
             // Fetch booked dates and initialize date pickers
             try {
-                const response = await fetch(`/api/vehicle/${vehicle.id}/booked-dates/`);
-                const bookedDates = await response.json();
+                const disabledDates = await loadBookedDates(vehicle);
 
                 // Destroy previous instances if they exist
                 if (pickupDatepicker) pickupDatepicker.destroy();
@@ -197,7 +312,7 @@
                 // Initialize flatpickr for the pickup date
                 pickupDatepicker = flatpickr(pickupDateInput, {
                     minDate: "today",
-                    disable: bookedDates,
+                    disable: disabledDates,
                     dateFormat: "Y-m-d",
                     onChange: function(selectedDates, dateStr, instance) {
                         // When pickup date changes, update the minDate for the return date picker
@@ -212,7 +327,7 @@
                 // Initialize flatpickr for the return date
                 returnDatepicker = flatpickr(returnDateInput, {
                     minDate: new Date().fp_incr(1), // Default to tomorrow
-                    disable: bookedDates,
+                    disable: disabledDates,
                     dateFormat: "Y-m-d",
                 });
 
@@ -278,6 +393,23 @@
             if (selectedVehicle) {
                 const total = selectedVehicle.price * days;
                 summaryTotal.textContent = `${total}`;
+                showQuote(selectedVehicle, pickupDateInput.value, returnDateInput.value);
+            }
+        }
+
+        // Replace the estimate with the server's quote, which adds weekend,
+        // seasonal and long-rental pricing and is what the booking will cost
+        async function showQuote(vehicle, start, end) {
+            const params = new URLSearchParams({ start, end, ids: vehicle.id });
+            try {
+                const response = await fetch(`/api/quotes/?${params}`);
+                if (!response.ok) return;
+                const quote = await response.json();
+                // Ignore answers for a vehicle or dates no longer selected
+                if (selectedVehicle !== vehicle || pickupDateInput.value !== start || returnDateInput.value !== end) return;
+                if (quote.totals.length) summaryTotal.textContent = quote.totals[0].toFixed(2);
+            } catch (error) {
+                console.error("Could not fetch the quote:", error);
             }
         }
 
@@ -339,6 +471,7 @@
             // Use a timer to avoid sending a request on every single keystroke
             searchTimer = setTimeout(() => {
                 currentPage = 1; // Reset to the first page for a new search
+                currentCursor = null;
                 loadVehicles();
             }, 300); // Wait 300ms after user stops typing
         });